@@ -0,0 +1,378 @@
+"""
+In-process stand-ins for the server's external dependencies:
+
+  - FakeSupabase: an in-memory PostgREST subset (the filters, ordering,
+    counts and RPCs this server uses) served through httpx transports, so
+    the real supabase/postgrest client code runs unchanged.
+  - FakeJWKS: a local HTTP server publishing an RSA JWKS, plus a token
+    minter, so auth goes through utils/security for real.
+  - fake_openai_transport: answers the Responses API (optionally with 429s).
+
+Every fake takes an injected latency (seconds) to model network round-trips.
+"""
+import asyncio
+import base64
+import json
+import random
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from functools import lru_cache
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Tuple
+
+import httpx
+import jwt
+from cryptography.hazmat.primitives.asymmetric import rsa
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+# ---------------------------------------------------------------- Supabase
+
+
+def _coerce(value: str, sample: Any) -> Any:
+    if isinstance(sample, bool):
+        return value == "true"
+    if isinstance(sample, int):
+        return int(value)
+    if isinstance(sample, float):
+        return float(value)
+    return value
+
+
+@lru_cache(maxsize=256)
+def _in_values(raw: str) -> frozenset:
+    return frozenset(v.strip().strip('"') for v in raw.strip("()").split(","))
+
+
+def _match(row: Dict[str, Any], col: str, expr: str) -> bool:
+    op, _, raw = expr.partition(".")
+    have = row.get(col)
+    if op == "is":
+        return have is None if raw == "null" else have is not None
+    if have is None:
+        return False
+    if op == "in":
+        return str(have) in _in_values(raw)
+    want = _coerce(raw, have)
+    return {
+        "eq": have == want,
+        "neq": have != want,
+        "gt": have > want,
+        "gte": have >= want,
+        "lt": have < want,
+        "lte": have <= want,
+    }.get(op, False)
+
+
+class FakeSupabase:
+    """Tables are lists of dicts; `latency` is added to every request."""
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.tables: Dict[str, List[Dict[str, Any]]] = {"users": [], "pushups": [], "situps": [], "exercise_sessions": []}
+        self._lock = threading.Lock()
+        self.requests = 0
+
+    # ---- seeding ----
+
+    def seed(self, athletes: int = 2000, coaches: int = 20, with_records: float = 0.8, seed: int = 7) -> Dict[str, Any]:
+        rnd = random.Random(seed)
+        coach_ids = [str(uuid.UUID(int=rnd.getrandbits(128))) for _ in range(coaches)]
+        users = []
+        for cid in coach_ids:
+            users.append({"id": cid, "username": f"coach_{cid[:6]}", "full_name": "Coach", "age": 35,
+                          "gender": rnd.choice(["m", "f"]), "height_cm": 175, "weight_kg": 75, "coach_id": None,
+                          "created_at": _now(), "updated_at": _now()})
+        athlete_ids = []
+        for i in range(athletes):
+            uid = str(uuid.UUID(int=rnd.getrandbits(128)))
+            athlete_ids.append(uid)
+            users.append({"id": uid, "username": f"athlete{i}", "full_name": f"Athlete {i}", "age": rnd.randint(12, 35),
+                          "gender": rnd.choice(["m", "f"]), "height_cm": rnd.randint(140, 200),
+                          "weight_kg": rnd.randint(40, 100), "coach_id": coach_ids[i % coaches],
+                          "created_at": _now(), "updated_at": _now()})
+        self.tables["users"] = users
+        for table in ("pushups", "situps"):
+            rows = []
+            for uid in athlete_ids:
+                if rnd.random() > with_records:
+                    continue
+                history = [rnd.randint(5, 60) for _ in range(rnd.randint(1, 30))]
+                rows.append({"id": str(uuid.uuid4()), "user_id": uid, "history": history, "max_reps": max(history),
+                             "avg_reps": sum(history) / len(history), "session_count": len(history),
+                             "reps_sum": sum(history), "last_tracked": _now(), "score": round(rnd.uniform(40, 95), 1),
+                             "created_at": _now(), "updated_at": _now()})
+            self.tables[table] = rows
+        return {"coaches": coach_ids, "athletes": athlete_ids}
+
+    # ---- PostgREST ----
+
+    def _select(self, table: str, params: List[Tuple[str, str]]) -> Tuple[List[Dict[str, Any]], int]:
+        rows = self.tables.get(table, [])
+        order, limit, offset, cols = None, None, 0, "*"
+        filters = []
+        for k, v in params:
+            if k == "select":
+                cols = v
+            elif k == "order":
+                order = v
+            elif k == "limit":
+                limit = int(v)
+            elif k == "offset":
+                offset = int(v)
+            else:
+                filters.append((k, v))
+        out = [r for r in rows if all(_match(r, c, e) for c, e in filters)]
+        total = len(out)
+        for term in reversed(order.split(",") if order else []):  # stable sorts, last key first
+            col, _, direction = term.partition(".")
+            out.sort(key=lambda r: (r.get(col) is None, r.get(col)), reverse=direction.startswith("desc"))
+        out = out[offset: offset + limit if limit is not None else None]
+        if cols != "*":
+            keep = [c.strip() for c in cols.split(",")]
+            out = [{c: r.get(c) for c in keep} for r in out]
+        return out, total
+
+    def _insert(self, table: str, body: Any) -> List[Dict[str, Any]]:
+        rows = body if isinstance(body, list) else [body]
+        out = []
+        for r in rows:
+            row = {"id": str(uuid.uuid4()), "created_at": _now(), "updated_at": _now(), **r}
+            if table in ("pushups", "situps"):
+                row.setdefault("session_count", 0)
+                row.setdefault("reps_sum", 0)
+            self.tables.setdefault(table, []).append(row)
+            out.append(row)
+        return out
+
+    def _append(self, exercise: str, user_id: str, reps: int, score: Optional[float], higher: bool = True,
+                recorded_at: Optional[str] = None, cap: int = 50) -> Dict[str, Any]:
+        table = self.tables[exercise]
+        self.tables["exercise_sessions"].append(
+            {"id": len(self.tables["exercise_sessions"]) + 1, "user_id": user_id, "exercise": exercise, "reps": reps, "score": score, "recorded_at": recorded_at or _now()}
+        )
+        row = next((r for r in table if r["user_id"] == user_id), None)
+        if row is None:
+            row = self._insert(exercise, {"user_id": user_id, "history": []})[0]
+        row["history"] = (row.get("history", []) + [reps])[-cap:]  # jsonb_tail() in sql/001
+        row["session_count"] += 1
+        row["reps_sum"] += reps
+        best = row.get("max_reps")
+        row["max_reps"] = reps if best is None else (max(best, reps) if higher else min(best, reps))
+        row["avg_reps"] = row["reps_sum"] / row["session_count"]
+        row["last_tracked"] = row["updated_at"] = _now()
+        if score is not None:
+            row["score"] = score
+        return {k: row.get(k) for k in ("id", "user_id", "max_reps", "avg_reps", "session_count", "history",
+                                        "last_tracked", "score", "updated_at")}
+
+    def _rpc(self, fn: str, p: Dict[str, Any]) -> Any:
+        if fn == "append_exercise_session":
+            return self._append(p["p_exercise"], p["p_user_id"], p["p_reps"], p.get("p_score"),
+                                p.get("p_higher_is_better", True), cap=p.get("p_history_cap", 50))
+        if fn == "append_exercise_sessions":
+            keys = {(s["user_id"], s.get("client_key")) for s in self.tables["exercise_sessions"] if s.get("client_key")}
+            results, records = [], {}
+            for s in p["p_sessions"]:
+                k = (s["user_id"], s["key"])
+                if k in keys:
+                    results.append({"key": s["key"], "status": "duplicate"})
+                    continue
+                keys.add(k)
+                row = self._append(s["exercise"], s["user_id"], s["reps"], s.get("score"),
+                                   s["exercise"] not in p.get("p_lower_is_better", []), s.get("recorded_at"),
+                                   p.get("p_history_cap", 50))
+                row.pop("history")  # the bulk RPC's records leave it out
+                self.tables["exercise_sessions"][-1]["client_key"] = s["key"]
+                records[(s["exercise"], s["user_id"])] = {"exercise": s["exercise"], **row}
+                results.append({"key": s["key"], "status": "applied"})
+            return {"results": results, "records": list(records.values())}
+        if fn == "exercise_history":
+            rows = [s for s in self.tables["exercise_sessions"]
+                    if s["user_id"] == p["p_user_id"] and s["exercise"] == p["p_exercise"]]
+            rows = sorted(rows, key=lambda s: s["recorded_at"])[-p.get("p_limit", 5000):]
+            ts = [int(datetime.fromisoformat(s["recorded_at"]).timestamp()) for s in rows]
+            return {"t0": ts[0] if ts else None, "dt": [b - a for a, b in zip([ts[0]] + ts, ts)] if ts else [],
+                    "reps": [s["reps"] for s in rows], "score": [s.get("score") for s in rows]}
+        if fn == "athlete_details":
+            ids = p["p_user_ids"]
+            users = {u["id"]: u for u in self.tables["users"] if u["id"] in set(ids)}
+            out = []
+            for uid in ids:
+                u = users.get(uid)
+                if u is None:
+                    continue
+                ex = {}
+                for name in p["p_exercises"]:
+                    stats = next((r for r in self.tables[name] if r["user_id"] == uid), None)
+                    recent = [s for s in self.tables["exercise_sessions"] if s["user_id"] == uid and s["exercise"] == name]
+                    ex[name] = {"stats": stats, "recent": recent[-p.get("p_history_limit", 10):][::-1]}
+                out.append({"profile": u, "exercises": ex})
+            return out
+        if fn == "refresh_leaderboard_ranks":
+            return {ex: self._rank(ex, ex in p.get("p_lower_is_better", []), p["p_age_edges"])
+                    for ex in p["p_exercises"]}
+        raise KeyError(fn)
+
+    def _rank(self, exercise: str, lower: bool, edges: List[int]) -> int:
+        """refresh_leaderboard_ranks() in sql/007 for one exercise."""
+        def band(age):
+            if age is None:
+                return None
+            lo = None
+            for edge in edges:
+                if age < edge:
+                    return f"<{edge}" if lo is None else f"{lo}-{edge - 1}"
+                lo = edge
+            return f"{lo}+"
+
+        users = {u["id"]: u for u in self.tables["users"]}
+        groups: Dict[Tuple[str, str, str], List[Tuple[float, str, float]]] = {}
+        for r in self.tables[exercise]:
+            u = users.get(r["user_id"])
+            if u is None:
+                continue
+            g, a = (u.get("gender") or "").strip().lower() or None, band(u.get("age"))
+            for metric in ("max_reps", "avg_reps", "score"):
+                v = r.get(metric)
+                if v is None:
+                    continue
+                k = v if lower and metric != "score" else -v
+                for gg, aa in (("*", "*"), (g, "*"), ("*", a), (g, a)):
+                    if gg is not None and aa is not None:
+                        groups.setdefault((metric, gg, aa), []).append((k, r["user_id"], float(v)))
+        rows = []
+        for (metric, g, a), members in groups.items():
+            members.sort()
+            total = len(members)
+            ties: Dict[float, int] = {}
+            for k, _, _ in members:
+                ties[k] = ties.get(k, 0) + 1
+            rank = 0
+            for i, (k, uid, v) in enumerate(members):
+                if i == 0 or k != members[i - 1][0]:
+                    rank = i + 1
+                rows.append({"exercise": exercise, "metric": metric, "gender": g, "age_band": a, "user_id": uid,
+                             "value": v, "rank": rank, "total": total,
+                             "percentile": round(100.0 * (total - rank + 1 - 0.5 * ties[k]) / total, 2)})
+        keep = [r for r in self.tables.get("leaderboard_ranks", []) if r["exercise"] != exercise]
+        self.tables["leaderboard_ranks"] = keep + rows
+        athletes = len(groups.get(("max_reps", "*", "*"), []))
+        builds = [b for b in self.tables.get("leaderboard_builds", []) if b["exercise"] != exercise]
+        self.tables["leaderboard_builds"] = builds + [{"exercise": exercise, "athletes": athletes, "built_at": _now()}]
+        return athletes
+
+    def handle(self, request: httpx.Request) -> httpx.Response:
+        self.requests += 1
+        path = request.url.path.split("/rest/v1/", 1)[-1].strip("/")
+        params = list(request.url.params.multi_items())
+        body = json.loads(request.content) if request.content else None
+        with self._lock:
+            try:
+                if path.startswith("rpc/"):
+                    return httpx.Response(200, json=self._rpc(path[4:], body or {}))
+                if request.method in ("GET", "HEAD"):
+                    rows, total = self._select(path, params)
+                    headers = {"content-range": f"0-{max(len(rows) - 1, 0)}/{total}"}
+                    if request.method == "HEAD":
+                        return httpx.Response(200, headers=headers)
+                    return httpx.Response(200, json=rows, headers=headers)
+                if request.method == "POST":
+                    return httpx.Response(201, json=self._insert(path, body))
+            except KeyError as e:
+                return httpx.Response(404, json={"message": f"not found: {e}"})
+        return httpx.Response(405, json={"message": "unsupported"})
+
+    def sync_transport(self) -> httpx.MockTransport:
+        def handler(request):
+            if self.latency:
+                time.sleep(self.latency)
+            return self.handle(request)
+        return httpx.MockTransport(handler)
+
+    def async_transport(self) -> httpx.MockTransport:
+        async def handler(request):
+            if self.latency:
+                await asyncio.sleep(self.latency)
+            return self.handle(request)
+        return httpx.MockTransport(handler)
+
+
+# ---------------------------------------------------------------- JWKS
+
+
+def _b64url_uint(n: int) -> str:
+    raw = n.to_bytes((n.bit_length() + 7) // 8, "big")
+    return base64.urlsafe_b64encode(raw).rstrip(b"=").decode()
+
+
+class FakeJWKS:
+    """Serves /jwks.json on 127.0.0.1 and mints RS256 tokens for it."""
+
+    def __init__(self, audience: str = "authenticated", latency: float = 0.0):
+        self.audience = audience
+        self.kid = "bench-key"
+        self._key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+        pub = self._key.public_key().public_numbers()
+        jwks = json.dumps({"keys": [{"kty": "RSA", "kid": self.kid, "use": "sig", "alg": "RS256",
+                                     "n": _b64url_uint(pub.n), "e": _b64url_uint(pub.e)}]}).encode()
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(h):
+                if latency:
+                    time.sleep(latency)
+                h.send_response(200)
+                h.send_header("Content-Type", "application/json")
+                h.send_header("Content-Length", str(len(jwks)))
+                h.end_headers()
+                h.wfile.write(jwks)
+
+            def log_message(h, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        threading.Thread(target=self._server.serve_forever, name="fake-jwks", daemon=True).start()
+        self.url = f"http://127.0.0.1:{self._server.server_address[1]}/jwks.json"
+
+    def token(self, sub: str, ttl: int = 3600) -> str:
+        now = int(time.time())
+        claims = {"sub": sub, "aud": self.audience, "iat": now, "exp": now + ttl, "email": f"{sub[:8]}@bench.local"}
+        return jwt.encode(claims, self._key, algorithm="RS256", headers={"kid": self.kid})
+
+    def close(self) -> None:
+        self._server.shutdown()
+
+
+# ---------------------------------------------------------------- OpenAI
+
+
+def fake_openai_transport(latency: float = 0.0, error_rate: float = 0.0, seed: int = 7) -> httpx.MockTransport:
+    """Responses API stand-in; a fraction `error_rate` of calls get a 429 with Retry-After."""
+    rnd = random.Random(seed)
+    counter = {"n": 0}
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        if latency:
+            await asyncio.sleep(latency)
+        if error_rate and rnd.random() < error_rate:
+            return httpx.Response(429, headers={"retry-after-ms": "50"},
+                                  json={"error": {"message": "rate limited", "type": "rate_limit"}})
+        body = json.loads(request.content)
+        counter["n"] += 1
+        images = sum(1 for c in body["input"][0]["content"] if c["type"] == "input_image")
+        text = f"- Posture looks stable across {images} frames.\n- Keep elbows at ~45 degrees.\n- Control the descent."
+        return httpx.Response(200, json={
+            "id": f"resp_{counter['n']}", "object": "response", "created_at": int(time.time()),
+            "model": body.get("model"), "status": "completed", "parallel_tool_calls": False,
+            "tool_choice": "auto", "tools": [],
+            "output": [{"type": "message", "id": f"msg_{counter['n']}", "role": "assistant", "status": "completed",
+                        "content": [{"type": "output_text", "text": text, "annotations": []}]}],
+            "usage": {"input_tokens": 85 * images, "output_tokens": 40, "total_tokens": 85 * images + 40},
+        })
+
+    return httpx.MockTransport(handler)
@@ -0,0 +1,354 @@
+"""
+Load-test main:app in-process against the fakes in bench/fakes.py.
+
+    cd server
+    python -m bench.run                                  # every scenario, defaults
+    python -m bench.run -s sessions roster -c 32 -d 20 --db-latency-ms 15
+    python -m bench.run --compare bench/results/<older>.json
+
+Each scenario runs `concurrency` closed-loop clients for `duration` seconds
+and reports throughput, latency percentiles and process RSS. Results are
+written as JSON to bench/results/ (or --out) for comparison across commits.
+"""
+import argparse
+import asyncio
+import io
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+SERVER = os.path.dirname(HERE)
+
+
+# ---------------------------------------------------------------- setup
+
+
+class Harness:
+    """Boots main:app wired to the fakes; import order matters (config reads env at import)."""
+
+    def __init__(self, args):
+        from bench.fakes import FakeJWKS, FakeSupabase
+
+        self.args = args
+        self.jwks = FakeJWKS(latency=args.auth_latency_ms / 1000)
+        self.db = FakeSupabase(latency=args.db_latency_ms / 1000)
+        self.ids = self.db.seed(athletes=args.athletes, coaches=args.coaches)
+
+        os.environ.update({
+            "SUPABASE_URL": "http://supabase.bench.local",
+            "SUPABASE_SERVICE_ROLE_KEY": "bench-service-role-key",
+            "SUPABASE_JWKS_URL": self.jwks.url,
+            "JWT_AUDIENCE": self.jwks.audience,
+            "OPENAI_API_KEY": "bench",
+            "JOB_DB_PATH": os.path.join(tempfile.mkdtemp(prefix="bench-"), "jobs.sqlite3"),
+        })
+        os.environ.pop("READ_CACHE_DIR", None)
+        os.environ.pop("DEEPANALYSIS_CACHE_DIR", None)
+
+        import main
+        self.app = main.app
+        self._wire()
+        from utils.leaderboard import rebuild
+        rebuild()  # what worker.py's builder does in production
+        self._tokens: Dict[str, str] = {}
+        self.frames = _frame_sets(args.frames, variants=8)
+
+    def _wire(self) -> None:
+        import httpx
+        from openai import AsyncOpenAI
+        from supabase import create_client
+        from supabase.lib.client_options import SyncClientOptions
+
+        from bench.fakes import fake_openai_transport
+        from utils import deepanalysis, supabase as sbmod
+        from utils.metrics import instrument_httpx
+
+        url, key = os.environ["SUPABASE_URL"], os.environ["SUPABASE_SERVICE_ROLE_KEY"]
+        sync_http = httpx.Client(transport=self.db.sync_transport(), base_url=url)
+        sbmod._sb = create_client(url, key, options=SyncClientOptions(httpx_client=sync_http))
+        instrument_httpx(sbmod._sb.postgrest.session)
+        self._async_http = httpx.AsyncClient(transport=self.db.async_transport(), base_url=url)
+        deepanalysis._client = AsyncOpenAI(
+            api_key="bench",
+            max_retries=0,
+            http_client=httpx.AsyncClient(
+                transport=fake_openai_transport(self.args.model_latency_ms / 1000, self.args.model_error_rate)
+            ),
+        )
+
+    async def wire_async(self) -> None:
+        """The async Supabase client has to be created inside the running loop."""
+        from supabase import acreate_client
+        from supabase.lib.client_options import AsyncClientOptions
+
+        from utils import supabase as sbmod
+        from utils.metrics import instrument_httpx
+
+        sbmod._asb = await acreate_client(
+            os.environ["SUPABASE_URL"], os.environ["SUPABASE_SERVICE_ROLE_KEY"],
+            options=AsyncClientOptions(httpx_client=self._async_http),
+        )
+        instrument_httpx(sbmod._asb.postgrest.session, is_async=True)
+
+    def auth(self, user_id: str) -> Dict[str, str]:
+        tok = self._tokens.get(user_id)
+        if tok is None:
+            tok = self._tokens[user_id] = self.jwks.token(user_id)
+        return {"Authorization": f"Bearer {tok}"}
+
+
+def _frame_sets(n: int, variants: int) -> List[List[str]]:
+    """`variants` synthetic clips of n JPEG frames (a bar moving down and up)."""
+    import base64
+    from PIL import Image, ImageDraw
+
+    sets = []
+    for v in range(variants):
+        frames = []
+        for i in range(n):
+            img = Image.new("RGB", (640, 360), (30 + v * 10, 30, 40))
+            y = int(60 + 200 * abs((i / max(n - 1, 1)) * 2 - 1))
+            ImageDraw.Draw(img).rectangle([200, y, 440, y + 40], fill=(220, 200, 180))
+            buf = io.BytesIO()
+            img.save(buf, format="JPEG", quality=80)
+            frames.append(base64.b64encode(buf.getvalue()).decode())
+        sets.append(frames)
+    return sets
+
+
+# ---------------------------------------------------------------- scenarios
+
+Op = Callable[[Any, "Harness", random.Random], Any]
+
+
+async def op_session_get(client, h: Harness, rnd: random.Random):
+    uid = rnd.choice(h.ids["athletes"])
+    ex = rnd.choice(("pushups", "situps"))
+    return await client.get(f"/{ex}", headers=h.auth(uid))
+
+
+async def op_session_patch(client, h: Harness, rnd: random.Random):
+    uid = rnd.choice(h.ids["athletes"])
+    ex = rnd.choice(("pushups", "situps"))
+    body = {"session_reps": rnd.randint(5, 60), "session_score": round(rnd.uniform(40, 95), 1)}
+    return await client.patch(f"/{ex}", json=body, headers=h.auth(uid))
+
+
+async def op_roster(client, h: Harness, rnd: random.Random):
+    coach = rnd.choice(h.ids["coaches"])
+    return await client.get(f"/data/coaches/{coach}/athletes", params={"limit": 100})
+
+
+async def op_roster_details(client, h: Harness, rnd: random.Random):
+    ids = rnd.sample(h.ids["athletes"], min(50, len(h.ids["athletes"])))
+    return await client.post("/data/athletes/details", json={"ids": ids, "history": 5})
+
+
+async def op_athlete(client, h: Harness, rnd: random.Random):
+    return await client.get(f"/data/athletes/{rnd.choice(h.ids['athletes'])}")
+
+
+async def op_leaderboard(client, h: Harness, rnd: random.Random):
+    ex = rnd.choice(("pushups", "situps"))
+    return await client.get(f"/leaderboards/{ex}", params={"metric": rnd.choice(("max_reps", "score")), "limit": 50})
+
+
+async def op_analyze(client, h: Harness, rnd: random.Random):
+    uid = rnd.choice(h.ids["athletes"])
+    body = {
+        "user_id": uid,
+        "exercise": "pushups",
+        "frames": rnd.choice(h.frames),
+        # unique prompt per request: every call misses the result cache unless --analyze-cache
+        "prompt": None if h.args.analyze_cache else f"Coach the set. ref={rnd.getrandbits(48):x}",
+    }
+    return await client.post("/deep/analyze", json=body, timeout=120)
+
+
+SCENARIOS: Dict[str, Dict[Op, float]] = {
+    "sessions": {op_session_get: 0.5, op_session_patch: 0.5},
+    "roster": {op_roster: 0.5, op_roster_details: 0.3, op_athlete: 0.2},
+    "analyze": {op_analyze: 1.0},
+    "mixed": {
+        op_session_get: 0.3, op_session_patch: 0.25, op_roster: 0.15, op_roster_details: 0.05,
+        op_athlete: 0.15, op_leaderboard: 0.08, op_analyze: 0.02,
+    },
+}
+
+
+# ---------------------------------------------------------------- driver
+
+
+def _rss_mb() -> float:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except (OSError, ValueError):
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _pct(xs: List[float]) -> Dict[str, float]:
+    if not xs:
+        return {"p50": 0.0, "p95": 0.0, "p99": 0.0, "mean": 0.0, "max": 0.0}
+    a = np.asarray(xs) * 1000
+    p50, p95, p99 = np.percentile(a, [50, 95, 99])
+    return {"p50": round(p50, 2), "p95": round(p95, 2), "p99": round(p99, 2),
+            "mean": round(float(a.mean()), 2), "max": round(float(a.max()), 2)}
+
+
+async def run_scenario(h: Harness, name: str, concurrency: int, duration: float, seed: int) -> Dict[str, Any]:
+    import httpx
+
+    mix = SCENARIOS[name]
+    ops, weights = list(mix), list(mix.values())
+    latencies: List[float] = []
+    per_op: Dict[str, List[float]] = {}
+    statuses: Counter = Counter()
+    errors: Counter = Counter()
+    rss = {"start": round(_rss_mb(), 1), "peak": 0.0}
+    stop = time.perf_counter() + duration
+
+    transport = httpx.ASGITransport(app=h.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        async def worker(i: int):
+            rnd = random.Random(seed * 1000 + i)
+            while time.perf_counter() < stop:
+                op = rnd.choices(ops, weights)[0]
+                t0 = time.perf_counter()
+                try:
+                    resp = await op(client, h, rnd)
+                    statuses[resp.status_code] += 1
+                    if resp.status_code >= 500:
+                        errors[f"{op.__name__}:{resp.status_code}"] += 1
+                except Exception as e:  # a crashed request is a result, not a harness failure
+                    errors[f"{op.__name__}:{type(e).__name__}"] += 1
+                dt = time.perf_counter() - t0
+                latencies.append(dt)
+                per_op.setdefault(op.__name__[3:], []).append(dt)
+
+        async def sample_rss():
+            while time.perf_counter() < stop:
+                rss["peak"] = max(rss["peak"], _rss_mb())
+                await asyncio.sleep(0.1)
+
+        t0 = time.perf_counter()
+        await asyncio.gather(sample_rss(), *(worker(i) for i in range(concurrency)))
+        elapsed = time.perf_counter() - t0
+
+    rss["end"] = round(_rss_mb(), 1)
+    rss["peak"] = round(max(rss["peak"], rss["end"]), 1)
+    return {
+        "concurrency": concurrency,
+        "duration_s": round(elapsed, 2),
+        "requests": len(latencies),
+        "throughput_rps": round(len(latencies) / elapsed, 1),
+        "latency_ms": _pct(latencies),
+        "per_op": {k: {"requests": len(v), **_pct(v)} for k, v in sorted(per_op.items())},
+        "status": {str(k): v for k, v in sorted(statuses.items())},
+        "errors": dict(errors),
+        "rss_mb": rss,
+    }
+
+
+def _commit() -> Optional[str]:
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=SERVER, capture_output=True, text=True, timeout=10)
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=SERVER,
+                               capture_output=True, text=True, timeout=10).stdout.strip()
+        return out.stdout.strip() + ("-dirty" if dirty else "") if out.returncode == 0 else None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def compare(old: Dict[str, Any], new: Dict[str, Any]) -> str:
+    lines = [f"{'scenario':<10} {'rps':>18} {'p50 ms':>18} {'p95 ms':>18} {'p99 ms':>18}"]
+    for name, n in new["scenarios"].items():
+        o = old["scenarios"].get(name)
+        if o is None:
+            continue
+
+        def cell(a, b, higher_better=False):
+            pct = (b - a) / a * 100 if a else 0.0
+            worse = pct < -5 if higher_better else pct > 5
+            return f"{a:>7.1f}→{b:<7.1f}{'!' if worse else ' '}"
+
+        lines.append(
+            f"{name:<10} {cell(o['throughput_rps'], n['throughput_rps'], True):>18} "
+            + " ".join(f"{cell(o['latency_ms'][p], n['latency_ms'][p]):>18}" for p in ("p50", "p95", "p99"))
+        )
+    lines.append("(! = more than 5% worse)")
+    return "\n".join(lines)
+
+
+def main(argv=None) -> int:
+    p = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    p.add_argument("-s", "--scenarios", nargs="+", choices=list(SCENARIOS), default=list(SCENARIOS))
+    p.add_argument("-c", "--concurrency", type=int, default=16)
+    p.add_argument("-d", "--duration", type=float, default=10.0, help="seconds per scenario")
+    p.add_argument("--warmup", type=float, default=2.0, help="seconds of unrecorded load before each scenario")
+    p.add_argument("--athletes", type=int, default=2000)
+    p.add_argument("--coaches", type=int, default=20)
+    p.add_argument("--frames", type=int, default=24, help="frames per analyze request")
+    p.add_argument("--db-latency-ms", type=float, default=5.0)
+    p.add_argument("--auth-latency-ms", type=float, default=20.0, help="JWKS fetch latency")
+    p.add_argument("--model-latency-ms", type=float, default=800.0)
+    p.add_argument("--model-error-rate", type=float, default=0.0, help="fraction of model calls answered with 429")
+    p.add_argument("--analyze-cache", action="store_true", help="let repeated analyze requests hit the result cache")
+    p.add_argument("--seed", type=int, default=1)
+    p.add_argument("--out", help="result path (default bench/results/<time>-<commit>.json)")
+    p.add_argument("--compare", help="earlier result JSON to diff against")
+    args = p.parse_args(argv)
+
+    sys.path.insert(0, SERVER)
+    h = Harness(args)
+
+    async def go():
+        await h.wire_async()
+        results = {}
+        for name in args.scenarios:
+            if args.warmup:
+                await run_scenario(h, name, args.concurrency, args.warmup, args.seed + 99)
+            results[name] = r = await run_scenario(h, name, args.concurrency, args.duration, args.seed)
+            lat = r["latency_ms"]
+            print(f"{name:<10} {r['throughput_rps']:>8.1f} rps  p50 {lat['p50']:>7.1f}  p95 {lat['p95']:>7.1f}  "
+                  f"p99 {lat['p99']:>7.1f} ms  rss {r['rss_mb']['peak']:.0f} MB  errors {sum(r['errors'].values())}")
+        return results
+
+    scenarios = asyncio.run(go())
+    report = {
+        "meta": {
+            "commit": _commit(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "config": {k: v for k, v in vars(args).items() if k not in ("out", "compare")},
+        },
+        "scenarios": scenarios,
+    }
+    out = args.out or os.path.join(HERE, "results", f"{time.strftime('%Y%m%d-%H%M%S')}-{report['meta']['commit'] or 'nogit'}.json")
+    os.makedirs(os.path.dirname(out), exist_ok=True)
+    with open(out, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"results: {out}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            print(compare(json.load(f), report))
+    h.jwks.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
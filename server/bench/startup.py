@@ -0,0 +1,230 @@
+"""
+Startup-time benchmark: how long a fresh worker takes to import the app and
+to answer its first request, checked against a budget.
+
+    cd server
+    python -m bench.startup                                  # defaults, exits 1 if over budget
+    python -m bench.startup -n 10 --import-budget-ms 1200 --ttfr-budget-ms 2500
+    python -m bench.startup --compare bench/results/startup-<older>.json
+
+Measures, each in fresh interpreters:
+
+  import   median wall time of `import main`, plus the slowest top-level
+           packages from `python -X importtime` and any heavy SDK (openai,
+           supabase, numpy, PIL) that got imported eagerly. Those are meant
+           to load on first use or during warm-up, so any listed here fails
+           the budget.
+  ttfr     time from spawning `serve.py --workers 1` to the first 200 from
+           GET /health, and, when the environment can warm up (real or
+           reachable Supabase/JWKS), to the first 200 from GET /ready.
+
+Results are written as JSON to bench/results/ (or --out).
+"""
+import argparse
+import json
+import os
+import platform
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+from collections import defaultdict
+from typing import Any, Dict, List, Optional
+
+from bench.run import HERE, SERVER, _commit
+
+HEAVY = ("openai", "supabase", "postgrest", "numpy", "PIL", "jwt", "requests", "httpx")
+# not allowed at import time; jwt/requests/httpx are cheap enough to only be reported
+FORBIDDEN = ("openai", "supabase", "numpy", "PIL")
+
+_PROBE = (
+    "import sys, time, json\n"
+    "t0 = time.perf_counter()\n"
+    "import main\n"
+    "t = time.perf_counter() - t0\n"
+    "print(json.dumps({'s': t, 'loaded': [m for m in %r if m in sys.modules]}))\n"
+) % (HEAVY,)
+
+
+def _env() -> Dict[str, str]:
+    env = dict(os.environ)
+    env["PYTHONPATH"] = SERVER + os.pathsep + env.get("PYTHONPATH", "")
+    env.pop("PYTHONDONTWRITEBYTECODE", None)
+    return env
+
+
+def measure_import(runs: int) -> Dict[str, Any]:
+    env = _env()
+    times: List[float] = []
+    loaded: List[str] = []
+    for _ in range(runs):
+        out = subprocess.run([sys.executable, "-c", _PROBE], cwd=SERVER, env=env,
+                             capture_output=True, text=True, timeout=120)
+        if out.returncode != 0:
+            raise RuntimeError(f"import main failed:\n{out.stderr[-2000:]}")
+        r = json.loads(out.stdout.strip().splitlines()[-1])
+        times.append(r["s"] * 1000)
+        loaded = r["loaded"]
+
+    # -X importtime: "import time: self [us] | cumulative | imported package"
+    out = subprocess.run([sys.executable, "-X", "importtime", "-c", "import main"], cwd=SERVER, env=env,
+                         capture_output=True, text=True, timeout=120)
+    by_package: Dict[str, float] = defaultdict(float)
+    for line in out.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, _, name = line[len("import time:"):].split("|")
+        by_package[name.strip().split(".")[0]] += int(self_us) / 1000
+    top = sorted(by_package.items(), key=lambda kv: -kv[1])[:10]
+
+    return {
+        "runs": runs,
+        "median_ms": round(statistics.median(times), 1),
+        "min_ms": round(min(times), 1),
+        "max_ms": round(max(times), 1),
+        "heavy_loaded": loaded,
+        "top_packages_ms": {k: round(v, 1) for k, v in top},
+    }
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _status(url: str) -> Optional[int]:
+    try:
+        with urllib.request.urlopen(url, timeout=1) as r:
+            return r.status
+    except urllib.error.HTTPError as e:
+        return e.code
+    except (OSError, urllib.error.URLError):
+        return None
+
+
+def measure_ttfr(runs: int, ready_timeout: float) -> Dict[str, Any]:
+    env = _env()
+    health: List[float] = []
+    ready: List[float] = []
+    for _ in range(runs):
+        port = _free_port()
+        base = f"http://127.0.0.1:{port}"
+        t0 = time.perf_counter()
+        proc = subprocess.Popen(
+            [sys.executable, "serve.py", "--workers", "1", "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+            cwd=SERVER, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+        )
+        try:
+            deadline = t0 + 60
+            while _status(base + "/health") != 200:
+                if proc.poll() is not None:
+                    raise RuntimeError(f"serve.py exited with {proc.returncode}:\n{proc.stderr.read().decode()[-2000:]}")
+                if time.perf_counter() > deadline:
+                    raise RuntimeError("no /health response within 60s")
+                time.sleep(0.01)
+            health.append((time.perf_counter() - t0) * 1000)
+
+            deadline = time.perf_counter() + ready_timeout
+            while time.perf_counter() < deadline:
+                if _status(base + "/ready") == 200:
+                    ready.append((time.perf_counter() - t0) * 1000)
+                    break
+                time.sleep(0.05)
+        finally:
+            proc.terminate()
+            try:
+                proc.wait(timeout=15)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+                proc.wait()
+
+    return {
+        "runs": runs,
+        "health_median_ms": round(statistics.median(health), 1),
+        "health_max_ms": round(max(health), 1),
+        # None when warm-up can't succeed here (no reachable Supabase/JWKS)
+        "ready_median_ms": round(statistics.median(ready), 1) if len(ready) == runs else None,
+    }
+
+
+def check(report: Dict[str, Any], import_budget: float, ttfr_budget: float) -> List[str]:
+    problems = []
+    imp, ttfr = report["import"], report["ttfr"]
+    if imp["median_ms"] > import_budget:
+        problems.append(f"import main: {imp['median_ms']:.0f} ms > budget {import_budget:.0f} ms")
+    eager = [m for m in imp["heavy_loaded"] if m in FORBIDDEN]
+    if eager:
+        problems.append(f"imported eagerly by main: {', '.join(eager)}")
+    if ttfr and ttfr["health_median_ms"] > ttfr_budget:
+        problems.append(f"time to first response: {ttfr['health_median_ms']:.0f} ms > budget {ttfr_budget:.0f} ms")
+    return problems
+
+
+def compare(old: Dict[str, Any], new: Dict[str, Any]) -> str:
+    rows = [("import median", "import", "median_ms"), ("ttfr /health", "ttfr", "health_median_ms"),
+            ("ttfr /ready", "ttfr", "ready_median_ms")]
+    lines = [f"{'':<16} {'old ms':>9} {'new ms':>9} {'change':>8}"]
+    for label, section, key in rows:
+        a, b = (old.get(section) or {}).get(key), (new.get(section) or {}).get(key)
+        if a is None or b is None:
+            continue
+        lines.append(f"{label:<16} {a:>9.1f} {b:>9.1f} {(b - a) / a * 100 if a else 0:>+7.1f}%")
+    return "\n".join(lines)
+
+
+def main(argv=None) -> int:
+    p = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    p.add_argument("-n", "--runs", type=int, default=5, help="fresh interpreters per measurement")
+    p.add_argument("--import-budget-ms", type=float, default=float(os.getenv("STARTUP_IMPORT_BUDGET_MS", "1500")))
+    p.add_argument("--ttfr-budget-ms", type=float, default=float(os.getenv("STARTUP_TTFR_BUDGET_MS", "3000")))
+    p.add_argument("--ready-timeout", type=float, default=5.0, help="seconds to wait for /ready per run")
+    p.add_argument("--skip-ttfr", action="store_true", help="only measure imports")
+    p.add_argument("--out", help="result path (default bench/results/startup-<time>-<commit>.json)")
+    p.add_argument("--compare", help="earlier startup result JSON to diff against")
+    args = p.parse_args(argv)
+
+    imp = measure_import(args.runs)
+    print(f"import main   median {imp['median_ms']:.0f} ms  (min {imp['min_ms']:.0f}, max {imp['max_ms']:.0f})")
+    print("  slowest packages: " + ", ".join(f"{k} {v:.0f}ms" for k, v in imp["top_packages_ms"].items()))
+    print(f"  heavy modules loaded: {', '.join(imp['heavy_loaded']) or 'none'}")
+    ttfr = None
+    if not args.skip_ttfr:
+        ttfr = measure_ttfr(args.runs, args.ready_timeout)
+        ready = f"{ttfr['ready_median_ms']:.0f} ms" if ttfr["ready_median_ms"] is not None else "n/a (warm-up not possible here)"
+        print(f"first /health median {ttfr['health_median_ms']:.0f} ms  (max {ttfr['health_max_ms']:.0f}),  first /ready {ready}")
+
+    report = {
+        "meta": {
+            "commit": _commit(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "budget_ms": {"import": args.import_budget_ms, "ttfr": args.ttfr_budget_ms},
+        },
+        "import": imp,
+        "ttfr": ttfr,
+    }
+    problems = check(report, args.import_budget_ms, args.ttfr_budget_ms)
+    report["over_budget"] = problems
+
+    out = args.out or os.path.join(HERE, "results", f"startup-{time.strftime('%Y%m%d-%H%M%S')}-{report['meta']['commit'] or 'nogit'}.json")
+    os.makedirs(os.path.dirname(out), exist_ok=True)
+    with open(out, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"results: {out}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            print(compare(json.load(f), report))
+    for msg in problems:
+        print(f"OVER BUDGET: {msg}")
+    return 1 if problems else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
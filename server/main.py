@@ -1,8 +1,11 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse
 from routes import router as api_router
+from utils import lifecycle, metrics
+from utils.compression import CompressionMiddleware
 
-app = FastAPI(title="AiTHLETIQ API", version="0.1.0")
+app = FastAPI(title="AiTHLETIQ API", version="0.1.0", lifespan=lifecycle.lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -10,10 +13,26 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "ETag"],
 )
 
+# gzip/brotli above COMPRESS_MIN_BYTES; inside metrics, so response sizes are wire bytes
+app.add_middleware(CompressionMiddleware)
+
+# outermost, so latency includes CORS and error handling
+app.add_middleware(metrics.MetricsMiddleware)
+
 app.include_router(api_router)
 
 @app.get("/health")
 def health():
     return {"ok": True}
+
+@app.get("/ready")
+def ready():
+    """Readiness: 503 until this worker's warm-up is done, and again while it drains."""
+    return JSONResponse(lifecycle.status(), status_code=200 if lifecycle.is_ready() else 503)
+
+@app.get("/metrics", include_in_schema=False)
+def prometheus_metrics():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
@@ -1,12 +1,15 @@
 from fastapi import APIRouter
-from . import auth, data, deep
-from .exercises import pushups, situps
+from . import auth, data, deep, jobs, leaderboards, sessions, uploads
+from .exercises.factory import make_router
+from utils.exercises import EXERCISES
 
 router = APIRouter()
 router.include_router(auth.router, prefix="/auth", tags=["auth"])
-# router.include_router(uploads.router, prefix="/uploads", tags=["uploads"])
-# router.include_router(jobs.router, prefix="/jobs", tags=["jobs"])
-router.include_router(pushups.router, prefix="/pushups", tags=["pushups"])
-router.include_router(situps.router, prefix="/situps", tags=["situps"])
+router.include_router(uploads.router, prefix="/uploads", tags=["uploads"])
+router.include_router(jobs.router, prefix="/jobs", tags=["jobs"])
+router.include_router(sessions.router, prefix="/sessions", tags=["sessions"])
+for _spec in EXERCISES.values():
+    router.include_router(make_router(_spec), prefix=f"/{_spec.name}", tags=[_spec.name])
+router.include_router(leaderboards.router, prefix="/leaderboards", tags=["leaderboards"])
 router.include_router(data.router, prefix="/data", tags=["data"])
 router.include_router(deep.router, prefix="/deep", tags=["analysis"])
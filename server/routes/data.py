@@ -1,65 +1,316 @@
-from fastapi import APIRouter, HTTPException
-from utils.supabase import sb
+from datetime import datetime, timezone
+from itertools import chain
+from typing import Iterator, List, Literal, Optional
+from uuid import UUID
+from fastapi import APIRouter, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, Field
+from utils import export, readcache, singleflight
+from utils.conditional import etag, not_modified, tag_response
+from utils.exercises import EXERCISES, ExerciseSpec, fetch_details, get_spec
+from utils.readcache import USER_COLUMNS, profiles, user_key
+from utils.singleflight import Group
+from utils.supabase import pool_stats, sb
 import logging
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
 
+ATHLETE_FIELDS = ("id", "username", "full_name", "age", "height_cm", "weight_kg", "coach_id")
+# projectable via ?fields= (a superset of the default columns)
+ATHLETE_PROJECTABLE = ATHLETE_FIELDS + ("gender", "created_at", "updated_at")
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+MAX_DETAIL_IDS = 500
+MAX_HISTORY = 100
+
+# a whole class opening the dashboard at once asks for the same roster page
+_rosters = Group("coach_athletes")
+
 def _data(resp):
     return getattr(resp, "data", None)
 
 def _error(resp):
     return getattr(resp, "error", None)
 
-@router.get("/athletes")
-def read_athletes():
-    resp = sb().table("users").select(
-        "id, username, full_name, age, height_cm, weight_kg, coach_id"
-    ).execute()
+def _columns(fields: Optional[str]) -> str:
+    if not fields:
+        return ", ".join(ATHLETE_FIELDS)
+    cols = [f.strip() for f in fields.split(",") if f.strip()]
+    bad = [c for c in cols if c not in ATHLETE_PROJECTABLE]
+    if bad:
+        raise HTTPException(status_code=400, detail=f"unknown fields: {', '.join(bad)}")
+    if "id" not in cols:
+        cols.insert(0, "id")  # the keyset cursor needs it
+    return ", ".join(dict.fromkeys(cols))
+
+
+def _athletes(columns: str, coach_id=None, min_age=None, max_age=None, active_since=None, **select):
+    """users query with the /athletes filters applied."""
+    if active_since is not None:
+        # summaries embedded only to filter on; _strip_activity drops them from the rows
+        columns += "".join(f", {spec.table}(last_tracked)" for spec in EXERCISES.values())
+    q = sb().table("users").select(columns, **select)
+    if coach_id:
+        q = q.eq("coach_id", coach_id)
+    if min_age is not None:
+        q = q.gte("age", min_age)
+    if max_age is not None:
+        q = q.lte("age", max_age)
+    if active_since is not None:
+        # a session in any exercise since then: last_tracked lives on the summary tables
+        since = active_since.isoformat()
+        for spec in EXERCISES.values():
+            q = q.gte(f"{spec.table}.last_tracked", since)
+        q = q.or_(",".join(f"{spec.table}.not.is.null" for spec in EXERCISES.values()))
+    return q
+
+
+def _strip_activity(rows: List[dict]) -> List[dict]:
+    tables = {spec.table for spec in EXERCISES.values()}
+    return [{k: v for k, v in r.items() if k not in tables} for r in rows]
+
+
+def _page(q, response: Response, limit: int, cursor: Optional[str], where: str):
+    """
+    Keyset page ordered by id: rows with id > cursor, one extra row fetched
+    to know whether there is a next page (sent as X-Next-Cursor).
+    """
+    rows, next_cursor = _keyset_page(q, limit, cursor, where)
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return rows
+
+
+def _keyset_page(q, limit: int, cursor: Optional[str], where: str):
+    if cursor:
+        q = q.gt("id", cursor)
+    resp = q.order("id").limit(limit + 1).execute()
 
     err = _error(resp)
     if err:
-        logger.error("Supabase error (/athletes): %s", err)
+        logger.error("Supabase error (%s): %s", where, err)
         raise HTTPException(status_code=500, detail=f"Supabase error: {err}")
 
-    return _data(resp) or []
+    rows = _data(resp) or []
+    if len(rows) > limit:
+        rows = rows[:limit]
+        return rows, str(rows[-1]["id"])
+    return rows, None
+
 
+@router.get("/athletes")
+def read_athletes(
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE,
+                                 description=f"Page size (default {DEFAULT_PAGE_SIZE} when paging with a cursor)"),
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor from the previous page"),
+    fields: Optional[str] = Query(None, description="Comma-separated columns, e.g. id,full_name,age"),
+    coach_id: Optional[str] = None,
+    min_age: Optional[int] = Query(None, ge=0),
+    max_age: Optional[int] = Query(None, ge=0),
+    active_since: Optional[datetime] = Query(None, description="Only athletes with a session at/after this time"),
+):
+    """
+    Keyset-paginated when `limit` or `cursor` is given. Without either the
+    whole filtered list is returned, as existing clients expect; it is still
+    read from the database in MAX_PAGE_SIZE pages.
+    """
+    def query():
+        return _athletes(_columns(fields), coach_id, min_age, max_age, active_since)
+
+    if limit is None and cursor is None:
+        rows, next_cursor = [], None
+        while True:
+            page, next_cursor = _keyset_page(query(), MAX_PAGE_SIZE, next_cursor, "/athletes")
+            rows += page
+            if not next_cursor:
+                break
+    else:
+        rows = _page(query(), response, limit or DEFAULT_PAGE_SIZE, cursor, "/athletes")
+    return _strip_activity(rows) if active_since is not None else rows
+
+
+def _specs(exercise: Optional[List[str]]) -> List[ExerciseSpec]:
+    return [get_spec(e) for e in dict.fromkeys(exercise)] if exercise else list(EXERCISES.values())
+
+
+def _export(kind: str, fmt: str, gz: bool, pages: Iterator[list], header=None, flatten=None) -> StreamingResponse:
+    first = next(pages, None)  # the first round-trip runs here, so DB errors still get a proper status
+    pages = chain([first] if first is not None else [], pages)
+    chunks = export.csv_chunks(header, pages, flatten) if fmt == "csv" else export.ndjson_chunks(pages)
+    media = "text/csv; charset=utf-8" if fmt == "csv" else "application/x-ndjson"
+    filename = f"{kind}-{datetime.now(timezone.utc):%Y%m%d-%H%M%S}.{fmt}"
+    if gz:
+        chunks, media, filename = export.gzipped(chunks), "application/gzip", filename + ".gz"
+    return StreamingResponse(chunks, media_type=media, headers={"Content-Disposition": f'attachment; filename="{filename}"'})
+
+
+@router.get("/export/athletes")
+def export_athletes(
+    format: Literal["csv", "ndjson"] = "csv",
+    gzip: bool = False,
+    coach_id: Optional[str] = None,
+    exercise: Optional[List[str]] = Query(None, description="Exercise summaries to include (repeatable); default all"),
+    with_records_only: bool = Query(False, description="Skip athletes with no record for any selected exercise"),
+):
+    """
+    Every athlete with their per-exercise summaries, streamed page by page
+    (constant memory). CSV columns are flattened as <exercise>_<field>.
+    """
+    specs = _specs(exercise)
+    pages = export.athlete_pages(specs, coach_id, with_records_only)
+    header = export.athlete_header(specs)
+    return _export("athletes", format, gzip, pages, header, lambda r: export.flatten_athlete(r, specs))
+
+
+@router.get("/export/sessions")
+def export_sessions(
+    format: Literal["csv", "ndjson"] = "csv",
+    gzip: bool = False,
+    coach_id: Optional[str] = None,
+    exercise: Optional[List[str]] = Query(None, description="Exercises to include (repeatable); default all"),
+):
+    """Raw sessions (one row per recorded session), streamed page by page."""
+    pages = export.session_pages(_specs(exercise), coach_id)
+    header = list(export.SESSION_COLUMNS)
+    return _export("sessions", format, gzip, pages, header, lambda r: [r.get(c) for c in header])
 
-@router.get("/athletes/{athlete_id}")
-def read_athlete(athlete_id: str):
-    resp = (
-        sb()
-        .table("users")
-        .select("id, username, full_name, age, height_cm, weight_kg, coach_id")
-        .eq("id", athlete_id)
-        .limit(1)
-        .execute()
-    )
+
+@router.get("/athletes/count")
+def count_athletes(
+    coach_id: Optional[str] = None,
+    min_age: Optional[int] = Query(None, ge=0),
+    max_age: Optional[int] = Query(None, ge=0),
+    active_since: Optional[datetime] = None,
+    estimate: bool = Query(False, description="Use the planner estimate instead of an exact count"),
+):
+    """Row count for the same filters as /athletes, without fetching rows."""
+    q = _athletes("id", coach_id, min_age, max_age, active_since, count="planned" if estimate else "exact", head=True)
+    resp = q.execute()
 
     err = _error(resp)
     if err:
-        logger.error("Supabase error (/athletes/%s): %s", athlete_id, err)
+        logger.error("Supabase error (/athletes/count): %s", err)
         raise HTTPException(status_code=500, detail=f"Supabase error: {err}")
 
-    rows = _data(resp) or []
+    return {"count": getattr(resp, "count", None) or 0, "estimate": estimate}
+
+
+@router.get("/athletes/{athlete_id}")
+def read_athlete(athlete_id: str, request: Request, response: Response):
+    def load():
+        resp = sb().table("users").select(USER_COLUMNS).eq("id", athlete_id).limit(1).execute()
+        err = _error(resp)
+        if err:
+            logger.error("Supabase error (/athletes/%s): %s", athlete_id, err)
+            raise HTTPException(status_code=500, detail=f"Supabase error: {err}")
+        return (_data(resp) or [None])[0]
+
+    row = profiles.get(user_key(athlete_id), load)
+    if not row:
+        raise HTTPException(status_code=404, detail="Athlete not found")
+    out = {k: row.get(k) for k in ATHLETE_FIELDS}
+    tag = etag("athlete", row["id"], row.get("updated_at") or sorted(out.items()))
+    unchanged = not_modified(request, tag)
+    if unchanged is not None:
+        return unchanged
+    tag_response(response, tag)
+    return out
+
+
+@router.get("/athletes/{athlete_id}/details")
+def read_athlete_details(athlete_id: UUID, history: int = Query(10, ge=0, le=MAX_HISTORY)):
+    """Profile, every exercise's aggregates and the most recent sessions in one round-trip."""
+    rows = fetch_details([athlete_id], history)
     if not rows:
         raise HTTPException(status_code=404, detail="Athlete not found")
     return rows[0]
 
 
+@router.get("/athletes/{athlete_id}/progress/{exercise}")
+def read_athlete_progress(
+    athlete_id: UUID,
+    exercise: str,
+    window: int = Query(7, ge=1, le=365),
+    bucket: Literal["session", "day", "week", "month"] = "session",
+    max_points: int = Query(200, ge=10, le=2000),
+    days: Optional[int] = Query(None, ge=1, le=3650),
+):
+    """Progress analytics for one athlete and exercise (same shape as GET /<exercise>/progress)."""
+    from utils import progress
+
+    out = progress.progress(get_spec(exercise), str(athlete_id), window, bucket, max_points, days)
+    if out is None:
+        raise HTTPException(status_code=404, detail=f"Athlete has no {exercise} record")
+    return out
+
+
+class DetailsRequest(BaseModel):
+    ids: List[UUID] = Field(..., min_length=1, max_length=MAX_DETAIL_IDS)
+    history: int = Field(10, ge=0, le=MAX_HISTORY)
+
+
+@router.post("/athletes/details")
+def read_athletes_details(body: DetailsRequest):
+    """
+    Batched /athletes/{id}/details (e.g. a coach's whole roster): one
+    round-trip whatever the number of athletes and exercises.
+    """
+    rows = fetch_details(body.ids, body.history)
+    found = {r["profile"]["id"] for r in rows}
+    return {"athletes": rows, "missing": [str(i) for i in body.ids if str(i) not in found]}
+
+
+@router.get("/cache")
+def read_cache_stats():
+    """
+    Hit ratios and Supabase round-trips saved by the profile/record
+    read-through caches, and calls collapsed by single-flight coalescing.
+    """
+    return {**readcache.stats(), "singleflight": singleflight.stats()}
+
+
+@router.get("/pool")
+def read_pool_stats():
+    """Supabase connection pool: open/active connections, reuse ratio, TLS handshakes, wait time."""
+    return pool_stats()
+
+
 @router.get("/coaches/{coach_id}/athletes")
-def read_coach_athletes(coach_id: str):  # <-- str, not 'string'
-    resp = (
-        sb()
-        .table("users")
-        .select("id, username, full_name, age, height_cm, weight_kg, coach_id")
-        .eq("coach_id", coach_id)
-        .execute()
-    )
+def read_coach_athletes(
+    coach_id: str,  # <-- str, not 'string'
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE,
+                                 description=f"Page size (default {DEFAULT_PAGE_SIZE} when paging with a cursor)"),
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor from the previous page"),
+    fields: Optional[str] = None,
+):
+    """
+    Keyset-paginated when `limit` or `cursor` is given; otherwise the whole
+    roster, like /athletes.
+    """
+    columns = _columns(fields)
+    where = f"/coaches/{coach_id}/athletes"
 
-    err = _error(resp)
-    if err:
-        logger.error("Supabase error (/coaches/%s/athletes): %s", coach_id, err)
-        raise HTTPException(status_code=500, detail=f"Supabase error: {err}")
+    def query():
+        return sb().table("users").select(columns).eq("coach_id", coach_id)
+
+    def roster():
+        rows, next_cursor = [], None
+        while True:
+            page, next_cursor = _keyset_page(query(), MAX_PAGE_SIZE, next_cursor, where)
+            rows += page
+            if not next_cursor:
+                return rows, None
 
-    return _data(resp) or []
+    if limit is None and cursor is None:
+        rows, next_cursor = _rosters.do((coach_id, None, None, columns), roster)
+    else:
+        limit = limit or DEFAULT_PAGE_SIZE
+        rows, next_cursor = _rosters.do(
+            (coach_id, limit, cursor, columns), lambda: _keyset_page(query(), limit, cursor, where)
+        )
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return rows
@@ -1,26 +1,35 @@
 from __future__ import annotations
 
+import asyncio
+import json
 from datetime import datetime
 from enum import Enum
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Sequence
 
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel, Field
 
 from utils.deepanalysis import (
     analyze_frames,
+    cache_stats,
+    scheduler_stats,
     DEFAULT_PROMPT,
     DEFAULT_MODEL,
-    _MAX_FRAMES,
+    open_stream,
+    AnalysisResult,
 )
-from utils.supabase import sb
+from utils.exercises import EXERCISES, RECORD_COLUMNS
+from utils.readcache import USER_COLUMNS, profiles, record_key, records, user_key
+from utils.scheduler import CircuitOpen, DeadlineExceeded
+from utils.supabase import asb
+from routes.uploads import spool_request
 
 router = APIRouter()
 
 
-class Exercise(str, Enum):
-    pushups = "pushups"
-    situps = "situps"
+# one member per registered exercise (utils/exercises.py)
+Exercise = Enum("Exercise", {name: name for name in EXERCISES}, type=str)
 
 
 class AnalyzeRequest(BaseModel):
@@ -41,38 +50,32 @@ class AnalyzeResponse(BaseModel):
     frames_used: int
     model: str
     context_used: Dict[str, Any]
+    preprocessing: Optional[Dict[str, Any]] = Field(
+        None, description="frames_in/frames_kept and bytes_in/bytes_out of the frame preprocessing stage"
+    )
+    cached: bool = False
 
 
-def _fetch_user_context(user_id: str) -> Dict[str, Any]:
-    s = sb()
+async def _fetch_user_context(user_id: str) -> Dict[str, Any]:
+    async def load():
+        s = await asb()
+        u = await s.table("users").select(USER_COLUMNS).eq("id", user_id).limit(1).execute()
+        return (u.data or [None])[0]
 
-    # users table
-    u = (
-        s.table("users")
-        .select("id, username, full_name, age, gender, height_cm, weight_kg, coach_id, updated_at, created_at")
-        .eq("id", user_id)
-        .limit(1)
-        .execute()
-    )
-    user_row = (u.data or [None])[0]
+    user_row = await profiles.aget(user_key(user_id), load)
     if not user_row:
         raise HTTPException(status_code=404, detail="user not found")
 
     return user_row
 
 
-def _fetch_exercise_stats(user_id: str, exercise: Exercise) -> Dict[str, Any]:
-    s = sb()
-    # pick latest row for this user
-    q = (
-        s.table(exercise.value)
-        .select("id, user_id, max_reps, avg_reps, history, last_tracked, score, created_at, updated_at")
-        .eq("user_id", user_id)
-        .order("updated_at", desc=True)
-        .limit(1)
-        .execute()
-    )
-    row = (q.data or [None])[0]
+async def _fetch_exercise_stats(user_id: str, exercise: Exercise) -> Dict[str, Any]:
+    async def load():
+        s = await asb()
+        q = await s.table(EXERCISES[exercise.value].table).select(RECORD_COLUMNS).eq("user_id", user_id).limit(1).execute()
+        return (q.data or [None])[0]
+
+    row = await records.aget(record_key(exercise.value, user_id), load)
     return row or {}  # if none exists yet
 
 
@@ -116,29 +119,184 @@ def _compose_prompt(base_prompt: Optional[str], user_ctx: Dict[str, Any], ex_ctx
     return final_prompt
 
 
+async def _load_context(body: AnalyzeRequest):
+    # independent lookups, run them concurrently
+    user_ctx, ex_ctx = await asyncio.gather(
+        _fetch_user_context(body.user_id),
+        _fetch_exercise_stats(body.user_id, body.exercise),
+    )
+    return user_ctx, ex_ctx, _compose_prompt(body.prompt, user_ctx, ex_ctx, body.exercise)
+
+
+async def run_analysis(body: AnalyzeRequest, frames: Optional[Sequence[Any]] = None) -> AnalyzeResponse:
+    """
+    Full analysis pipeline (context lookups, prompt, vision call). Shared by
+    the synchronous route and the background job worker. `frames` overrides
+    body.frames with raw bytes / file-like frames (no base64 round-trip).
+    """
+    user_ctx, ex_ctx, combined_prompt = await _load_context(body)
+
+    analysis = await analyze_frames(
+        frames_base64=frames if frames is not None else body.frames,
+        prompt=combined_prompt,
+        model=body.model or DEFAULT_MODEL,
+        max_output_tokens=body.max_output_tokens or 800,
+        temperature=body.temperature if body.temperature is not None else 0.2,
+    )
+    return AnalyzeResponse(
+        result=analysis.text,
+        frames_used=analysis.frames_used,
+        model=body.model or DEFAULT_MODEL,
+        context_used={"user": user_ctx, "exercise": ex_ctx},
+        preprocessing=analysis.preprocessing,
+        cached=analysis.cached,
+    )
+
+
+def _http_error(e: Exception) -> HTTPException:
+    if isinstance(e, ValueError):
+        return HTTPException(status_code=422, detail=str(e))
+    if isinstance(e, CircuitOpen):
+        return HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "30"})
+    if isinstance(e, DeadlineExceeded):
+        return HTTPException(status_code=504, detail=str(e))
+    return HTTPException(status_code=502, detail=str(e))
+
+
 @router.post("/analyze", response_model=AnalyzeResponse)
 async def analyze(body: AnalyzeRequest):
     try:
-        user_ctx = _fetch_user_context(body.user_id)
-        ex_ctx = _fetch_exercise_stats(body.user_id, body.exercise)
+        return await run_analysis(body)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise _http_error(e)
 
-        combined_prompt = _compose_prompt(body.prompt, user_ctx, ex_ctx, body.exercise)
 
-        text = analyze_frames(
+def _sse(event: str, data: Dict[str, Any]) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+@router.post("/analyze/stream")
+async def analyze_stream(body: AnalyzeRequest):
+    """
+    Server-Sent Events variant of /analyze. Emits `delta` events
+    ({"text": ...}) as the model writes, then one `done` event carrying the
+    AnalyzeResponse fields, or an `error` event ({"detail": ...}) if the
+    model fails mid-stream. Invalid input gets the same 4xx as /analyze.
+    """
+    # resolve context and check the frames up front so a missing user is still
+    # a plain 404, bad input a 422 (and a DB failure a 502), as with /analyze
+    model = body.model or DEFAULT_MODEL
+    try:
+        user_ctx, ex_ctx, combined_prompt = await _load_context(body)
+        items = await open_stream(
             frames_base64=body.frames,
             prompt=combined_prompt,
-            model=body.model or DEFAULT_MODEL,
+            model=model,
             max_output_tokens=body.max_output_tokens or 800,
             temperature=body.temperature if body.temperature is not None else 0.2,
         )
-        return AnalyzeResponse(
-            result=text,
-            frames_used=min(len(body.frames), _MAX_FRAMES),
-            model=body.model or DEFAULT_MODEL,
-            context_used={"user": user_ctx, "exercise": ex_ctx},
-        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise _http_error(e)
+
+    async def events():
+        yield ": ok\n\n"  # flush headers right away
+        try:
+            async for item in items:
+                if isinstance(item, AnalysisResult):
+                    final = AnalyzeResponse(
+                        result=item.text,
+                        frames_used=item.frames_used,
+                        model=model,
+                        context_used={"user": user_ctx, "exercise": ex_ctx},
+                        preprocessing=item.preprocessing,
+                        cached=item.cached,
+                    )
+                    yield _sse("done", final.model_dump(mode="json"))
+                else:
+                    yield _sse("delta", {"text": item})
+        except Exception as e:
+            yield _sse("error", {"detail": str(e)})
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
+
+@router.post("/analyze/upload", response_model=AnalyzeResponse)
+async def analyze_upload(
+    request: Request,
+    user_id: str = Query(..., description="UUID of the user"),
+    exercise: Exercise = Query(...),
+    prompt: Optional[str] = Query(None),
+    model: Optional[str] = Query(None),
+    temperature: float = Query(0.2, ge=0, le=2),
+    max_output_tokens: int = Query(400, ge=1, le=4096),
+):
+    """
+    Same as /analyze but frames arrive as binary multipart files or an
+    application/x-frame-stream body (see routes/uploads.py), earliest → latest.
+    Frames are spooled to disk as they stream in and fed to preprocessing as
+    raw bytes, so memory tracks one frame rather than the whole set.
+    """
+    spool = await spool_request(request)
+    try:
+        body = AnalyzeRequest(
+            user_id=user_id,
+            exercise=exercise,
+            frames=[],
+            prompt=prompt,
+            model=model,
+            temperature=temperature,
+            max_output_tokens=max_output_tokens,
+        )
+        return await run_analysis(body, frames=spool.frames())
     except HTTPException:
         raise
     except Exception as e:
-        raise HTTPException(status_code=502, detail=str(e))
+        raise _http_error(e)
+    finally:
+        spool.close()
+
+
+class RepsRequest(BaseModel):
+    exercise: Exercise
+    fps: float = Field(30.0, gt=0, le=240)
+    keypoints: List[List[List[float]]] = Field(
+        ...,
+        description="Per frame, 17 COCO keypoints as [x, y] or [x, y, confidence] (YOLOv8-pose order)",
+    )
+
+
+@router.post("/reps")
+def count_reps(body: RepsRequest):
+    """
+    Server-side rep count and form score from pose keypoints: joint angles,
+    rep segmentation, depth/ROM and tempo, computed with NumPy on CPU. Plain
+    `def` so the work runs in the threadpool, off the event loop.
+    """
+    from utils.pose import PROFILES, analyze_sequence  # NumPy loads on first use
+
+    if body.exercise.value not in PROFILES:
+        raise HTTPException(status_code=422, detail=f"rep counting not available for {body.exercise.value}")
+    try:
+        return analyze_sequence(body.keypoints, body.exercise.value, body.fps)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
+
+@router.get("/cache")
+def analysis_cache_stats():
+    """Hit/miss counters for the vision result cache."""
+    return cache_stats()
+
+
+@router.get("/scheduler")
+def model_scheduler_stats():
+    """Concurrency, queue depth, wait time, retries and circuit state for model calls."""
+    return scheduler_stats()
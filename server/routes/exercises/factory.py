@@ -0,0 +1,111 @@
+from typing import Literal, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from pydantic import Field, create_model
+
+from deps import Authed
+from utils.conditional import not_modified, tag_response
+from utils.exercises import ExerciseSpec, append_session, get_record, get_version, insert_record, record_etag
+
+Bucket = Literal["session", "day", "week", "month"]
+
+
+def make_router(spec: ExerciseSpec) -> APIRouter:
+    """
+    GET/POST/PATCH for one exercise, e.g. /pushups. Every exercise gets the
+    same handlers and query path; only the spec differs.
+    """
+    router = APIRouter()
+    name = spec.name
+
+    Create = create_model(
+        f"{name.title()}Create",
+        session_reps=(Optional[int], Field(default=None, ge=0, le=spec.max_value)),
+        session_score=(Optional[float], Field(default=None, ge=0, le=100)),
+    )
+    Patch = create_model(
+        f"{name.title()}Patch",
+        session_reps=(int, Field(ge=0, le=spec.max_value)),
+        session_score=(Optional[float], Field(default=None, ge=0, le=100)),
+    )
+
+    @router.get("", name=f"get_{name}")
+    def read_record(request: Request, response: Response, user=Depends(Authed)):
+        """
+        Return the caller's record; 404 if none exists yet. Tagged with an
+        ETag: polling with If-None-Match gets a bodiless 304 while unchanged,
+        checked against the version columns only.
+        """
+        if request.headers.get("if-none-match"):
+            version = get_version(spec, user["sub"])
+            if version:
+                unchanged = not_modified(request, record_etag(spec, version))
+                if unchanged is not None:
+                    return unchanged
+        row = get_record(spec, user["sub"])
+        if not row:
+            raise HTTPException(404, f"no {name} record")
+        tag_response(response, record_etag(spec, row))
+        return row
+
+    @router.get("/history", name=f"history_{name}")
+    def read_history(user=Depends(Authed)):
+        """
+        Every session, oldest first, as parallel arrays with delta-encoded
+        timestamps: {t0, dt: [seconds since previous], reps, score}.
+        """
+        from utils import progress
+
+        out = progress.history(spec, user["sub"])
+        if out is None:
+            raise HTTPException(404, f"no {name} record")
+        return out
+
+    @router.get("/progress", name=f"progress_{name}")
+    def read_progress(
+        user=Depends(Authed),
+        window: int = Query(7, ge=1, le=365, description="sessions in the rolling average"),
+        bucket: Bucket = "session",
+        max_points: int = Query(200, ge=10, le=2000),
+        days: Optional[int] = Query(None, ge=1, le=3650, description="limit trends/series to the last N days"),
+    ):
+        """Rolling average, personal bests, streaks, improvement rate and a downsampled series."""
+        from utils import progress
+
+        out = progress.progress(spec, user["sub"], window, bucket, max_points, days)
+        if out is None:
+            raise HTTPException(404, f"no {name} record")
+        return out
+
+    @router.post("", name=f"create_{name}")
+    def create_record(body: Create, user=Depends(Authed)):
+        """
+        Create the caller's record.
+        If it exists, return it (idempotent).
+        Optionally seeds with a first session (session_reps, session_score).
+        """
+        user_id = user["sub"]
+        existing = get_record(spec, user_id)
+        if existing:
+            return existing
+
+        if body.session_reps is not None:
+            score = float(body.session_score) if body.session_score is not None else None
+            return append_session(spec, user_id, int(body.session_reps), score)
+
+        return insert_record(spec, user_id)
+
+    @router.patch("", name=f"patch_{name}")
+    def patch_record(body: Patch, user=Depends(Authed)):
+        """
+        Append a new session (reps + optional score); aggregates update incrementally.
+        """
+        # upserts the record if it doesn't exist yet
+        return append_session(
+            spec,
+            user["sub"],
+            int(body.session_reps),
+            float(body.session_score) if body.session_score is not None else None,
+        )
+
+    return router
@@ -0,0 +1,60 @@
+from typing import List, Optional
+
+from fastapi import APIRouter, HTTPException
+from pydantic import Field
+
+from routes.deep import AnalyzeRequest
+from routes.uploads import store_frames
+from utils.storage import job_queue, QueueFull
+
+router = APIRouter()
+
+ANALYZE_JOB = "deep.analyze"
+
+
+class AnalyzeJobRequest(AnalyzeRequest):
+    frames: Optional[List[str]] = Field(None, description="Inline frames; omit when passing upload_id")
+    upload_id: Optional[str] = Field(None, description="Frame set stored via POST /uploads")
+
+
+@router.get("")
+def queue_stats():
+    """Job counts by status."""
+    return job_queue().depth()
+
+
+@router.post("", status_code=202)
+def submit_analysis(body: AnalyzeJobRequest):
+    """
+    Enqueue a deep analysis and return immediately; poll GET /jobs/{job_id}.
+    Responds 429 when the queue is full so clients back off.
+    """
+    q = job_queue()
+    stored = False
+    if body.upload_id:
+        if not q.get_upload(body.upload_id):
+            raise HTTPException(404, "upload not found")
+        upload_id = body.upload_id
+    elif body.frames:
+        upload_id = store_frames(body.frames)["upload_id"]
+        stored = True
+    else:
+        raise HTTPException(422, "frames or upload_id required")
+
+    payload = body.model_dump(mode="json", exclude={"frames", "upload_id"})
+    payload["upload_id"] = upload_id
+    try:
+        job_id = q.submit(ANALYZE_JOB, payload)
+    except QueueFull:
+        if stored:  # nothing will ever read it; a caller's own upload_id stays for their retry
+            q.delete_upload(upload_id)
+        raise HTTPException(429, "analysis queue is full, retry later", headers={"Retry-After": "5"})
+    return {"job_id": job_id, "status": "queued", "upload_id": upload_id}
+
+
+@router.get("/{job_id}")
+def get_job(job_id: str):
+    job = job_queue().get(job_id)
+    if not job:
+        raise HTTPException(404, "job not found")
+    return job
@@ -0,0 +1,55 @@
+from typing import Literal, Optional
+
+from fastapi import APIRouter, HTTPException, Query
+
+from utils import leaderboard as lb
+from utils.exercises import get_spec
+
+router = APIRouter()
+
+Metric = Literal["max_reps", "avg_reps", "score"]
+
+
+def _band(gender: Optional[str], age_band: Optional[str]):
+    if age_band and age_band not in lb.AGE_BANDS:
+        raise HTTPException(422, f"age_band must be one of: {', '.join(lb.AGE_BANDS)}")
+    return (gender.strip().lower() if gender else lb.ANY), (age_band or lb.ANY)
+
+
+@router.get("")
+def leaderboard_info():
+    """Available age bands and per-exercise athletes ranked / last build time."""
+    return {"metrics": list(lb.METRICS), "age_bands": list(lb.AGE_BANDS), "exercises": lb.stats()}
+
+
+@router.get("/{exercise}")
+def top_athletes(
+    exercise: str,
+    metric: Metric = "max_reps",
+    gender: Optional[str] = None,
+    age_band: Optional[str] = Query(None, description="e.g. 14-17; see GET /leaderboards"),
+    limit: int = Query(50, ge=1, le=500),
+    offset: int = Query(0, ge=0),
+):
+    """Top athletes for an exercise/metric, optionally within a gender/age band."""
+    spec = get_spec(exercise)
+    g, a = _band(gender, age_band)
+    total, entries = lb.top(spec, metric, g, a, limit, offset)
+    return {"exercise": exercise, "metric": metric, "gender": g, "age_band": a, "total": total, "entries": entries}
+
+
+@router.get("/{exercise}/athletes/{user_id}")
+def athlete_rank(
+    exercise: str,
+    user_id: str,
+    metric: Metric = "max_reps",
+    gender: Optional[str] = None,
+    age_band: Optional[str] = None,
+):
+    """Rank and percentile of one athlete (percentile = share scoring below, ties counted half)."""
+    spec = get_spec(exercise)
+    g, a = _band(gender, age_band)
+    r = lb.rank(spec, user_id, metric, g, a)
+    if r is None:
+        raise HTTPException(404, f"athlete has no {metric} for {exercise} in this band")
+    return {"exercise": exercise, "metric": metric, "gender": g, "age_band": a, "user_id": user_id, **r}
@@ -0,0 +1,110 @@
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional
+from uuid import UUID
+
+from fastapi import APIRouter, Depends, HTTPException
+from pydantic import BaseModel, Field, TypeAdapter, ValidationError
+
+from deps import Authed
+from utils.exercises import EXERCISES, append_sessions
+from utils.supabase import sb
+
+router = APIRouter()
+
+BULK_MAX_SESSIONS = 5000
+# offline clocks drift; anything further ahead than this is rejected
+MAX_CLOCK_SKEW = timedelta(minutes=10)
+
+
+class SessionItem(BaseModel):
+    key: str = Field(..., min_length=1, max_length=128, description="Client idempotency key, unique per user")
+    exercise: str
+    reps: int = Field(..., ge=0)
+    score: Optional[float] = Field(None, ge=0, le=100)
+    recorded_at: Optional[datetime] = Field(None, description="When the session was recorded (defaults to now)")
+    user_id: Optional[UUID] = Field(None, description="Defaults to the caller; coaches may upload for their athletes")
+
+
+class BulkSessionsRequest(BaseModel):
+    # items are validated one by one so a bad item doesn't sink the batch
+    sessions: List[Dict[str, Any]] = Field(..., min_length=1, max_length=BULK_MAX_SESSIONS)
+
+
+_item = TypeAdapter(SessionItem)
+
+
+def _coached(coach_id: str, user_ids: List[str]) -> set:
+    """Subset of user_ids whose coach is coach_id (chunked to keep the query URL short)."""
+    ok = set()
+    for i in range(0, len(user_ids), 200):
+        res = sb().table("users").select("id").eq("coach_id", coach_id).in_("id", user_ids[i:i + 200]).execute()
+        ok.update(r["id"] for r in res.data or [])
+    return ok
+
+
+@router.post("/bulk")
+def bulk_sessions(body: BulkSessionsRequest, user=Depends(Authed)):
+    """
+    Offline-sync ingestion: many sessions across exercises (and, for coaches,
+    athletes) in one request. Each item gets a result in input order:
+    applied, duplicate (key already stored, e.g. a replayed batch) or
+    rejected (with the validation error).
+    """
+    caller = user["sub"]
+    now = datetime.now(timezone.utc)
+    results: List[Optional[Dict[str, Any]]] = [None] * len(body.sessions)
+    valid: List[tuple] = []
+
+    for i, raw in enumerate(body.sessions):
+        key = raw.get("key") if isinstance(raw, dict) else None
+        try:
+            item = _item.validate_python(raw)
+        except ValidationError as e:
+            err = e.errors(include_url=False)[0]
+            results[i] = {"key": key, "status": "rejected", "error": f"{'.'.join(map(str, err['loc']))}: {err['msg']}"}
+            continue
+        spec = EXERCISES.get(item.exercise)
+        recorded = item.recorded_at
+        if recorded is not None and recorded.tzinfo is None:
+            recorded = recorded.replace(tzinfo=timezone.utc)
+        error = None
+        if spec is None:
+            error = f"unknown exercise: {item.exercise}"
+        elif item.reps > spec.max_value:
+            error = f"reps must be <= {spec.max_value}"
+        elif recorded is not None and recorded > now + MAX_CLOCK_SKEW:
+            error = "recorded_at is in the future"
+        if error:
+            results[i] = {"key": item.key, "status": "rejected", "error": error}
+            continue
+        valid.append((i, {
+            "key": item.key,
+            "user_id": str(item.user_id) if item.user_id else caller,
+            "exercise": spec.table,
+            "reps": item.reps,
+            "score": item.score,
+            "recorded_at": (recorded or now).isoformat(),
+        }))
+
+    others = sorted({s["user_id"] for _, s in valid} - {caller})
+    if others:
+        allowed = _coached(caller, others)
+        kept = []
+        for i, s in valid:
+            if s["user_id"] == caller or s["user_id"] in allowed:
+                kept.append((i, s))
+            else:
+                results[i] = {"key": s["key"], "status": "rejected", "error": "not your athlete"}
+        valid = kept
+
+    if valid:
+        stored = append_sessions([s for _, s in valid])
+        if len(stored) != len(valid):
+            raise HTTPException(500, "bulk insert returned a partial result")
+        for (i, _), r in zip(valid, stored):
+            results[i] = r
+
+    counts = {"applied": 0, "duplicate": 0, "rejected": 0}
+    for r in results:
+        counts[r["status"]] += 1
+    return {**counts, "results": results}
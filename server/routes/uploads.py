@@ -0,0 +1,169 @@
+import asyncio
+import base64
+import binascii
+from typing import List
+
+from fastapi import APIRouter, HTTPException, Request
+from pydantic import BaseModel, Field
+
+try:
+    from python_multipart.exceptions import FormParserError
+    from python_multipart.multipart import MultipartParser, parse_options_header
+except ModuleNotFoundError:  # older python-multipart releases
+    from multipart.exceptions import FormParserError
+    from multipart.multipart import MultipartParser, parse_options_header
+
+from utils.storage import FrameSpool, job_queue
+
+router = APIRouter()
+
+# application/x-frame-stream: repeated [4-byte big-endian length][frame bytes]
+FRAME_STREAM_TYPE = "application/x-frame-stream"
+
+
+class FramesUpload(BaseModel):
+    frames: List[str] = Field(..., min_length=1, description="Base64 images or data URLs, earliest → latest")
+
+
+def _decode_frame(b64: str) -> bytes:
+    b64 = b64.strip()
+    if b64.startswith("data:"):
+        b64 = b64.split(",", 1)[-1]
+    try:
+        return base64.b64decode(b64, validate=False)
+    except (binascii.Error, ValueError):
+        raise HTTPException(400, "frame is not valid base64")
+
+
+def store_frames(frames: List[str]) -> dict:
+    """Decode and persist a base64 frame set; returns the upload record."""
+    try:
+        return job_queue().put_frames(_decode_frame(f) for f in frames)
+    except ValueError as e:
+        raise HTTPException(413, str(e))
+
+
+async def _spool_multipart(request: Request, boundary: bytes, spool: FrameSpool) -> None:
+    # every part with a filename is a frame, in upload order; plain fields are ignored
+    state = {"header": b"", "disposition": b"", "is_file": False}
+
+    def on_header_field(data, start, end):
+        state["header"] += data[start:end]
+
+    def on_header_value(data, start, end):
+        if state["header"].lower() == b"content-disposition":
+            state["disposition"] += data[start:end]
+
+    def on_header_end():
+        state["header"] = b""
+
+    def on_headers_finished():
+        state["is_file"] = b"filename=" in state["disposition"]
+        state["disposition"] = b""
+        if state["is_file"]:
+            spool.begin()
+
+    def on_part_data(data, start, end):
+        if state["is_file"]:
+            spool.write(data[start:end])
+
+    def on_part_end():
+        if state["is_file"]:
+            spool.end()
+        state["is_file"] = False
+
+    parser = MultipartParser(boundary, {
+        "on_header_field": on_header_field,
+        "on_header_value": on_header_value,
+        "on_header_end": on_header_end,
+        "on_headers_finished": on_headers_finished,
+        "on_part_data": on_part_data,
+        "on_part_end": on_part_end,
+    })
+    async for chunk in request.stream():
+        parser.write(chunk)
+    parser.finalize()
+
+
+async def _spool_frame_stream(request: Request, spool: FrameSpool) -> None:
+    buf = bytearray()
+    remaining = 0  # bytes left in the current frame
+    async for chunk in request.stream():
+        buf += chunk
+        while buf:
+            if remaining == 0:
+                if len(buf) < 4:
+                    break
+                remaining = int.from_bytes(buf[:4], "big")
+                del buf[:4]
+                if remaining > spool.max_frame_bytes:
+                    raise ValueError(f"frame larger than {spool.max_frame_bytes} bytes")
+                spool.begin()
+                if remaining == 0:
+                    spool.end()
+                    continue
+            take = min(remaining, len(buf))
+            spool.write(bytes(buf[:take]))
+            del buf[:take]
+            remaining -= take
+            if remaining == 0:
+                spool.end()
+    if remaining or buf:
+        raise HTTPException(400, "truncated frame stream")
+
+
+async def spool_request(request: Request) -> FrameSpool:
+    """
+    Stream a multipart/form-data or application/x-frame-stream body into a
+    FrameSpool without holding the whole upload in memory. Caller closes it.
+    """
+    ctype, params = parse_options_header(request.headers.get("content-type", ""))
+    ctype = ctype.decode() if isinstance(ctype, bytes) else ctype
+    spool = FrameSpool()
+    try:
+        if ctype == "multipart/form-data" and params.get(b"boundary"):
+            await _spool_multipart(request, params[b"boundary"], spool)
+        elif ctype == FRAME_STREAM_TYPE:
+            await _spool_frame_stream(request, spool)
+        else:
+            raise HTTPException(415, f"expected multipart/form-data or {FRAME_STREAM_TYPE}")
+        if not len(spool):
+            raise HTTPException(422, "no frames in upload")
+    except FormParserError as e:  # a ValueError too, but malformed rather than too large
+        spool.close()
+        raise HTTPException(400, f"malformed multipart body: {e}")
+    except ValueError as e:
+        spool.close()
+        raise HTTPException(413, str(e))
+    except Exception:
+        spool.close()
+        raise
+    return spool
+
+
+@router.post("", status_code=201)
+def create_upload(body: FramesUpload):
+    """Store a frame set once so several analysis jobs can reference it."""
+    return store_frames(body.frames)
+
+
+@router.post("/stream", status_code=201)
+async def create_upload_stream(request: Request):
+    """
+    Same as POST /uploads but with binary frames (multipart files or an
+    application/x-frame-stream body) instead of base64 JSON.
+    """
+    spool = await spool_request(request)
+    try:
+        frames = spool.frames()
+        return await asyncio.to_thread(job_queue().put_frames, (bytes(f) for f in frames))
+    finally:
+        spool.close()
+
+
+@router.get("/{upload_id}")
+def get_upload(upload_id: str):
+    row = job_queue().get_upload(upload_id)
+    if not row:
+        raise HTTPException(404, "upload not found")
+    return row
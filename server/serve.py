@@ -0,0 +1,71 @@
+"""
+Production entry point (run.py is the auto-reloading dev server):
+
+    python serve.py                       # one worker per available core
+    python serve.py --workers 4 --port 8080
+
+Each worker warms up its clients before it starts listening. With
+WARMUP_BLOCKING=0 it listens right away and warms up in the background;
+then only GET /ready (200 when done) is gated, so the load balancer must
+probe /ready rather than /health. On SIGTERM workers stop accepting connections, let
+in-flight requests, including running analyses, finish for up to
+--graceful-timeout seconds, then exit.
+"""
+import argparse
+import importlib.util
+import logging
+import os
+
+import uvicorn
+
+import config  # noqa: F401  (loads .env before anything reads the environment)
+
+
+def _cores() -> int:
+    try:
+        return len(os.sched_getaffinity(0))  # respects taskset / container cpusets
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def _available(module: str) -> bool:
+    return importlib.util.find_spec(module) is not None
+
+
+def main() -> None:
+    p = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    p.add_argument("--host", default=os.getenv("HOST", "0.0.0.0"))
+    p.add_argument("--port", type=int, default=int(os.getenv("PORT", "8000")))
+    p.add_argument("--workers", type=int, default=int(os.getenv("WEB_CONCURRENCY", "0")) or _cores())
+    # analyses can take up to MODEL_DEADLINE_S; give them time to finish
+    p.add_argument("--graceful-timeout", type=int,
+                   default=int(os.getenv("SHUTDOWN_GRACE_S", str(int(float(os.getenv("MODEL_DEADLINE_S", "90"))) + 30))))
+    p.add_argument("--keep-alive", type=int, default=int(os.getenv("KEEP_ALIVE_S", "5")))
+    p.add_argument("--log-level", default=os.getenv("LOG_LEVEL", "info"))
+    p.add_argument("--access-log", action="store_true", help="per-request access log (off by default; see /metrics)")
+    args = p.parse_args()
+
+    logging.basicConfig(level=args.log_level.upper(), format="%(asctime)s %(process)d %(levelname)s %(name)s: %(message)s")
+    loop = "uvloop" if _available("uvloop") else "asyncio"
+    http = "httptools" if _available("httptools") else "h11"
+    logging.getLogger("serve").info("starting %d workers on %s:%d (loop=%s, http=%s)",
+                                    args.workers, args.host, args.port, loop, http)
+    uvicorn.run(
+        "main:app",
+        host=args.host,
+        port=args.port,
+        workers=args.workers,
+        loop=loop,
+        http=http,
+        lifespan="on",
+        timeout_keep_alive=args.keep_alive,
+        timeout_graceful_shutdown=args.graceful_timeout,
+        proxy_headers=True,
+        forwarded_allow_ips=os.getenv("FORWARDED_ALLOW_IPS", "127.0.0.1"),
+        access_log=args.access_log,
+        log_level=args.log_level,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+-- Append-only exercise sessions with incrementally maintained aggregates.
+--
+-- Every PATCH /pushups | /situps used to read the whole row, append to
+-- `history` in Python, recompute max/avg over the full list and write the
+-- array back: O(n) per session, two round-trips, and lost updates under
+-- concurrent PATCHes. Sessions are now rows in exercise_sessions, and the
+-- per-exercise row keeps running session_count / reps_sum / max_reps so
+-- append_exercise_session() is one atomic round-trip of constant size.
+
+create table if not exists public.exercise_sessions (
+    id bigint generated always as identity primary key,
+    user_id uuid not null references public.users(id) on delete cascade,
+    exercise text not null,
+    reps integer not null check (reps >= 0),
+    score real,
+    recorded_at timestamptz not null default now()
+);
+
+create index if not exists exercise_sessions_user_exercise_time
+    on public.exercise_sessions (user_id, exercise, recorded_at desc);
+
+-- running aggregates on the per-exercise summary rows
+alter table public.pushups
+    add column if not exists session_count integer not null default 0,
+    add column if not exists reps_sum bigint not null default 0;
+alter table public.situps
+    add column if not exists session_count integer not null default 0,
+    add column if not exists reps_sum bigint not null default 0;
+
+-- Older clients could insert a second summary row for the same user. Fold
+-- each user's rows into the oldest one (histories concatenated in creation
+-- order, best max_reps, latest score) so the unique index can be built.
+do $$
+declare
+    v_table text;
+begin
+    foreach v_table in array array['pushups', 'situps'] loop
+        execute format($f$
+            with dup as (
+                select id, user_id, history, max_reps, last_tracked, score, created_at,
+                       first_value(id) over (partition by user_id order by created_at, id) as keep_id,
+                       count(*) over (partition by user_id) as n
+                from %1$I
+            ), merged as (
+                select d.keep_id,
+                       coalesce(jsonb_agg(h.v order by d.created_at, d.id, h.i) filter (where h.v is not null),
+                                '[]'::jsonb) as history,
+                       max(d.max_reps) as max_reps,
+                       avg((h.v #>> '{}')::double precision) as avg_reps,
+                       max(d.last_tracked) as last_tracked,
+                       (array_agg(d.score order by d.last_tracked desc nulls last)
+                            filter (where d.score is not null))[1] as score
+                from dup d
+                left join lateral jsonb_array_elements(coalesce(d.history, '[]'::jsonb))
+                    with ordinality as h(v, i) on true
+                where d.n > 1
+                group by d.keep_id
+            ), kept as (
+                update %1$I t set
+                    history = m.history, max_reps = m.max_reps, avg_reps = m.avg_reps,
+                    last_tracked = m.last_tracked, score = m.score, updated_at = now()
+                from merged m
+                where t.id = m.keep_id
+                returning t.id
+            )
+            delete from %1$I t
+            using dup d
+            where t.id = d.id and d.n > 1 and d.id <> d.keep_id
+        $f$, v_table);
+    end loop;
+end
+$$;
+
+-- one summary row per user (required for the upsert below)
+create unique index if not exists pushups_user_id_key on public.pushups (user_id);
+create unique index if not exists situps_user_id_key on public.situps (user_id);
+
+-- backfill aggregates + session rows from the legacy history arrays
+update public.pushups p set
+    session_count = jsonb_array_length(coalesce(p.history, '[]'::jsonb)),
+    reps_sum = (select coalesce(sum(v::bigint), 0) from jsonb_array_elements_text(coalesce(p.history, '[]'::jsonb)) v);
+update public.situps s set
+    session_count = jsonb_array_length(coalesce(s.history, '[]'::jsonb)),
+    reps_sum = (select coalesce(sum(v::bigint), 0) from jsonb_array_elements_text(coalesce(s.history, '[]'::jsonb)) v);
+
+insert into public.exercise_sessions (user_id, exercise, reps, recorded_at)
+select p.user_id, 'pushups', v.reps::int, coalesce(p.last_tracked, p.updated_at, now())
+from public.pushups p, jsonb_array_elements_text(coalesce(p.history, '[]'::jsonb)) as v(reps)
+where not exists (select 1 from public.exercise_sessions e where e.user_id = p.user_id and e.exercise = 'pushups');
+insert into public.exercise_sessions (user_id, exercise, reps, recorded_at)
+select s.user_id, 'situps', v.reps::int, coalesce(s.last_tracked, s.updated_at, now())
+from public.situps s, jsonb_array_elements_text(coalesce(s.history, '[]'::jsonb)) as v(reps)
+where not exists (select 1 from public.exercise_sessions e where e.user_id = s.user_id and e.exercise = 'situps');
+
+-- Last p_n elements of a jsonb array. The legacy `history` column keeps
+-- only the most recent sessions (exercise_sessions has all of them), so
+-- rewriting it on every append stays constant-size.
+create or replace function public.jsonb_tail(p_arr jsonb, p_n integer default 50)
+returns jsonb
+language sql
+immutable
+as $$
+    select case when jsonb_array_length(p_arr) <= p_n then p_arr
+                else coalesce((select jsonb_agg(a.v order by a.i)
+                               from jsonb_array_elements(p_arr) with ordinality as a(v, i)
+                               where a.i > jsonb_array_length(p_arr) - p_n), '[]'::jsonb) end
+$$;
+
+-- Append one session and update the summary row in a single statement.
+-- `history` keeps the last 50 sessions (sql/002 makes the cap a parameter)
+-- and is returned with the row, as before.
+create or replace function public.append_exercise_session(
+    p_exercise text,
+    p_user_id uuid,
+    p_reps integer,
+    p_score real default null
+) returns jsonb
+language plpgsql
+security definer
+set search_path = public
+as $$
+declare
+    v_row jsonb;
+begin
+    if p_exercise not in ('pushups', 'situps') then
+        raise exception 'unknown exercise: %', p_exercise;
+    end if;
+
+    insert into exercise_sessions (user_id, exercise, reps, score)
+    values (p_user_id, p_exercise, p_reps, p_score);
+
+    execute format($f$
+        insert into %1$I as t (user_id, history, session_count, reps_sum, max_reps, avg_reps, last_tracked, score)
+        values ($1, jsonb_build_array($2), 1, $2, $2, $2, now(), $3)
+        on conflict (user_id) do update set
+            history = jsonb_tail(coalesce(t.history, '[]'::jsonb) || to_jsonb($2)),
+            session_count = t.session_count + 1,
+            reps_sum = t.reps_sum + $2,
+            max_reps = greatest(coalesce(t.max_reps, $2), $2),
+            avg_reps = (t.reps_sum + $2)::double precision / (t.session_count + 1),
+            last_tracked = now(),
+            score = coalesce($3, t.score),
+            updated_at = now()
+        returning jsonb_build_object(
+            'id', t.id, 'user_id', t.user_id, 'max_reps', t.max_reps, 'avg_reps', t.avg_reps,
+            'session_count', t.session_count, 'history', t.history, 'last_tracked', t.last_tracked,
+            'score', t.score, 'updated_at', t.updated_at
+        )
+    $f$, p_exercise)
+    into v_row
+    using p_user_id, p_reps, p_score;
+
+    return v_row;
+end
+$$;
+
+revoke all on function public.append_exercise_session(text, uuid, integer, real) from public, anon, authenticated;
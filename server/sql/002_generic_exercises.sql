@@ -0,0 +1,101 @@
+-- Registry-driven exercises (utils/exercises.py).
+--
+-- append_exercise_session() now accepts any exercise summary table created
+-- by ensure_exercise_table() (recorded in exercise_registry), and keeps
+-- max_reps as the best value in the direction the exercise scores (higher
+-- reps vs. lower times).
+
+-- Exercises the session RPCs may touch. They take the summary table name
+-- from the caller, so they check it against this list instead of accepting
+-- any table that exists in public (users included).
+create table if not exists public.exercise_registry (
+    name text primary key,
+    created_at timestamptz not null default now()
+);
+alter table public.exercise_registry enable row level security;  -- no policies: service role only
+insert into public.exercise_registry (name) values ('pushups'), ('situps') on conflict do nothing;
+
+create or replace function public.ensure_exercise_table(p_name text)
+returns void
+language plpgsql
+security definer
+set search_path = public
+as $$
+begin
+    execute format($f$
+        create table if not exists %1$I (
+            id uuid primary key default gen_random_uuid(),
+            user_id uuid not null unique references users(id) on delete cascade,
+            history jsonb not null default '[]'::jsonb,
+            max_reps integer,
+            avg_reps double precision,
+            session_count integer not null default 0,
+            reps_sum bigint not null default 0,
+            last_tracked timestamptz,
+            score real,
+            created_at timestamptz not null default now(),
+            updated_at timestamptz not null default now()
+        )
+    $f$, p_name);
+    insert into exercise_registry (name) values (p_name) on conflict do nothing;
+end
+$$;
+
+drop function if exists public.append_exercise_session(text, uuid, integer, real);
+drop function if exists public.append_exercise_session(text, uuid, integer, real, boolean);
+
+-- The returned row includes `history`, the last p_history_cap sessions
+-- (EXERCISE_HISTORY_CAP in utils/exercises.py); exercise_sessions keeps
+-- every session.
+
+create or replace function public.append_exercise_session(
+    p_exercise text,
+    p_user_id uuid,
+    p_reps integer,
+    p_score real default null,
+    p_higher_is_better boolean default true,
+    p_history_cap integer default 50
+) returns jsonb
+language plpgsql
+security definer
+set search_path = public
+as $$
+declare
+    v_row jsonb;
+begin
+    if not exists (select 1 from exercise_registry where name = p_exercise) then
+        raise exception 'unknown exercise: %', p_exercise;
+    end if;
+
+    insert into exercise_sessions (user_id, exercise, reps, score)
+    values (p_user_id, p_exercise, p_reps, p_score);
+
+    execute format($f$
+        insert into %1$I as t (user_id, history, session_count, reps_sum, max_reps, avg_reps, last_tracked, score)
+        values ($1, jsonb_build_array($2), 1, $2, $2, $2, now(), $3)
+        on conflict (user_id) do update set
+            history = jsonb_tail(coalesce(t.history, '[]'::jsonb) || to_jsonb($2), $5),
+            session_count = t.session_count + 1,
+            reps_sum = t.reps_sum + $2,
+            max_reps = case when t.max_reps is null then $2
+                            when $4 then greatest(t.max_reps, $2)
+                            else least(t.max_reps, $2) end,
+            avg_reps = (t.reps_sum + $2)::double precision / (t.session_count + 1),
+            last_tracked = now(),
+            score = coalesce($3, t.score),
+            updated_at = now()
+        returning jsonb_build_object(
+            'id', t.id, 'user_id', t.user_id, 'max_reps', t.max_reps, 'avg_reps', t.avg_reps,
+            'session_count', t.session_count, 'history', t.history, 'last_tracked', t.last_tracked,
+            'score', t.score, 'updated_at', t.updated_at
+        )
+    $f$, p_exercise)
+    into v_row
+    using p_user_id, p_reps, p_score, p_higher_is_better, p_history_cap;
+
+    return v_row;
+end
+$$;
+
+revoke all on function public.ensure_exercise_table(text) from public, anon, authenticated;
+revoke all on function public.append_exercise_session(text, uuid, integer, real, boolean, integer) from public, anon, authenticated;
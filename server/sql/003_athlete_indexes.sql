@@ -0,0 +1,6 @@
+-- Indexes backing keyset pagination and filters on /data/athletes.
+-- Pages are ordered by id; coach rosters are (coach_id, id) range scans.
+
+create index if not exists users_coach_id_id on public.users (coach_id, id);
+create index if not exists users_updated_at on public.users (updated_at);
+create index if not exists users_age on public.users (age);
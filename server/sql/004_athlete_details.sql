@@ -0,0 +1,76 @@
+-- Profile + every exercise summary + recent sessions for many athletes in
+-- one round-trip (GET /data/athletes/{id}/details, POST /data/athletes/details).
+--
+-- Summary rows come from one `user_id = any(...)` scan per exercise table;
+-- recent sessions are a per-(athlete, exercise) top-N over the
+-- exercise_sessions_user_exercise_time index.
+
+create or replace function public.athlete_details(
+    p_user_ids uuid[],
+    p_exercises text[],
+    p_history_limit integer default 10
+) returns jsonb
+language plpgsql
+stable
+security definer
+set search_path = public
+as $$
+declare
+    v_ex text;
+    v_rows jsonb;
+    v_stats jsonb := '{}'::jsonb;  -- {exercise: {user_id: summary}}
+begin
+    foreach v_ex in array p_exercises loop
+        if not exists (select 1 from exercise_registry where name = v_ex) then
+            raise exception 'unknown exercise: %', v_ex;
+        end if;
+        execute format($f$
+            select coalesce(jsonb_object_agg(t.user_id, jsonb_build_object(
+                'max_reps', t.max_reps, 'avg_reps', t.avg_reps, 'session_count', t.session_count,
+                'last_tracked', t.last_tracked, 'score', t.score, 'updated_at', t.updated_at
+            )), '{}'::jsonb)
+            from %1$I t
+            where t.user_id = any($1)
+        $f$, v_ex)
+        into v_rows
+        using p_user_ids;
+        v_stats := v_stats || jsonb_build_object(v_ex, v_rows);
+    end loop;
+
+    return coalesce((
+        select jsonb_agg(
+            jsonb_build_object(
+                'profile', jsonb_build_object(
+                    'id', u.id, 'username', u.username, 'full_name', u.full_name, 'age', u.age,
+                    'gender', u.gender, 'height_cm', u.height_cm, 'weight_kg', u.weight_kg,
+                    'coach_id', u.coach_id, 'created_at', u.created_at, 'updated_at', u.updated_at
+                ),
+                'exercises', (
+                    select jsonb_object_agg(ex, jsonb_build_object(
+                        'stats', v_stats -> ex -> u.id::text,
+                        'recent', coalesce(h.recent, '[]'::jsonb)
+                    ))
+                    from unnest(p_exercises) as ex
+                    left join lateral (
+                        select jsonb_agg(jsonb_build_object(
+                            'reps', s.reps, 'score', s.score, 'recorded_at', s.recorded_at
+                        ) order by s.recorded_at desc) as recent
+                        from (
+                            select reps, score, recorded_at
+                            from exercise_sessions
+                            where user_id = u.id and exercise = ex
+                            order by recorded_at desc
+                            limit p_history_limit
+                        ) s
+                    ) h on true
+                )
+            )
+            order by array_position(p_user_ids, u.id)
+        )
+        from users u
+        where u.id = any(p_user_ids)
+    ), '[]'::jsonb);
+end
+$$;
+
+revoke all on function public.athlete_details(uuid[], text[], integer) from public, anon, authenticated;
@@ -0,0 +1,125 @@
+-- Bulk session ingestion for offline sync (POST /sessions/bulk).
+--
+-- Clients tag every session with an idempotency key; (user_id, client_key)
+-- is unique, so a replayed batch after a dropped connection inserts nothing
+-- new and the aggregates aren't double counted. Each call is one
+-- transaction: one insert into exercise_sessions and one set-based upsert
+-- per exercise table, however many sessions/users the batch holds.
+
+alter table public.exercise_sessions add column if not exists client_key text;
+
+create unique index if not exists exercise_sessions_user_client_key
+    on public.exercise_sessions (user_id, client_key)
+    where client_key is not null;
+
+drop function if exists public.append_exercise_sessions(jsonb, text[]);
+
+create or replace function public.append_exercise_sessions(
+    p_sessions jsonb,                        -- [{key, user_id, exercise, reps, score, recorded_at}]
+    p_lower_is_better text[] default '{}',   -- exercises whose best (max_reps) is the minimum
+    p_history_cap integer default 50         -- sessions kept in `history` (EXERCISE_HISTORY_CAP)
+) returns jsonb
+language plpgsql
+security definer
+set search_path = public
+as $$
+declare
+    v_ex text;
+    v_rows jsonb;
+    v_records jsonb := '[]'::jsonb;
+    v_results jsonb;
+begin
+    create temp table _bulk_in on commit drop as
+    select
+        t.ord,
+        s->>'key' as client_key,
+        (s->>'user_id')::uuid as user_id,
+        s->>'exercise' as exercise,
+        (s->>'reps')::integer as reps,
+        (s->>'score')::real as score,
+        coalesce((s->>'recorded_at')::timestamptz, now()) as recorded_at
+    from jsonb_array_elements(p_sessions) with ordinality as t(s, ord);
+
+    for v_ex in select distinct exercise from _bulk_in loop
+        if not exists (select 1 from exercise_registry where name = v_ex) then
+            raise exception 'unknown exercise: %', v_ex;
+        end if;
+    end loop;
+
+    create temp table _bulk_new on commit drop as
+    with ins as (
+        insert into exercise_sessions (user_id, exercise, reps, score, recorded_at, client_key)
+        select user_id, exercise, reps, score, recorded_at, client_key
+        from _bulk_in
+        order by ord
+        on conflict (user_id, client_key) where client_key is not null do nothing
+        returning user_id, exercise, reps, score, recorded_at, client_key
+    )
+    select * from ins;
+
+    for v_ex in select distinct exercise from _bulk_new loop
+        execute format($f$
+            with agg as (
+                select
+                    n.user_id,
+                    jsonb_agg(n.reps order by n.recorded_at) as history,
+                    count(*)::integer as session_count,
+                    sum(n.reps)::bigint as reps_sum,
+                    case when $2 then min(n.reps) else max(n.reps) end as best,
+                    max(n.recorded_at) as last_tracked,
+                    (array_agg(n.score order by n.recorded_at desc) filter (where n.score is not null))[1] as score
+                from _bulk_new n
+                where n.exercise = $1
+                group by n.user_id
+            ), up as (
+                insert into %1$I as t (user_id, history, session_count, reps_sum, max_reps, avg_reps, last_tracked, score)
+                select user_id, jsonb_tail(history, $3), session_count, reps_sum, best,
+                       reps_sum::double precision / session_count, last_tracked, score
+                from agg
+                on conflict (user_id) do update set
+                    history = jsonb_tail(coalesce(t.history, '[]'::jsonb) || excluded.history, $3),
+                    session_count = t.session_count + excluded.session_count,
+                    reps_sum = t.reps_sum + excluded.reps_sum,
+                    max_reps = case when t.max_reps is null then excluded.max_reps
+                                    when $2 then least(t.max_reps, excluded.max_reps)
+                                    else greatest(t.max_reps, excluded.max_reps) end,
+                    avg_reps = (t.reps_sum + excluded.reps_sum)::double precision
+                               / (t.session_count + excluded.session_count),
+                    last_tracked = greatest(t.last_tracked, excluded.last_tracked),
+                    -- offline sessions older than what's stored don't override the latest score
+                    score = case when excluded.score is not null
+                                  and (t.last_tracked is null or excluded.last_tracked >= t.last_tracked)
+                                 then excluded.score else coalesce(t.score, excluded.score) end,
+                    updated_at = now()
+                returning t.id, t.user_id, t.max_reps, t.avg_reps, t.session_count, t.last_tracked, t.score, t.updated_at
+            )
+            select coalesce(jsonb_agg(jsonb_build_object(
+                'exercise', $1, 'id', id, 'user_id', user_id, 'max_reps', max_reps, 'avg_reps', avg_reps,
+                'session_count', session_count, 'last_tracked', last_tracked, 'score', score,
+                'updated_at', updated_at
+            )), '[]'::jsonb)
+            from up
+        $f$, v_ex)
+        into v_rows
+        using v_ex, v_ex = any(p_lower_is_better), p_history_cap;
+        v_records := v_records || v_rows;
+    end loop;
+
+    -- first occurrence of a (user, key) that was inserted is "applied";
+    -- everything else (replays, repeats within the batch) is "duplicate"
+    select jsonb_agg(jsonb_build_object(
+        'key', i.client_key,
+        'status', case when n.client_key is not null and i.first then 'applied' else 'duplicate' end
+    ) order by i.ord)
+    into v_results
+    from (
+        select *, row_number() over (partition by user_id, client_key order by ord) = 1 as first
+        from _bulk_in
+    ) i
+    left join _bulk_new n on n.user_id = i.user_id and n.client_key = i.client_key;
+
+    return jsonb_build_object('results', coalesce(v_results, '[]'::jsonb), 'records', v_records);
+end
+$$;
+
+revoke all on function public.append_exercise_sessions(jsonb, text[], integer) from public, anon, authenticated;
@@ -0,0 +1,48 @@
+-- Compact, columnar session history for one athlete and exercise
+-- (GET /<exercise>/history, /<exercise>/progress and
+-- /data/athletes/{id}/progress/{exercise}).
+--
+-- The legacy `history` column on the summary tables is a bare int array
+-- with no timestamps, returned whole with every record. This returns the
+-- newest p_limit sessions from exercise_sessions (over the
+-- exercise_sessions_user_exercise_time index) oldest first, as parallel
+-- arrays with delta-encoded timestamps:
+--
+--   {"t0": <epoch s of the first session>, "dt": [0, s since previous, ...],
+--    "reps": [...], "score": [... or null]}
+
+create or replace function public.exercise_history(
+    p_user_id uuid,
+    p_exercise text,
+    p_limit integer default 5000
+) returns jsonb
+language sql
+stable
+security definer
+set search_path = public
+as $$
+    with recent as (
+        select id, reps, score, recorded_at
+        from exercise_sessions
+        where user_id = p_user_id and exercise = p_exercise
+        order by recorded_at desc
+        limit p_limit
+    ), s as (
+        select reps, score,
+               floor(extract(epoch from recorded_at))::bigint as ts,
+               row_number() over (order by recorded_at, id) as i
+        from recent
+    ), d as (
+        select reps, score, ts, i, ts - lag(ts, 1, ts) over (order by i) as dt
+        from s
+    )
+    select jsonb_build_object(
+        't0', min(ts),
+        'dt', coalesce(jsonb_agg(dt order by i), '[]'::jsonb),
+        'reps', coalesce(jsonb_agg(reps order by i), '[]'::jsonb),
+        'score', coalesce(jsonb_agg(score order by i), '[]'::jsonb)
+    )
+    from d;
+$$;
+
+revoke all on function public.exercise_history(uuid, text, integer) from public, anon, authenticated;
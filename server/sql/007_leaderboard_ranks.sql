@@ -0,0 +1,133 @@
+-- Materialized leaderboards (GET /leaderboards/...).
+--
+-- Ranks are computed here, set-based, by refresh_leaderboard_ranks() and
+-- read back by the API with plain indexed selects, so no API process holds
+-- or builds rankings. One builder calls it every LEADERBOARD_REFRESH_S
+-- (worker.py, process 0); with pg_cron available it can run here instead:
+--
+--   select cron.schedule('leaderboards', '*/5 * * * *',
+--       $$select refresh_leaderboard_ranks('{pushups,situps}')$$);
+--
+-- Every exercise is rebuilt with delete + insert inside the call's
+-- transaction, so readers keep seeing the previous ranking until it commits.
+--
+-- One row per (exercise, metric, gender, age_band, athlete), with '*' for
+-- "any" gender / age band. rank is competition ranking (1 + strictly
+-- better); percentile is the share ranked below, ties counted half. score is
+-- always higher-is-better; max_reps/avg_reps follow p_lower_is_better.
+
+create table if not exists public.leaderboard_ranks (
+    exercise text not null,
+    metric text not null,
+    gender text not null,
+    age_band text not null,
+    user_id uuid not null,
+    value double precision not null,
+    rank integer not null,
+    total integer not null,
+    percentile real not null,
+    primary key (exercise, metric, gender, age_band, user_id)
+);
+
+create index if not exists leaderboard_ranks_top
+    on public.leaderboard_ranks (exercise, metric, gender, age_band, rank, user_id);
+
+create table if not exists public.leaderboard_builds (
+    exercise text primary key,
+    athletes integer not null,
+    built_at timestamptz not null default now()
+);
+
+alter table public.leaderboard_ranks enable row level security;  -- no policies: service role only
+alter table public.leaderboard_builds enable row level security;
+
+-- Same labels as utils.leaderboard.age_band(): edges {14,18,24,30} give
+-- <14, 14-17, 18-23, 24-29, 30+.
+create or replace function public.leaderboard_age_band(p_age integer, p_edges integer[])
+returns text
+language sql
+immutable
+as $$
+    select case
+        when p_age is null then null
+        when p_age < p_edges[1] then '<' || p_edges[1]
+        when p_age >= p_edges[cardinality(p_edges)] then p_edges[cardinality(p_edges)] || '+'
+        else (
+            select p_edges[i] || '-' || (p_edges[i + 1] - 1)
+            from generate_subscripts(p_edges, 1) as i
+            where p_age >= p_edges[i] and p_age < p_edges[i + 1]
+        )
+    end
+$$;
+
+create or replace function public.refresh_leaderboard_ranks(
+    p_exercises text[],
+    p_lower_is_better text[] default '{}',   -- exercises whose best (max_reps) is the minimum
+    p_age_edges integer[] default '{14,18,24,30}'
+) returns jsonb
+language plpgsql
+security definer
+set search_path = public
+as $$
+declare
+    v_ex text;
+    v_n integer;
+    v_out jsonb := '{}'::jsonb;
+begin
+    foreach v_ex in array p_exercises loop
+        if not exists (select 1 from exercise_registry where name = v_ex) then
+            raise exception 'unknown exercise: %', v_ex;
+        end if;
+        -- two builders (e.g. cron and a manual run) rebuild one exercise in turn
+        perform pg_advisory_xact_lock(hashtext('leaderboard_ranks'), hashtext(v_ex));
+
+        delete from leaderboard_ranks where exercise = v_ex;
+        execute format($f$
+            with base as (
+                select t.user_id,
+                       t.max_reps::double precision as max_reps,
+                       t.avg_reps,
+                       t.score::double precision as score,
+                       nullif(lower(btrim(u.gender)), '') as gender,
+                       leaderboard_age_band(u.age, $2) as age_band
+                from %1$I t
+                join users u on u.id = t.user_id
+            ), banded as (
+                select b.user_id, m.metric, m.value, g.gender, g.age_band,
+                       -- sort key: ascending = better
+                       case when m.metric <> 'score' and $3 then m.value else -m.value end as k
+                from base b
+                cross join lateral (values
+                    ('max_reps', b.max_reps), ('avg_reps', b.avg_reps), ('score', b.score)
+                ) as m(metric, value)
+                cross join lateral (values
+                    ('*', '*'), (b.gender, '*'), ('*', b.age_band), (b.gender, b.age_band)
+                ) as g(gender, age_band)
+                where m.value is not null and g.gender is not null and g.age_band is not null
+            ), ranked as (
+                select *,
+                       rank() over (partition by metric, gender, age_band order by k) as rank,
+                       count(*) over (partition by metric, gender, age_band) as total,
+                       count(*) over (partition by metric, gender, age_band, k) as ties
+                from banded
+            )
+            insert into leaderboard_ranks (exercise, metric, gender, age_band, user_id, value, rank, total, percentile)
+            select $1, metric, gender, age_band, user_id, value, rank, total,
+                   round((100.0 * (total - rank + 1 - 0.5 * ties) / total)::numeric, 2)
+            from ranked
+        $f$, v_ex) using v_ex, p_age_edges, v_ex = any(p_lower_is_better);
+
+        select count(*) into v_n
+        from leaderboard_ranks
+        where exercise = v_ex and metric = 'max_reps' and gender = '*' and age_band = '*';
+
+        insert into leaderboard_builds (exercise, athletes, built_at)
+        values (v_ex, v_n, now())
+        on conflict (exercise) do update set athletes = excluded.athletes, built_at = excluded.built_at;
+        v_out := v_out || jsonb_build_object(v_ex, v_n);
+    end loop;
+    return v_out;
+end
+$$;
+
+revoke all on function public.refresh_leaderboard_ranks(text[], text[], integer[]) from public, anon, authenticated;
@@ -0,0 +1,29 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import asyncio
+import types
+
+import pytest
+
+
+@pytest.fixture(scope="session")
+def harness():
+    """main:app wired to the in-process Supabase/JWKS/model fakes from bench/fakes.py."""
+    from bench.run import Harness
+
+    args = types.SimpleNamespace(
+        auth_latency_ms=0, db_latency_ms=0, athletes=20, coaches=2, frames=1,
+        model_latency_ms=0, model_error_rate=0, analyze_cache=False,
+    )
+    return Harness(args)
+
+
+@pytest.fixture(scope="session")
+def client(harness):
+    from fastapi.testclient import TestClient
+
+    asyncio.run(harness.wire_async())  # the fake transport isn't tied to the loop that built the client
+    return TestClient(harness.app)  # no lifespan: skips warm-up and background loops
@@ -0,0 +1,61 @@
+"""
+ETag / If-None-Match on GET /<exercise>, through the app against the fakes.
+utils.* is imported inside the tests: the harness fixture has to set the
+environment before config is first imported.
+"""
+import threading
+
+
+def _athlete(harness, n):
+    return harness.ids["athletes"][n]
+
+
+def test_write_invalidates_etag(harness, client):
+    auth = harness.auth(_athlete(harness, 0))
+    assert client.patch("/pushups", json={"session_reps": 10}, headers=auth).status_code == 200
+    old = client.get("/pushups", headers=auth).headers["etag"]
+    assert client.get("/pushups", headers={**auth, "If-None-Match": old}).status_code == 304
+
+    assert client.patch("/pushups", json={"session_reps": 11}, headers=auth).status_code == 200
+    r = client.get("/pushups", headers={**auth, "If-None-Match": old})
+    assert r.status_code == 200
+    assert r.headers["etag"] != old
+
+
+def test_version_load_racing_a_write_is_not_cached(harness, client, monkeypatch):
+    import utils.exercises as exercises
+    from utils.exercises import VERSION_COLUMNS
+
+    user = _athlete(harness, 1)
+    auth = harness.auth(user)
+    assert client.patch("/situps", json={"session_reps": 10}, headers=auth).status_code == 200
+    old = client.get("/situps", headers=auth).headers["etag"]
+    exercises._invalidate(exercises.get_spec("situps"), user)  # force the next poll to load the version
+
+    loading, release = threading.Event(), threading.Event()
+    fetch = exercises.fetch_record
+
+    def slow_version_fetch(spec, user_id, columns="*"):
+        row = fetch(spec, user_id, columns)
+        if columns == ", ".join(VERSION_COLUMNS) and not loading.is_set():
+            loading.set()
+            release.wait(5)
+        return row
+
+    monkeypatch.setattr(exercises, "fetch_record", slow_version_fetch)
+    polled = {}
+    poller = threading.Thread(
+        target=lambda: polled.update(r=client.get("/situps", headers={**auth, "If-None-Match": old}))
+    )
+    poller.start()
+    assert loading.wait(5)
+
+    # the write lands while the poll's version lookup (pre-write) is in flight
+    assert client.patch("/situps", json={"session_reps": 12}, headers=auth).status_code == 200
+    release.set()
+    poller.join(5)
+    assert polled["r"].status_code == 304  # read before the write: legitimately unchanged
+
+    r = client.get("/situps", headers={**auth, "If-None-Match": old})
+    assert r.status_code == 200
+    assert r.headers["etag"] != old
@@ -0,0 +1,24 @@
+"""
+/data routes, through the app against the fakes.
+"""
+
+
+def test_coach_roster_unpaginated_without_limit_or_cursor(harness, client):
+    coach = harness.ids["coaches"][0]
+    expected = sorted(u["id"] for u in harness.db.tables["users"] if u["coach_id"] == coach)
+
+    r = client.get(f"/data/coaches/{coach}/athletes", headers=harness.auth(coach))
+    assert r.status_code == 200
+    assert "x-next-cursor" not in r.headers
+    assert [a["id"] for a in r.json()] == expected
+
+    got, cursor = [], None
+    while True:
+        params = {"limit": 3, **({"cursor": cursor} if cursor else {})}
+        page = client.get(f"/data/coaches/{coach}/athletes", params=params, headers=harness.auth(coach))
+        assert len(page.json()) <= 3
+        got += [a["id"] for a in page.json()]
+        cursor = page.headers.get("x-next-cursor")
+        if not cursor:
+            break
+    assert got == expected
@@ -0,0 +1,43 @@
+"""
+/deep/analyze and /deep/analyze/stream, against the fake model.
+"""
+import pytest
+
+
+def _body(harness, frames):
+    return {"user_id": harness.ids["athletes"][0], "exercise": "pushups", "frames": frames}
+
+
+@pytest.mark.parametrize("frames", [[], ["aGVsbG8="]], ids=["empty", "undecodable"])
+def test_stream_rejects_bad_input_like_analyze(harness, client, frames):
+    plain = client.post("/deep/analyze", json=_body(harness, frames))
+    stream = client.post("/deep/analyze/stream", json=_body(harness, frames))
+    assert plain.status_code == 422
+    assert stream.status_code == 422
+    assert stream.json()["detail"] == plain.json()["detail"]
+
+
+def test_stream_emits_deltas_then_done(harness, client):
+    r = client.post("/deep/analyze/stream", json=_body(harness, harness.frames[0]))
+    assert r.status_code == 200
+    assert r.headers["content-type"].startswith("text/event-stream")
+    events = [line.split(": ", 1)[1] for line in r.text.splitlines() if line.startswith("event: ")]
+    assert events[-1] == "done"
+    assert "error" not in events
+
+
+def test_cache_key_is_the_same_for_base64_and_raw_frames(harness):
+    import base64
+    import io
+
+    from utils.deepanalysis import cache_key
+
+    b64 = harness.frames[0]
+    raw = [base64.b64decode(f) for f in b64]
+    args = ("prompt", "gpt-4o", 0.2, 400)
+    key = cache_key(b64, *args)
+    assert cache_key(raw, *args) == key
+    assert cache_key([memoryview(f) for f in raw], *args) == key
+    assert cache_key([io.BytesIO(f) for f in raw], *args) == key
+    assert cache_key([f"data:image/jpeg;base64,{f}" for f in b64], *args) == key
+    assert cache_key(raw[:1] + [raw[0]], *args) != cache_key([raw[0] + raw[0]], *args)
@@ -0,0 +1,23 @@
+"""
+POST/PATCH /<exercise> responses, through the app against the fakes.
+"""
+
+
+def test_patch_returns_history(harness, client, monkeypatch):
+    import utils.exercises as exercises
+
+    monkeypatch.setattr(exercises, "EXERCISE_HISTORY_CAP", 3)
+    auth = harness.auth(harness.ids["athletes"][2])
+    for reps in (1, 2, 3, 4):
+        r = client.patch("/situps", json={"session_reps": reps}, headers=auth)
+        assert r.status_code == 200
+    assert r.json()["history"][-3:] == [2, 3, 4]
+    assert len(r.json()["history"]) == 3
+
+
+def test_post_with_a_first_session_returns_history(harness, client):
+    auth = harness.auth(harness.ids["coaches"][1])  # seeded without records
+    r = client.post("/situps", json={"session_reps": 7}, headers=auth)
+    assert r.status_code == 200
+    assert r.json()["history"] == [7]
+    assert client.post("/situps", json={}, headers=auth).json()["history"] == [7]
@@ -0,0 +1,95 @@
+"""
+POST /jobs and the worker's retry policy, against a throwaway JobQueue.
+utils.* and worker are imported inside the tests: the harness fixture has to
+set the environment before config is first imported.
+"""
+import asyncio
+import time
+
+import pytest
+
+
+@pytest.fixture
+def queue(harness, tmp_path, monkeypatch):
+    from utils import storage
+
+    q = storage.JobQueue(str(tmp_path / "jobs.sqlite3"))
+    monkeypatch.setattr(storage, "_queue", q)
+    return q
+
+
+def _uploads(q):
+    return q._conn().execute("SELECT COUNT(*) FROM uploads").fetchone()[0]
+
+
+def test_queue_full_drops_the_upload_it_stored(harness, client, queue):
+    queue.max_depth = 0
+    body = {"user_id": harness.ids["athletes"][0], "exercise": "pushups", "frames": harness.frames[0]}
+    r = client.post("/jobs", json=body)
+    assert r.status_code == 429
+    assert _uploads(queue) == 0
+
+    upload_id = queue.put_frames([b"frame"])["upload_id"]
+    r = client.post("/jobs", json={**body, "frames": None, "upload_id": upload_id})
+    assert r.status_code == 429
+    assert queue.get_upload(upload_id)  # the caller's own upload is kept for their retry
+
+
+def _run(queue, monkeypatch, error):
+    import routes.deep
+    import worker
+
+    async def failing(body, frames=None):
+        raise error
+
+    monkeypatch.setattr(routes.deep, "run_analysis", failing)
+    job_id, kind, payload, attempt = queue.claim()
+    asyncio.run(worker._handle(queue, job_id, kind, payload, attempt))
+    return job_id
+
+
+def _submit(harness, queue):
+    upload_id = queue.put_frames([b"frame"])["upload_id"]
+    payload = {"user_id": harness.ids["athletes"][0], "exercise": "pushups", "upload_id": upload_id}
+    return queue.submit("deep.analyze", payload)
+
+
+def test_transient_errors_are_requeued_until_attempts_run_out(harness, queue, monkeypatch):
+    import worker
+    from utils.scheduler import CircuitOpen
+    from utils.storage import JOB_MAX_ATTEMPTS
+
+    monkeypatch.setattr(worker, "RETRY_BASE_S", 60)
+    job_id = _submit(harness, queue)
+    for attempt in range(1, JOB_MAX_ATTEMPTS):
+        _run(queue, monkeypatch, CircuitOpen("circuit open"))
+        assert queue.get(job_id)["status"] == "queued"
+        assert queue.claim() is None  # backing off
+        queue._conn().execute("UPDATE jobs SET lease_expires = ? WHERE id = ?", (time.time(), job_id))
+
+    _run(queue, monkeypatch, CircuitOpen("circuit open"))
+    job = queue.get(job_id)
+    assert job["status"] == "failed"
+    assert job["attempts"] == JOB_MAX_ATTEMPTS
+
+
+def test_rate_limit_after_retries_is_transient(harness, queue, monkeypatch):
+    import httpx
+    from openai import RateLimitError
+
+    request = httpx.Request("POST", "https://api.openai.com/v1/responses")
+    limited = RateLimitError("rate limited", response=httpx.Response(429, request=request), body=None)
+    error = RuntimeError("vision analysis failed: rate limited")
+    error.__cause__ = limited
+
+    job_id = _submit(harness, queue)
+    _run(queue, monkeypatch, error)
+    assert queue.get(job_id)["status"] == "queued"
+
+
+def test_terminal_errors_fail_at_once(harness, queue, monkeypatch):
+    job_id = _submit(harness, queue)
+    _run(queue, monkeypatch, ValueError("no frames provided"))
+    job = queue.get(job_id)
+    assert job["status"] == "failed"
+    assert job["attempts"] == 1
@@ -0,0 +1,70 @@
+import asyncio
+import threading
+
+from utils.readcache import ReadThrough
+
+
+def test_load_overlapping_invalidate_is_not_cached():
+    rt = ReadThrough("test-sync")
+    db = {"v": 1}
+    loading, release = threading.Event(), threading.Event()
+
+    def slow_load():
+        row = {"v": db["v"]}
+        loading.set()
+        release.wait(5)
+        return row
+
+    got = {}
+    reader = threading.Thread(target=lambda: got.update(first=rt.get("k", slow_load)))
+    reader.start()
+    loading.wait(5)
+
+    db["v"] = 2
+    rt.invalidate("k")
+    # doesn't join the in-flight (pre-write) load
+    assert rt.get("k", lambda: {"v": db["v"]}) == {"v": 2}
+    release.set()
+    reader.join(5)
+
+    assert got["first"] == {"v": 1}  # the overlapping caller still gets its own result...
+    assert rt.get("k", lambda: {"v": -1}) == {"v": 2}  # ...but it didn't overwrite the cache
+
+
+def test_async_load_overlapping_invalidate_is_not_cached():
+    rt = ReadThrough("test-async")
+
+    async def go():
+        loading, release = asyncio.Event(), asyncio.Event()
+
+        async def slow_load():
+            loading.set()
+            await release.wait()
+            return {"v": 1}
+
+        first = asyncio.create_task(rt.aget("k", slow_load))
+        await loading.wait()
+        rt.invalidate("k")
+
+        async def fresh():
+            return {"v": 2}
+
+        assert await rt.aget("k", fresh) == {"v": 2}
+        release.set()
+        assert await first == {"v": 1}
+
+        async def never():
+            raise AssertionError("should be cached")
+
+        assert await rt.aget("k", never) == {"v": 2}
+
+    asyncio.run(go())
+
+
+def test_plain_load_is_cached():
+    rt = ReadThrough("test-plain")
+    calls = []
+    assert rt.get("k", lambda: calls.append(1) or {"v": 1}) == {"v": 1}
+    assert rt.get("k", lambda: calls.append(1) or {"v": 1}) == {"v": 1}
+    assert len(calls) == 1
+    assert rt.stats()["round_trips"] == 1
@@ -0,0 +1,170 @@
+"""
+ModelScheduler against a local fake model server: an httpx transport that
+answers the Responses API with scripted statuses, Retry-After headers and
+latency, driven through the real AsyncOpenAI client.
+"""
+import asyncio
+import time
+
+import httpx
+import pytest
+from openai import APIStatusError, AsyncOpenAI
+
+from utils import scheduler as scheduler_mod
+from utils.scheduler import CircuitOpen, DeadlineExceeded, ModelScheduler
+
+OK = {
+    "id": "resp_1", "object": "response", "created_at": 0, "model": "fake", "status": "completed",
+    "parallel_tool_calls": False, "tool_choice": "auto", "tools": [],
+    "output": [{"type": "message", "id": "msg_1", "role": "assistant", "status": "completed",
+                "content": [{"type": "output_text", "text": "ok", "annotations": []}]}],
+}
+
+
+class FakeModel:
+    """Answers from `script` in order (then 200s): 200, or (status, headers)."""
+
+    def __init__(self, script=(), latency: float = 0.0):
+        self.script = list(script)
+        self.latency = latency
+        self.calls = 0
+        self.active = 0
+        self.max_active = 0
+        self.client = AsyncOpenAI(
+            api_key="test", base_url="http://model.test/v1", max_retries=0,
+            http_client=httpx.AsyncClient(transport=httpx.MockTransport(self._handle)),
+        )
+
+    async def _handle(self, request: httpx.Request) -> httpx.Response:
+        self.calls += 1
+        self.active += 1
+        self.max_active = max(self.max_active, self.active)
+        try:
+            if self.latency:
+                await asyncio.sleep(self.latency)
+            step = self.script.pop(0) if self.script else 200
+            if step == 200:
+                return httpx.Response(200, json=OK)
+            status, headers = step
+            return httpx.Response(status, headers=headers, json={"error": {"message": "fake", "type": "fake"}})
+        finally:
+            self.active -= 1
+
+    def call(self):
+        return lambda: self.client.responses.create(model="fake", input="hi")
+
+
+def _scheduler(**kw) -> ModelScheduler:
+    kw.setdefault("requests_per_minute", 60_000)
+    kw.setdefault("tokens_per_minute", 10_000_000)
+    kw.setdefault("base_backoff_s", 0.01)
+    kw.setdefault("max_backoff_s", 0.05)
+    return ModelScheduler(**kw)
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+@pytest.mark.parametrize("headers, wait", [({"retry-after-ms": "150"}, 0.15), ({"retry-after": "0.2"}, 0.2)])
+def test_retry_honours_retry_after(headers, wait):
+    model = FakeModel([(429, headers)])
+    s = _scheduler()
+
+    async def go():
+        t0 = time.monotonic()
+        await s.run(model.call())
+        return time.monotonic() - t0
+
+    assert run(go()) >= wait
+    assert model.calls == 2
+    assert s.stats()["retries"] == 1
+
+
+def test_jittered_backoff_without_hint(monkeypatch):
+    bounds = []
+    monkeypatch.setattr(scheduler_mod.random, "uniform", lambda lo, hi: bounds.append((lo, hi)) or 0.0)
+    model = FakeModel([(500, {}), (503, {})])
+    s = _scheduler(base_backoff_s=0.01, max_backoff_s=0.03)
+
+    run(s.run(model.call()))
+    assert model.calls == 3
+    assert bounds == [(0, 0.02), (0, 0.03)]  # full jitter over base * 2**attempt, capped
+
+
+def test_max_retries_exhausted():
+    model = FakeModel([(500, {})] * 10)
+    s = _scheduler(max_retries=2)
+
+    with pytest.raises(APIStatusError) as exc:
+        run(s.run(model.call()))
+    assert exc.value.status_code == 500
+    assert model.calls == 3
+
+
+def test_deadline_exceeded_when_backoff_crosses_it():
+    model = FakeModel([(429, {"retry-after": "5"})])
+    s = _scheduler()
+
+    async def go():
+        t0 = time.monotonic()
+        with pytest.raises(DeadlineExceeded):
+            await s.run(model.call(), deadline_s=0.5)
+        return time.monotonic() - t0
+
+    assert run(go()) < 0.5  # gave up instead of sleeping past the deadline
+    assert model.calls == 1
+
+
+def test_rate_limits_do_not_open_the_breaker():
+    model = FakeModel([(429, {"retry-after-ms": "1"})] * 6)
+    s = _scheduler(max_retries=2, breaker_threshold=2)
+
+    async def go():
+        for _ in range(2):
+            with pytest.raises(APIStatusError):
+                await s.run(model.call())
+        return await s.run(model.call())
+
+    run(go())
+    assert s.stats()["circuit"] == "closed"
+
+
+def test_breaker_opens_and_recovers_half_open():
+    model = FakeModel([(500, {}), (500, {})], latency=0.0)
+    s = _scheduler(max_retries=0, breaker_threshold=2, breaker_cooldown_s=0.2)
+
+    async def go():
+        for _ in range(2):
+            with pytest.raises(APIStatusError):
+                await s.run(model.call())
+        assert s.stats()["circuit"] == "open"
+        with pytest.raises(CircuitOpen):
+            await s.run(model.call())
+        assert model.calls == 2  # rejected without reaching the model
+
+        await asyncio.sleep(0.25)
+        model.latency = 0.1
+        probe = asyncio.create_task(s.run(model.call()))
+        await asyncio.sleep(0.02)
+        with pytest.raises(CircuitOpen):  # only the probe goes through while half-open
+            await s.run(model.call())
+        await probe
+        assert s.stats()["circuit"] == "closed"
+        await s.run(model.call())
+
+    run(go())
+    assert model.calls == 4
+
+
+def test_concurrency_cap():
+    model = FakeModel(latency=0.05)
+    s = _scheduler(max_concurrency=2)
+
+    async def go():
+        await asyncio.gather(*(s.run(model.call()) for _ in range(6)))
+
+    run(go())
+    assert model.calls == 6
+    assert model.max_active == 2
+    assert s.stats()["completed"] == 6
@@ -0,0 +1,231 @@
+"""
+Small thread-safe caches: an in-memory LRU with TTL, an optional SQLite
+on-disk tier, and a two-tier wrapper that promotes disk hits into memory.
+Values stored on disk must be JSON-serialisable.
+"""
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+_MISSING = object()
+
+
+class LRUCache:
+    """Bounded LRU; entries expire after `ttl` seconds (per-entry override on set)."""
+
+    def __init__(self, maxsize: int = 1024, ttl: Optional[float] = None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, tuple[float | None, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.evictions = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            item = self._data.get(key, _MISSING)
+            if item is _MISSING:
+                self.misses += 1
+                return default
+            expires, value = item
+            if expires is not None and expires <= time.monotonic():
+                del self._data[key]
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        ttl = self.ttl if ttl is None else ttl
+        expires = time.monotonic() + ttl if ttl is not None else None
+        with self._lock:
+            self._data[key] = (expires, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key: Hashable) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_ratio": round(self.hits / total, 4) if total else 0.0,
+        }
+
+
+class DiskCache:
+    """SQLite-backed tier; survives restarts and is shared by processes on one host."""
+
+    def __init__(self, path: str, maxsize: int = 10_000, ttl: Optional[float] = None):
+        self.path = path
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._local = threading.local()
+        self.hits = self.misses = self.evictions = 0
+        d = os.path.dirname(path)
+        if d:
+            os.makedirs(d, exist_ok=True)
+        self._conn().execute(
+            "CREATE TABLE IF NOT EXISTS cache ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, expires REAL, accessed REAL NOT NULL)"
+        )
+        self._conn().execute("CREATE INDEX IF NOT EXISTS cache_accessed ON cache(accessed)")
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def entry(self, key: str) -> Optional[Tuple[Any, Optional[float]]]:
+        """(value, expires as a time.time() timestamp or None), or None on a miss."""
+        now = time.time()
+        c = self._conn()
+        row = c.execute("SELECT value, expires FROM cache WHERE key = ?", (key,)).fetchone()
+        if row is None or (row[1] is not None and row[1] <= now):
+            if row is not None:
+                c.execute("DELETE FROM cache WHERE key = ?", (key,))
+            self.misses += 1
+            return None
+        c.execute("UPDATE cache SET accessed = ? WHERE key = ?", (now, key))
+        self.hits += 1
+        return json.loads(row[0]), row[1]
+
+    def get(self, key: str, default: Any = None) -> Any:
+        item = self.entry(key)
+        return default if item is None else item[0]
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        now = time.time()
+        ttl = self.ttl if ttl is None else ttl
+        c = self._conn()
+        c.execute(
+            "INSERT OR REPLACE INTO cache (key, value, expires, accessed) VALUES (?, ?, ?, ?)",
+            (key, json.dumps(value), now + ttl if ttl is not None else None, now),
+        )
+        n = c.execute("SELECT COUNT(*) FROM cache").fetchone()[0]
+        if n > self.maxsize:
+            c.execute(
+                "DELETE FROM cache WHERE key IN (SELECT key FROM cache ORDER BY accessed LIMIT ?)",
+                (n - self.maxsize,),
+            )
+            self.evictions += n - self.maxsize
+
+    def delete(self, key: str) -> None:
+        self._conn().execute("DELETE FROM cache WHERE key = ?", (key,))
+
+    def clear(self) -> None:
+        self._conn().execute("DELETE FROM cache")
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "size": self._conn().execute("SELECT COUNT(*) FROM cache").fetchone()[0],
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_ratio": round(self.hits / total, 4) if total else 0.0,
+            "path": self.path,
+        }
+
+
+class TieredCache:
+    """
+    Memory tier in front of an optional shared/disk tier. aget()/aset() are
+    for the event loop: the memory tier is used inline and only disk I/O is
+    moved to a thread.
+    """
+
+    def __init__(self, memory: LRUCache, disk: Optional[Any] = None):
+        self.memory = memory
+        self.disk = disk
+
+    def _from_disk(self, key: str) -> Any:
+        entry = getattr(self.disk, "entry", None)
+        if entry is None:  # a shared tier without expiry info (e.g. a Redis wrapper)
+            value = self.disk.get(key, _MISSING)
+            if value is not _MISSING:
+                self.memory.set(key, value)
+            return value
+        item = entry(key)
+        if item is None:
+            return _MISSING
+        value, expires = item
+        ttl = None
+        if expires is not None:
+            # keep the disk entry's remaining lifetime, not a fresh memory TTL
+            ttl = expires - time.time()
+            if self.memory.ttl is not None:
+                ttl = min(ttl, self.memory.ttl)
+        self.memory.set(key, value, ttl)
+        return value
+
+    def get(self, key: str, default: Any = None) -> Any:
+        value = self.memory.get(key, _MISSING)
+        if value is not _MISSING:
+            return value
+        if self.disk is not None:
+            value = self._from_disk(key)
+            if value is not _MISSING:
+                return value
+        return default
+
+    async def aget(self, key: str, default: Any = None) -> Any:
+        value = self.memory.get(key, _MISSING)
+        if value is not _MISSING:
+            return value
+        if self.disk is not None:
+            value = await asyncio.to_thread(self._from_disk, key)
+            if value is not _MISSING:
+                return value
+        return default
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        self.memory.set(key, value, ttl)
+        if self.disk is not None:
+            self.disk.set(key, value, ttl)
+
+    async def aset(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        self.memory.set(key, value, ttl)
+        if self.disk is not None:
+            await asyncio.to_thread(self.disk.set, key, value, ttl)
+
+    def delete(self, key: str) -> None:
+        self.memory.delete(key)
+        if self.disk is not None:
+            self.disk.delete(key)
+
+    def clear(self) -> None:
+        self.memory.clear()
+        if self.disk is not None:
+            self.disk.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "memory": self.memory.stats(),
+            "disk": self.disk.stats() if self.disk is not None else None,
+        }
@@ -0,0 +1,149 @@
+"""
+Response compression: Brotli when the client accepts it and the `brotli`
+package is installed, gzip otherwise, for bodies of at least
+COMPRESS_MIN_BYTES. Streaming responses are compressed chunk by chunk;
+already-encoded bodies (e.g. the gzip export), images and SSE streams pass
+through untouched.
+
+A plain ASGI send wrapper (no Starlette responder internals). A strong ETag
+on a compressed response gets an encoding suffix ("abc" -> "abc-br"), since
+the bytes differ per encoding; utils.conditional ignores the suffix when
+matching If-None-Match, and a 304 echoes the variant the client holds.
+"""
+import asyncio
+import importlib.util
+import os
+import re
+import zlib
+
+from starlette.datastructures import Headers, MutableHeaders
+
+COMPRESS_MIN_BYTES = int(os.getenv("COMPRESS_MIN_BYTES", "1024"))
+GZIP_LEVEL = int(os.getenv("GZIP_LEVEL", "6"))
+BROTLI_QUALITY = int(os.getenv("BROTLI_QUALITY", "4"))  # 4-5: close to gzip -9 size at gzip -6 speed
+COMPRESS_THREAD_BYTES = 256 * 1024  # chunks this large are compressed off the event loop
+
+HAVE_BROTLI = importlib.util.find_spec("brotli") is not None
+
+# already compressed, or must reach the client unbuffered
+EXCLUDED_TYPES = ("text/event-stream", "application/gzip", "application/x-gzip", "application/zip",
+                  "image/", "audio/", "video/", "font/woff")
+ENCODINGS = ("br", "gzip")
+
+
+class _Gzip:
+    def __init__(self):
+        self._z = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)  # wbits=31: gzip container
+
+    def compress(self, data: bytes, final: bool) -> bytes:
+        return self._z.compress(data) + self._z.flush(zlib.Z_FINISH if final else zlib.Z_SYNC_FLUSH)
+
+
+class _Brotli:
+    def __init__(self):
+        import brotli
+
+        self._c = brotli.Compressor(quality=BROTLI_QUALITY)
+
+    def compress(self, data: bytes, final: bool) -> bytes:
+        out = self._c.process(data)
+        return out + (self._c.finish() if final else self._c.flush())
+
+
+_ENCODERS = {"br": _Brotli, "gzip": _Gzip}
+
+
+def _accepts(accept_encoding: str, coding: str) -> bool:
+    for part in accept_encoding.lower().split(","):
+        name, _, params = part.strip().partition(";")
+        if name.strip() == coding:
+            q = re.search(r"q\s*=\s*([0-9.]+)", params)
+            return not q or float(q.group(1)) > 0
+    return False
+
+
+def _excluded(content_type: str) -> bool:
+    media = content_type.partition(";")[0].strip().lower()
+    return media.startswith(EXCLUDED_TYPES)
+
+
+def _held_variant(tag: str, if_none_match: str) -> str:
+    """For a 304: the encoded variant of `tag` the client sent back, else `tag` itself."""
+    for encoding in ENCODINGS:
+        variant = f'{tag[:-1]}-{encoding}"'
+        if variant in if_none_match:
+            return variant
+    return tag
+
+
+async def _compress(encoder, data: bytes, final: bool) -> bytes:
+    if len(data) >= COMPRESS_THREAD_BYTES:
+        return await asyncio.to_thread(encoder.compress, data, final)
+    return encoder.compress(data, final)
+
+
+class CompressionMiddleware:
+    def __init__(self, app, minimum_size: int = COMPRESS_MIN_BYTES):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        request = Headers(scope=scope)
+        accept = request.get("accept-encoding", "")
+        if HAVE_BROTLI and _accepts(accept, "br"):
+            encoding = "br"
+        elif _accepts(accept, "gzip"):
+            encoding = "gzip"
+        else:
+            encoding = None  # still adds Vary: Accept-Encoding to responses that would have been compressed
+        held = None  # response start, kept until the first body chunk decides the encoding
+        encoder = None
+
+        async def _send(msg):
+            nonlocal held, encoder
+            kind = msg["type"]
+            if kind == "http.response.start":
+                headers = MutableHeaders(raw=msg["headers"])
+                tag = headers.get("etag")
+                if msg["status"] == 304 and tag and tag.startswith('"'):
+                    headers["etag"] = _held_variant(tag, request.get("if-none-match", ""))
+                if (msg["status"] in (204, 206, 304) or "content-encoding" in headers
+                        or _excluded(headers.get("content-type", ""))):
+                    return await send(msg)
+                held = msg
+                return
+            if held is None:  # passing through, or the headers already went out
+                if encoder is not None and kind == "http.response.body":
+                    more = msg.get("more_body", False)
+                    msg["body"] = await _compress(encoder, msg.get("body", b""), not more)
+                return await send(msg)
+
+            start, held = held, None
+            if kind != "http.response.body":
+                await send(start)
+                return await send(msg)
+            body, more = msg.get("body", b""), msg.get("more_body", False)
+            if len(body) < self.minimum_size and not more:
+                await send(start)
+                return await send(msg)
+
+            headers = MutableHeaders(raw=start["headers"])
+            headers.add_vary_header("Accept-Encoding")
+            if encoding is not None:
+                encoder = _ENCODERS[encoding]()
+                msg["body"] = await _compress(encoder, body, not more)
+                headers["Content-Encoding"] = encoding
+                if more:
+                    del headers["Content-Length"]
+                else:
+                    headers["Content-Length"] = str(len(msg["body"]))
+                tag = headers.get("etag")
+                if tag and tag.startswith('"'):
+                    headers["ETag"] = f'{tag[:-1]}-{encoding}"'
+            await send(start)
+            await send(msg)
+
+        await self.app(scope, receive, _send)
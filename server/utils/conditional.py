@@ -0,0 +1,52 @@
+"""
+Strong ETags and If-None-Match handling for polled GET endpoints.
+
+Tags are derived from a row's version columns (id, updated_at and, for
+exercise records, session_count), so a handler can answer 304 from a
+cached version stamp without fetching or serialising the full row.
+"""
+import hashlib
+from typing import Any, Optional
+
+from fastapi import Request, Response
+
+# revalidate every time, but let browsers/apps keep the body and send If-None-Match
+CACHE_CONTROL = "private, no-cache"
+_ENCODING_SUFFIXES = ("-gzip", "-br")  # added by utils.compression when the body is encoded
+
+
+def etag(*parts: Any) -> str:
+    h = hashlib.blake2b("\x1f".join(str(p) for p in parts).encode(), digest_size=12)
+    return f'"{h.hexdigest()}"'
+
+
+def _opaque(tag: str) -> str:
+    tag = tag.strip()
+    if tag.startswith("W/"):
+        tag = tag[2:]  # If-None-Match uses weak comparison
+    tag = tag.strip('"')
+    for suffix in _ENCODING_SUFFIXES:
+        if tag.endswith(suffix):
+            return tag[: -len(suffix)]
+    return tag
+
+
+def matches(if_none_match: Optional[str], tag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    want = _opaque(tag)
+    return any(_opaque(t) == want for t in if_none_match.split(","))
+
+
+def not_modified(request: Request, tag: str) -> Optional[Response]:
+    """A 304 for `tag` if the request's If-None-Match matches it, else None."""
+    if not matches(request.headers.get("if-none-match"), tag):
+        return None
+    return Response(status_code=304, headers={"ETag": tag, "Cache-Control": CACHE_CONTROL})
+
+
+def tag_response(response: Response, tag: str) -> None:
+    response.headers["ETag"] = tag
+    response.headers["Cache-Control"] = CACHE_CONTROL
@@ -0,0 +1,232 @@
+"""
+Pooled HTTP clients behind the Supabase SDK (PostgREST, auth, storage).
+
+One httpx client per process for the sync routes (shared by every
+threadpool thread; httpx/httpcore pools are thread-safe) and one for the
+event loop. Both keep an explicitly sized keep-alive pool, speak HTTP/2
+when `h2` is installed, bound every call with connect/read/pool timeouts,
+and retry idempotent reads on gateway errors and dropped connections.
+Each request is traced to record how long it waited for a connection and
+whether it reused one or had to open a new TCP/TLS connection.
+"""
+import asyncio
+import importlib.util
+import logging
+import os
+import random
+import threading
+import time
+from typing import Any, Dict, Optional
+
+import httpx
+
+from utils import metrics
+
+logger = logging.getLogger(__name__)
+
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "64"))  # max connections per process (per client)
+DB_POOL_KEEPALIVE = int(os.getenv("DB_POOL_KEEPALIVE", str(DB_POOL_SIZE)))  # idle connections kept open
+DB_KEEPALIVE_S = float(os.getenv("DB_KEEPALIVE_S", "60"))
+DB_HTTP2 = os.getenv("DB_HTTP2", "1") == "1"
+DB_TIMEOUT_S = float(os.getenv("DB_TIMEOUT_S", "15"))
+DB_CONNECT_TIMEOUT_S = float(os.getenv("DB_CONNECT_TIMEOUT_S", "5"))
+DB_POOL_TIMEOUT_S = float(os.getenv("DB_POOL_TIMEOUT_S", "10"))  # max wait for a free connection
+DB_RETRIES = int(os.getenv("DB_RETRIES", "2"))  # extra attempts for idempotent reads
+DB_RETRY_BASE_S = float(os.getenv("DB_RETRY_BASE_S", "0.1"))
+
+_IDEMPOTENT = frozenset(("GET", "HEAD", "OPTIONS"))
+_RETRY_STATUS = frozenset((502, 503, 504))
+# safe to resend a read after these: the server never produced a response
+_RETRY_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.RemoteProtocolError, httpx.ReadError)
+
+
+def _http2() -> bool:
+    return DB_HTTP2 and importlib.util.find_spec("h2") is not None
+
+
+def _limits() -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=DB_POOL_SIZE,
+        max_keepalive_connections=min(DB_POOL_KEEPALIVE, DB_POOL_SIZE),
+        keepalive_expiry=DB_KEEPALIVE_S,
+    )
+
+
+def _timeout() -> httpx.Timeout:
+    return httpx.Timeout(DB_TIMEOUT_S, connect=DB_CONNECT_TIMEOUT_S, pool=DB_POOL_TIMEOUT_S)
+
+
+def _backoff(attempt: int) -> float:
+    return DB_RETRY_BASE_S * (2 ** attempt) * (0.5 + random.random())
+
+
+class _Trace:
+    """httpcore `trace` extension for one attempt: pool wait and connection reuse."""
+
+    def __init__(self, pool: "_Pool"):
+        self.pool = pool
+        self.t0 = time.perf_counter()
+        self.acquired = False
+
+    def __call__(self, event: str, info: Dict[str, Any]) -> None:
+        if not self.acquired and (event == "connection.connect_tcp.started" or event.endswith("send_request_headers.started")):
+            self.acquired = True
+            self.pool.waited(time.perf_counter() - self.t0, reused=event != "connection.connect_tcp.started")
+        elif event == "connection.connect_tcp.complete":
+            self.pool.opened("tcp")
+        elif event == "connection.start_tls.complete":
+            self.pool.opened("tls")
+
+
+class _AsyncTrace(_Trace):
+    async def __call__(self, event: str, info: Dict[str, Any]) -> None:
+        _Trace.__call__(self, event, info)
+
+
+class _Pool:
+    """Counters shared by a transport; read by stats() and /metrics."""
+
+    def __init__(self, name: str, inner):
+        self.name = name
+        self.inner = inner
+        self._lock = threading.Lock()
+        self._n = {"requests": 0, "reused": 0, "tcp": 0, "tls": 0, "retries": 0, "wait_s": 0.0, "max_wait_s": 0.0}
+
+    def waited(self, seconds: float, reused: bool) -> None:
+        metrics.DB_POOL_WAIT.observe(seconds, self.name)
+        with self._lock:
+            self._n["requests"] += 1
+            self._n["reused"] += reused
+            self._n["wait_s"] += seconds
+            self._n["max_wait_s"] = max(self._n["max_wait_s"], seconds)
+
+    def opened(self, kind: str) -> None:
+        metrics.DB_CONNECTIONS_OPENED.inc(self.name, kind)
+        with self._lock:
+            self._n[kind] += 1
+
+    def retried(self, reason: str) -> None:
+        metrics.DB_RETRIES.inc(self.name, reason)
+        with self._lock:
+            self._n["retries"] += 1
+
+    def connections(self) -> Dict[str, int]:
+        try:
+            conns = list(self.inner._pool.connections)  # httpcore internals; best effort
+        except AttributeError:
+            return {}
+        idle = sum(1 for c in conns if c.is_idle())
+        return {"open": len(conns), "active": len(conns) - idle, "idle": idle}
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            n = dict(self._n)
+        conns = self.connections()
+        return {
+            "max_connections": DB_POOL_SIZE,
+            "http2": _http2(),
+            **conns,
+            "utilization": round(conns.get("active", 0) / DB_POOL_SIZE, 3) if DB_POOL_SIZE else None,
+            "requests": n["requests"],
+            "reuse_ratio": round(n["reused"] / n["requests"], 4) if n["requests"] else None,
+            "connections_opened": n["tcp"],
+            "tls_handshakes": n["tls"],
+            "retries": n["retries"],
+            "avg_wait_ms": round(n["wait_s"] / n["requests"] * 1000, 2) if n["requests"] else None,
+            "max_wait_ms": round(n["max_wait_s"] * 1000, 2),
+        }
+
+
+def _retry_reason(request: httpx.Request, attempt: int, response: Optional[httpx.Response] = None,
+                  error: Optional[Exception] = None) -> Optional[str]:
+    if attempt >= DB_RETRIES or request.method not in _IDEMPOTENT:
+        return None
+    if response is not None:
+        return str(response.status_code) if response.status_code in _RETRY_STATUS else None
+    return type(error).__name__ if isinstance(error, _RETRY_ERRORS) else None
+
+
+class PooledTransport(httpx.BaseTransport):
+    def __init__(self, name: str = "sync"):
+        # retries=1: httpcore re-dials once on connect failures, for any method
+        self._inner = httpx.HTTPTransport(http2=_http2(), limits=_limits(), retries=1)
+        self.pool = _Pool(name, self._inner)
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        attempt = 0
+        while True:
+            request.extensions = {**request.extensions, "trace": _Trace(self.pool)}
+            try:
+                response = self._inner.handle_request(request)
+            except Exception as e:
+                reason = _retry_reason(request, attempt, error=e)
+                if reason is None:
+                    raise
+            else:
+                reason = _retry_reason(request, attempt, response=response)
+                if reason is None:
+                    return response
+                response.close()
+            self.pool.retried(reason)
+            time.sleep(_backoff(attempt))
+            attempt += 1
+
+    def close(self) -> None:
+        self._inner.close()
+
+
+class AsyncPooledTransport(httpx.AsyncBaseTransport):
+    def __init__(self, name: str = "async"):
+        self._inner = httpx.AsyncHTTPTransport(http2=_http2(), limits=_limits(), retries=1)
+        self.pool = _Pool(name, self._inner)
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        attempt = 0
+        while True:
+            request.extensions = {**request.extensions, "trace": _AsyncTrace(self.pool)}
+            try:
+                response = await self._inner.handle_async_request(request)
+            except Exception as e:
+                reason = _retry_reason(request, attempt, error=e)
+                if reason is None:
+                    raise
+            else:
+                reason = _retry_reason(request, attempt, response=response)
+                if reason is None:
+                    return response
+                await response.aclose()
+            self.pool.retried(reason)
+            await asyncio.sleep(_backoff(attempt))
+            attempt += 1
+
+    async def aclose(self) -> None:
+        await self._inner.aclose()
+
+
+_pools: Dict[str, _Pool] = {}
+
+
+def client(base_url: str) -> httpx.Client:
+    """Pooled client for the sync Supabase SDK (pass as SyncClientOptions(httpx_client=...))."""
+    transport = PooledTransport()
+    _pools["sync"] = transport.pool
+    return httpx.Client(base_url=base_url, transport=transport, timeout=_timeout(), follow_redirects=True)
+
+
+def async_client(base_url: str) -> httpx.AsyncClient:
+    """Async counterpart of client(); create it inside the running loop."""
+    transport = AsyncPooledTransport()
+    _pools["async"] = transport.pool
+    return httpx.AsyncClient(base_url=base_url, transport=transport, timeout=_timeout(), follow_redirects=True)
+
+
+def stats() -> Dict[str, Any]:
+    return {name: p.stats() for name, p in _pools.items()}
+
+
+@metrics.on_collect
+def _collect() -> None:
+    for name, p in _pools.items():
+        conns = p.connections()
+        for state in ("active", "idle"):
+            metrics.DB_POOL_CONNECTIONS.set(conns.get(state, 0), name, state)
@@ -1,8 +1,23 @@
+from __future__ import annotations
+
 import os
+import asyncio
 import base64
-from typing import List, Optional
+import hashlib
+import math
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import TYPE_CHECKING, Any, AsyncIterator, Dict, List, Optional, Sequence, Union
+
+from utils.cache import DiskCache, LRUCache, TieredCache
+from utils import metrics
+from utils.scheduler import CircuitOpen, DeadlineExceeded, ModelScheduler
 
-from openai import OpenAI, APIStatusError, APIConnectionError, RateLimitError
+if TYPE_CHECKING:  # openai and the frame pipeline (numpy, Pillow) load on first use
+    from openai import AsyncOpenAI
+    from utils.frames import FrameSource, PreparedFrames
 
 DEFAULT_MODEL = os.getenv("OPENAI_VISION_MODEL", "gpt-4o")
 DEFAULT_PROMPT = (
@@ -16,8 +31,45 @@ DEFAULT_PROMPT = (
 )
 
 _MAX_FRAMES = int(os.getenv("DEEPANALYSIS_MAX_FRAMES", "30"))
+# frames considered for keyframe selection (latest N of what the client sent)
+_MAX_INPUT_FRAMES = int(os.getenv("DEEPANALYSIS_MAX_INPUT_FRAMES", "120"))
+
+# Result cache: identical (frames, prompt, model, params) → identical answer.
+_CACHE_TTL_S = float(os.getenv("DEEPANALYSIS_CACHE_TTL_S", str(7 * 24 * 3600)))
+_CACHE_SIZE = int(os.getenv("DEEPANALYSIS_CACHE_SIZE", "512"))
+_CACHE_DIR = os.getenv("DEEPANALYSIS_CACHE_DIR")  # set to enable the on-disk tier
+
+_cache = TieredCache(
+    LRUCache(maxsize=_CACHE_SIZE, ttl=_CACHE_TTL_S),
+    DiskCache(os.path.join(_CACHE_DIR, "deepanalysis.sqlite3"), ttl=_CACHE_TTL_S) if _CACHE_DIR else None,
+)
+
+_client: Optional[AsyncOpenAI] = None
+
+_scheduler = ModelScheduler(
+    max_concurrency=int(os.getenv("MODEL_MAX_CONCURRENCY", "8")),
+    requests_per_minute=float(os.getenv("MODEL_RPM", "500")),
+    tokens_per_minute=float(os.getenv("MODEL_TPM", "300000")),
+    max_retries=int(os.getenv("MODEL_MAX_RETRIES", "4")),
+    default_deadline_s=float(os.getenv("MODEL_DEADLINE_S", "90")),
+)
 
-_client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+def client() -> AsyncOpenAI:
+    """The model client, created on first use (or by warm_up_client)."""
+    global _client
+    if _client is None:
+        from openai import AsyncOpenAI
+
+        # retries/backoff are owned by the scheduler, not the SDK
+        _client = AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"), max_retries=0)
+    return _client
+
+@lru_cache(maxsize=1)
+def _image_tokens() -> int:
+    from utils.frames import FRAME_MAX_SIDE
+
+    # high-detail image cost: 85 base + 170 per 512px tile (frames are <= FRAME_MAX_SIDE, ~16:9)
+    return 85 + 170 * math.ceil(FRAME_MAX_SIDE / 512) * math.ceil(FRAME_MAX_SIDE * 9 / 16 / 512)
 
 def _as_data_url(b64: str, mime_hint: Optional[str] = None) -> str:
     b64 = b64.strip()
@@ -36,39 +88,223 @@ def _as_data_url(b64: str, mime_hint: Optional[str] = None) -> str:
             mime_hint = "image/jpeg"
     return f"data:{mime_hint};base64,{b64}"
 
-def analyze_frames(
-    frames_base64: List[str],
+def cache_key(
+    frames: Sequence[FrameSource],
+    prompt: str,
+    model: str,
+    temperature: float,
+    max_output_tokens: int,
+) -> str:
+    from utils.frames import FRAME_DEDUPE_DISTANCE, FRAME_JPEG_QUALITY, FRAME_MAX_SIDE, read_source
+
+    h = hashlib.sha256()
+    h.update(f"{model}\0{temperature!r}\0{max_output_tokens}\0".encode())
+    # preprocessing settings change what the model sees, so a retune must not hit old answers
+    h.update(f"{FRAME_MAX_SIDE}\0{FRAME_JPEG_QUALITY}\0{FRAME_DEDUPE_DISTANCE}\0{_MAX_FRAMES}\0".encode())
+    h.update(prompt.encode())
+    for f in frames:
+        # the decoded image, so a base64 frame (/analyze) and the same frame
+        # uploaded raw (/analyze/upload, jobs) share an entry
+        data = f if isinstance(f, (bytes, bytearray, memoryview)) else read_source(f)
+        h.update(len(data).to_bytes(8, "big"))
+        h.update(data)
+    return h.hexdigest()
+
+def cache_stats() -> Dict[str, Any]:
+    return _cache.stats()
+
+def scheduler_stats() -> Dict[str, Any]:
+    return _scheduler.stats()
+
+_MODEL_IN_FLIGHT = metrics.Gauge("model_calls_in_flight", "Vision model calls holding a scheduler slot")
+_MODEL_QUEUED = metrics.Gauge("model_calls_queued", "Vision model calls waiting for a scheduler slot")
+_MODEL_CIRCUIT_OPEN = metrics.Gauge("model_circuit_open", "1 while the vision model circuit breaker is open")
+
+@metrics.on_collect
+def _scheduler_gauges() -> None:
+    st = _scheduler.stats()
+    _MODEL_IN_FLIGHT.set(st["in_flight"])
+    _MODEL_QUEUED.set(st["queue_depth"])
+    _MODEL_CIRCUIT_OPEN.set(1 if st["circuit"] == "open" else 0)
+
+async def warm_up_client() -> None:
+    """Open the model client's connection pool (DNS, TLS) with a cheap metadata call."""
+    await client().with_options(timeout=10).models.retrieve(DEFAULT_MODEL)
+
+def estimate_tokens(prompt: str, n_images: int, max_output_tokens: int) -> int:
+    return len(prompt) // 4 + n_images * _image_tokens() + max_output_tokens
+
+
+@dataclass
+class AnalysisResult:
+    text: str
+    frames_used: int
+    preprocessing: Dict[str, Any]
+    cached: bool = False
+
+
+def _image_content(prompt: str, jpegs: Sequence[bytes]) -> List[Dict[str, Any]]:
+    content = [{"type": "input_text", "text": prompt}]
+    for jpeg in jpegs:
+        b64 = base64.b64encode(jpeg).decode("ascii")
+        content.append({"type": "input_image", "image_url": _as_data_url(b64, "image/jpeg")})
+    return content
+
+
+@contextmanager
+def _instrumented(model: str, n_frames: int, est_tokens: int):
+    """Time one model call end to end (queueing + retries) and attribute it to the request."""
+    metrics.MODEL_FRAMES.observe(n_frames)
+    metrics.MODEL_EST_TOKENS.observe(est_tokens)
+    outcome = "error"
+    t0 = time.perf_counter()
+    try:
+        yield
+        outcome = "ok"
+    except CircuitOpen:
+        outcome = "circuit_open"
+        raise
+    except DeadlineExceeded:
+        outcome = "deadline"
+        raise
+    finally:
+        elapsed = time.perf_counter() - t0
+        metrics.MODEL_LATENCY.observe(elapsed, model, outcome)
+        metrics.add_time("model", elapsed)
+
+
+async def _remember(key: str, result: AnalysisResult) -> None:
+    if result.text:
+        await _cache.aset(key, {"text": result.text, "frames_used": result.frames_used, "preprocessing": result.preprocessing})
+
+
+async def analyze_frames(
+    frames_base64: Sequence[FrameSource],
     prompt: str,
     model: Optional[str] = None,
     max_output_tokens: int = 400,
     temperature: float = 0.2,
-) -> str:
+) -> AnalysisResult:
+    """
+    Frames may be base64 strings / data URLs, raw image bytes or file-like
+    objects. They are deduped, keyframe-selected down to _MAX_FRAMES and
+    re-encoded before being sent to the model.
+    """
     if not frames_base64:
         raise ValueError("no frames provided")
 
-    frames = frames_base64[-_MAX_FRAMES:]
-
-    content = [{"type": "input_text", "text": prompt}]
-    for b64 in frames:
-        content.append({"type": "input_image", "image_url": _as_data_url(b64)})
+    frames = frames_base64[-_MAX_INPUT_FRAMES:]
 
     model = model or DEFAULT_MODEL
-    last_err = None
-    for _ in range(3):
-        try:
-            resp = _client.responses.create(
-                model=model,
-                input=[{"role": "user", "content": content}],
-                max_output_tokens=max_output_tokens,
-                temperature=temperature,
+    # hashing up to _MAX_INPUT_FRAMES frames (and reading spooled uploads) is blocking work
+    key = await asyncio.to_thread(cache_key, frames, prompt, model, temperature, max_output_tokens)
+    cached = await _cache.aget(key)
+    if cached is not None:
+        return AnalysisResult(**cached, cached=True)
+
+    from openai import APIConnectionError, APIStatusError
+    from utils.frames import prepare_frames
+
+    prepared = await asyncio.to_thread(prepare_frames, frames, _MAX_FRAMES)
+    content = _image_content(prompt, prepared.frames)
+
+    est = estimate_tokens(prompt, len(prepared.frames), max_output_tokens)
+    try:
+        with _instrumented(model, len(prepared.frames), est):
+            resp = await _scheduler.run(
+                lambda: client().responses.create(
+                    model=model,
+                    input=[{"role": "user", "content": content}],
+                    max_output_tokens=max_output_tokens,
+                    temperature=temperature,
+                ),
+                est_tokens=est,
             )
-            try:
-                return resp.output_text.strip()
-            except Exception:
-                # robust fallback for SDK variations
-                return (
-                    resp.output[0].content[0].text.strip()  # type: ignore[attr-defined]
+    except (APIConnectionError, APIStatusError) as e:
+        raise RuntimeError(f"vision analysis failed: {e}") from e
+    try:
+        text = resp.output_text.strip()
+    except Exception:
+        # robust fallback for SDK variations
+        text = (
+            resp.output[0].content[0].text.strip()  # type: ignore[attr-defined]
+        )
+    result = AnalysisResult(text=text, frames_used=len(prepared.frames), preprocessing=prepared.stats())
+    await _remember(key, result)
+    return result
+
+
+async def open_stream(
+    frames_base64: Sequence[FrameSource],
+    prompt: str,
+    model: Optional[str] = None,
+    max_output_tokens: int = 400,
+    temperature: float = 0.2,
+) -> AsyncIterator[Union[str, AnalysisResult]]:
+    """
+    Streaming variant of analyze_frames. Input checks, the cache lookup and
+    preprocessing run here, so bad input raises before the caller starts a
+    response; the returned iterator yields text deltas as the model produces
+    them, then the final AnalysisResult. A cache hit yields the whole text as
+    one delta. Retries only happen before the first delta.
+    """
+    if not frames_base64:
+        raise ValueError("no frames provided")
+
+    frames = frames_base64[-_MAX_INPUT_FRAMES:]
+
+    model = model or DEFAULT_MODEL
+    # hashing up to _MAX_INPUT_FRAMES frames (and reading spooled uploads) is blocking work
+    key = await asyncio.to_thread(cache_key, frames, prompt, model, temperature, max_output_tokens)
+    cached = await _cache.aget(key)
+    if cached is not None:
+        return _replay(cached)
+
+    from utils.frames import prepare_frames
+
+    prepared = await asyncio.to_thread(prepare_frames, frames, _MAX_FRAMES)
+    return _stream(key, prepared, prompt, model, max_output_tokens, temperature)
+
+
+async def _replay(cached: Dict[str, Any]) -> AsyncIterator[Union[str, AnalysisResult]]:
+    yield cached["text"]
+    yield AnalysisResult(**cached, cached=True)
+
+
+async def _stream(
+    key: str, prepared: PreparedFrames, prompt: str, model: str, max_output_tokens: int, temperature: float
+) -> AsyncIterator[Union[str, AnalysisResult]]:
+    from openai import APIConnectionError, APIStatusError
+
+    content = _image_content(prompt, prepared.frames)
+
+    est = estimate_tokens(prompt, len(prepared.frames), max_output_tokens)
+    parts: List[str] = []
+    try:
+        with _instrumented(model, len(prepared.frames), est):
+            # hold the concurrency slot for the whole stream; only opening it is retried
+            async with _scheduler.lease(est_tokens=est) as lease:
+                stream = await lease.call(
+                    lambda: client().responses.create(
+                        model=model,
+                        input=[{"role": "user", "content": content}],
+                        max_output_tokens=max_output_tokens,
+                        temperature=temperature,
+                        stream=True,
+                    )
                 )
-        except (RateLimitError, APIConnectionError, APIStatusError) as e:
-            last_err = e
-    raise RuntimeError(f"vision analysis failed: {last_err}")
+                async for event in stream:
+                    if event.type == "response.output_text.delta" and event.delta:
+                        parts.append(event.delta)
+                        yield event.delta
+                    elif event.type in ("response.failed", "error"):
+                        raise RuntimeError(f"vision analysis failed: {getattr(event, 'message', None) or event.type}")
+    except (APIConnectionError, APIStatusError) as e:
+        if parts:
+            raise RuntimeError(f"vision analysis interrupted: {e}") from e
+        raise RuntimeError(f"vision analysis failed: {e}") from e
+    result = AnalysisResult(
+        text="".join(parts).strip(), frames_used=len(prepared.frames), preprocessing=prepared.stats()
+    )
+    await _remember(key, result)
+    yield result
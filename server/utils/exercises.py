@@ -0,0 +1,208 @@
+"""
+Exercise registry and the shared data-access path for every fitness test.
+
+Adding an exercise is a new ExerciseSpec entry plus its summary table
+(`select ensure_exercise_table('<name>')`, see sql/002). Routes, validation
+limits, the deep-analysis Exercise enum and the batched queries below all
+derive from EXERCISES.
+"""
+import logging
+import os
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence
+
+from fastapi import HTTPException
+
+from utils.conditional import etag
+from utils.readcache import record_key, records, version_key, versions
+from utils.supabase import sb
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class ExerciseSpec:
+    name: str
+    max_value: int                  # per-session validation limit
+    unit: str = "reps"
+    higher_is_better: bool = True   # picks max vs min for the stored best (max_reps)
+
+    @property
+    def table(self) -> str:
+        return self.name
+
+
+EXERCISES: Dict[str, ExerciseSpec] = {
+    s.name: s
+    for s in (
+        ExerciseSpec("pushups", max_value=1000),
+        ExerciseSpec("situps", max_value=2000),
+    )
+}
+
+BULK_SESSION_CHUNK = int(os.getenv("BULK_SESSION_CHUNK", "1000"))  # sessions per append_exercise_sessions call
+# sessions kept in a record's legacy `history` array (and returned with it);
+# exercise_sessions keeps all of them for /history and /progress
+EXERCISE_HISTORY_CAP = int(os.getenv("EXERCISE_HISTORY_CAP", "50"))
+
+SessionListener = Callable[[ExerciseSpec, str, dict], None]
+_listeners: List[SessionListener] = []
+
+RECORD_COLUMNS = (
+    "id, user_id, max_reps, avg_reps, session_count, history, last_tracked, score, created_at, updated_at"
+)
+VERSION_COLUMNS = ("id", "updated_at", "session_count")
+
+
+def on_session(fn: SessionListener) -> SessionListener:
+    """
+    Register fn(spec, user_id, row) to run after every appended session with
+    the updated summary row. Usable as a decorator.
+    """
+    _listeners.append(fn)
+    return fn
+
+
+def get_spec(name: str) -> ExerciseSpec:
+    spec = EXERCISES.get(name)
+    if spec is None:
+        raise HTTPException(404, f"unknown exercise: {name}")
+    return spec
+
+
+def fetch_record(spec: ExerciseSpec, user_id: str, columns: str = "*"):
+    res = sb().table(spec.table).select(columns).eq("user_id", user_id).limit(1).execute()
+    return res.data[0] if res.data else None
+
+
+def get_record(spec: ExerciseSpec, user_id: str):
+    """fetch_record through the read-through cache; writes below invalidate it."""
+    return records.get(record_key(spec.name, user_id), lambda: fetch_record(spec, user_id, RECORD_COLUMNS))
+
+
+def get_version(spec: ExerciseSpec, user_id: str) -> Optional[dict]:
+    """
+    The record's version columns: taken from the cached row when there is
+    one, else a tiny select (cached separately) instead of the full row.
+    """
+    row = records.peek(record_key(spec.name, user_id))
+    if row is None:
+        row = versions.get(
+            version_key(spec.name, user_id), lambda: fetch_record(spec, user_id, ", ".join(VERSION_COLUMNS))
+        )
+    return {k: row.get(k) for k in VERSION_COLUMNS} if row else None
+
+
+def record_etag(spec: ExerciseSpec, row: dict) -> str:
+    return etag(spec.name, *(row.get(k) for k in VERSION_COLUMNS))
+
+
+def _invalidate(spec: ExerciseSpec, user_id: str) -> None:
+    records.invalidate(record_key(spec.name, user_id))
+    versions.invalidate(version_key(spec.name, user_id))
+
+
+def insert_record(spec: ExerciseSpec, user_id: str):
+    res = sb().table(spec.table).insert({"user_id": user_id, "history": []}).execute()
+    _invalidate(spec, user_id)
+    if not res.data:
+        raise HTTPException(500, f"failed to create {spec.name} record")
+    return res.data[0]
+
+
+def append_session(spec: ExerciseSpec, user_id: str, value: int, score: Optional[float]):
+    """
+    Append one session via the append_exercise_session RPC: the session row
+    and the running aggregates are written atomically in a single round-trip.
+    Returns the updated record; its `history` holds the last
+    EXERCISE_HISTORY_CAP sessions.
+    """
+    res = sb().rpc(
+        "append_exercise_session",
+        {
+            "p_exercise": spec.table,
+            "p_user_id": user_id,
+            "p_reps": value,
+            "p_score": score,
+            "p_higher_is_better": spec.higher_is_better,
+            "p_history_cap": EXERCISE_HISTORY_CAP,
+        },
+    ).execute()
+    if not res.data:
+        raise HTTPException(500, f"failed to record {spec.name} session")
+    _updated(spec, user_id, res.data)
+    return res.data
+
+
+def _updated(spec: ExerciseSpec, user_id: str, row: dict) -> None:
+    _invalidate(spec, user_id)
+    for fn in _listeners:
+        try:
+            fn(spec, user_id, row)
+        except Exception:
+            logger.exception("session listener %s failed", getattr(fn, "__name__", fn))
+
+
+def append_sessions(sessions: Sequence[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Append many already-validated sessions ({key, user_id, exercise, reps,
+    score, recorded_at}) via the append_exercise_sessions RPC, in chunks of
+    BULK_SESSION_CHUNK. Keys already stored for the user are skipped, so
+    replaying a batch is safe. Returns [{key, status}] in input order.
+    """
+    by_table = {s.table: s for s in EXERCISES.values()}
+    lower = [s.table for s in EXERCISES.values() if not s.higher_is_better]
+    results: List[Dict[str, Any]] = []
+    for i in range(0, len(sessions), BULK_SESSION_CHUNK):
+        chunk = list(sessions[i:i + BULK_SESSION_CHUNK])
+        res = sb().rpc("append_exercise_sessions", {
+            "p_sessions": chunk, "p_lower_is_better": lower, "p_history_cap": EXERCISE_HISTORY_CAP,
+        }).execute()
+        data = res.data or {}
+        for row in data.get("records") or []:
+            _updated(by_table[row.pop("exercise")], row["user_id"], row)
+        results.extend(data.get("results") or [])
+    return results
+
+
+def fetch_records(
+    user_ids: Iterable[str],
+    specs: Optional[Iterable[ExerciseSpec]] = None,
+    columns: str = RECORD_COLUMNS,
+) -> Dict[str, Dict[str, dict]]:
+    """
+    Batched lookup: one `in` query per exercise table for any number of
+    users. Returns {exercise: {user_id: row}}.
+    """
+    ids: List[str] = list(dict.fromkeys(user_ids))
+    out: Dict[str, Dict[str, dict]] = {}
+    for spec in specs or EXERCISES.values():
+        rows = []
+        if ids:
+            rows = sb().table(spec.table).select(columns).in_("user_id", ids).execute().data or []
+        out[spec.name] = {r["user_id"]: r for r in rows}
+    return out
+
+
+def fetch_details(
+    user_ids: Iterable[str],
+    history: int = 10,
+    specs: Optional[Iterable[ExerciseSpec]] = None,
+) -> List[dict]:
+    """
+    Profile + every exercise summary + the last `history` sessions for each
+    user, in one athlete_details RPC round-trip (sql/004). Users that don't
+    exist are left out; order follows user_ids.
+    """
+    ids: List[str] = list(dict.fromkeys(str(u) for u in user_ids))
+    if not ids:
+        return []
+    res = sb().rpc(
+        "athlete_details",
+        {
+            "p_user_ids": ids,
+            "p_exercises": [s.table for s in (specs or EXERCISES.values())],
+            "p_history_limit": history,
+        },
+    ).execute()
+    return res.data or []
@@ -0,0 +1,144 @@
+"""
+Streaming bulk export of athletes (joined with their exercise summaries)
+and raw sessions as CSV or NDJSON, optionally gzipped
+(GET /data/export/athletes, GET /data/export/sessions).
+
+Rows are produced page by page: `users` is walked with an id keyset
+cursor, and each page is joined to the summary tables with chunked
+`user_id in (...)` lookups. Sessions are walked by their id. Only one
+page is held at a time, so memory stays flat whatever the table sizes.
+"""
+import csv
+import io
+import json
+import os
+import zlib
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence
+
+from utils.exercises import ExerciseSpec
+from utils.supabase import sb
+
+EXPORT_PAGE_SIZE = int(os.getenv("EXPORT_PAGE_SIZE", "1000"))  # rows per keyset round-trip
+EXPORT_IN_CHUNK = 200  # ids per `in` filter, keeps the query URL short
+
+PROFILE_COLUMNS = ("id", "username", "full_name", "age", "gender", "height_cm", "weight_kg", "coach_id",
+                   "created_at", "updated_at")
+SUMMARY_COLUMNS = ("max_reps", "avg_reps", "session_count", "last_tracked", "score")
+SESSION_COLUMNS = ("id", "user_id", "exercise", "reps", "score", "recorded_at")
+
+Page = List[Dict[str, Any]]
+
+
+def _keyset(table: str, columns: str, filters: Callable = lambda q: q, key: str = "id") -> Iterator[Page]:
+    cursor = None
+    while True:
+        q = filters(sb().table(table).select(columns))
+        if cursor is not None:
+            q = q.gt(key, cursor)
+        rows = q.order(key).limit(EXPORT_PAGE_SIZE).execute().data or []
+        if rows:
+            yield rows
+        if len(rows) < EXPORT_PAGE_SIZE:
+            return
+        cursor = rows[-1][key]
+
+
+def _summaries(spec: ExerciseSpec, user_ids: Sequence[str]) -> Dict[str, dict]:
+    out: Dict[str, dict] = {}
+    cols = "user_id, " + ", ".join(SUMMARY_COLUMNS)
+    for i in range(0, len(user_ids), EXPORT_IN_CHUNK):
+        rows = sb().table(spec.table).select(cols).in_("user_id", list(user_ids[i:i + EXPORT_IN_CHUNK])).execute().data
+        out.update((r["user_id"], r) for r in rows or [])
+    return out
+
+
+def athlete_pages(
+    specs: Sequence[ExerciseSpec],
+    coach_id: Optional[str] = None,
+    with_records_only: bool = False,
+) -> Iterator[Page]:
+    """Pages of {profile columns..., <exercise>: summary or None}."""
+    filters = (lambda q: q.eq("coach_id", coach_id)) if coach_id else (lambda q: q)
+    for users in _keyset("users", ", ".join(PROFILE_COLUMNS), filters):
+        ids = [u["id"] for u in users]
+        joined = {spec.name: _summaries(spec, ids) for spec in specs}
+        page = []
+        for u in users:
+            row = dict(u)
+            for name, by_user in joined.items():
+                s = by_user.get(u["id"])
+                row[name] = {k: s.get(k) for k in SUMMARY_COLUMNS} if s else None
+            if with_records_only and not any(row[name] for name in joined):
+                continue
+            page.append(row)
+        if page:
+            yield page
+
+
+def session_pages(specs: Sequence[ExerciseSpec], coach_id: Optional[str] = None) -> Iterator[Page]:
+    """Pages of exercise_sessions rows for the given exercises (and one coach's athletes)."""
+    names = [s.table for s in specs]
+    cols = ", ".join(SESSION_COLUMNS)
+
+    def by_exercise(q):
+        return q.in_("exercise", names)
+
+    if not coach_id:
+        yield from _keyset("exercise_sessions", cols, by_exercise)
+        return
+    for users in _keyset("users", "id", lambda q: q.eq("coach_id", coach_id)):
+        ids = [u["id"] for u in users]
+        for i in range(0, len(ids), EXPORT_IN_CHUNK):
+            chunk = ids[i:i + EXPORT_IN_CHUNK]
+            yield from _keyset("exercise_sessions", cols, lambda q, chunk=chunk: by_exercise(q).in_("user_id", chunk))
+
+
+# ---------------------------------------------------------------- encoding
+
+
+def athlete_header(specs: Sequence[ExerciseSpec]) -> List[str]:
+    return list(PROFILE_COLUMNS) + [f"{s.name}_{c}" for s in specs for c in SUMMARY_COLUMNS]
+
+
+def flatten_athlete(row: Dict[str, Any], specs: Sequence[ExerciseSpec]) -> List[Any]:
+    out = [row.get(c) for c in PROFILE_COLUMNS]
+    for s in specs:
+        summary = row.get(s.name) or {}
+        out.extend(summary.get(c) for c in SUMMARY_COLUMNS)
+    return out
+
+
+def _cell(v: Any) -> Any:
+    if v is None:
+        return ""
+    # spreadsheet formula injection: =, +, -, @ at the start of a text cell
+    if isinstance(v, str) and v[:1] in ("=", "+", "-", "@", "\t", "\r"):
+        return "'" + v
+    return v
+
+
+def csv_chunks(header: Sequence[str], pages: Iterable[Page], flatten: Callable[[dict], List[Any]]) -> Iterator[bytes]:
+    buf = io.StringIO()
+    w = csv.writer(buf, lineterminator="\n")
+    w.writerow(header)
+    for page in pages:
+        w.writerows([_cell(v) for v in flatten(r)] for r in page)
+        yield buf.getvalue().encode()
+        buf.seek(0)
+        buf.truncate()
+    if buf.tell():
+        yield buf.getvalue().encode()
+
+
+def ndjson_chunks(pages: Iterable[Page]) -> Iterator[bytes]:
+    for page in pages:
+        yield "".join(json.dumps(r, separators=(",", ":"), default=str) + "\n" for r in page).encode()
+
+
+def gzipped(chunks: Iterable[bytes], level: int = 6) -> Iterator[bytes]:
+    z = zlib.compressobj(level, zlib.DEFLATED, 31)  # wbits=31: gzip container
+    for chunk in chunks:
+        out = z.compress(chunk)
+        if out:
+            yield out
+    yield z.flush()
@@ -0,0 +1,174 @@
+"""
+Frame preprocessing before the vision call.
+
+Two passes in a thread pool (Pillow releases the GIL while decoding and
+resizing): a cheap reduced-scale decode of every frame to drop
+near-duplicates by perceptual hash and pick keyframes that span the motion,
+then a full decode + downscale + JPEG re-encode of only the kept frames.
+"""
+import base64
+import binascii
+import io
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+from PIL import ExifTags, Image, ImageOps
+
+FRAME_MAX_SIDE = int(os.getenv("FRAME_MAX_SIDE", "768"))
+FRAME_JPEG_QUALITY = int(os.getenv("FRAME_JPEG_QUALITY", "70"))
+FRAME_DEDUPE_DISTANCE = int(os.getenv("FRAME_DEDUPE_DISTANCE", "6"))  # max dHash bit difference (of 256)
+FRAME_WORKERS = int(os.getenv("FRAME_WORKERS", str(min(8, (os.cpu_count() or 2)))))
+
+_SIG_SIDE = 24  # grayscale thumbnail used to measure motion between frames
+_HASH_SIDE = 16  # 16x16 difference hash = 256 bits
+
+_pool = ThreadPoolExecutor(max_workers=FRAME_WORKERS, thread_name_prefix="frames")
+
+FrameSource = Union[str, bytes, bytearray, memoryview, Any]  # base64/data URL, raw bytes, or file-like
+
+
+@dataclass
+class PreparedFrames:
+    frames: List[bytes]
+    frames_in: int
+    bytes_in: int
+    bytes_out: int
+    duplicates_dropped: int = 0
+    undecodable: int = 0
+    elapsed_ms: float = 0.0
+    kept_indices: List[int] = field(default_factory=list)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "frames_in": self.frames_in,
+            "frames_kept": len(self.frames),
+            "duplicates_dropped": self.duplicates_dropped,
+            "undecodable": self.undecodable,
+            "bytes_in": self.bytes_in,
+            "bytes_out": self.bytes_out,
+            "elapsed_ms": round(self.elapsed_ms, 1),
+        }
+
+
+def read_source(src: FrameSource) -> bytes:
+    if isinstance(src, str):
+        b64 = src.strip()
+        if b64.startswith("data:"):
+            b64 = b64.split(",", 1)[-1]
+        try:
+            return base64.b64decode(b64, validate=False)
+        except (binascii.Error, ValueError):
+            return b""
+    if isinstance(src, (bytes, bytearray, memoryview)):
+        return bytes(src)
+    if hasattr(src, "seek"):
+        src.seek(0)
+    return src.read()
+
+
+def _dhash(gray: Image.Image) -> int:
+    px = np.asarray(gray.resize((_HASH_SIDE + 1, _HASH_SIDE), Image.BILINEAR), dtype=np.int16)
+    bits = np.packbits((px[:, 1:] > px[:, :-1]).ravel())
+    return int.from_bytes(bits.tobytes(), "big")
+
+
+def _signature(src: FrameSource) -> Optional[Tuple[int, int, np.ndarray]]:
+    """Cheap pass: decode at reduced scale (JPEG DCT scaling) to hash + motion signature."""
+    raw = read_source(src)
+    try:
+        img = Image.open(io.BytesIO(raw))
+        img.draft("L", (_SIG_SIDE * 4, _SIG_SIDE * 4))
+        gray = img.convert("L")
+    except Exception:
+        return None
+    sig = np.asarray(gray.resize((_SIG_SIDE, _SIG_SIDE), Image.BILINEAR), dtype=np.float32).ravel() / 255.0
+    return len(raw), _dhash(gray), sig
+
+
+def _encode(src: FrameSource, max_side: int, quality: int) -> bytes:
+    """Full pass for kept frames only: orient, downscale, re-encode as JPEG."""
+    img = Image.open(io.BytesIO(read_source(src)))
+    img.draft("RGB", (max_side, max_side))
+    if img.getexif().get(ExifTags.Base.Orientation, 1) != 1:
+        img = ImageOps.exif_transpose(img)
+    img = img.convert("RGB")
+    img.thumbnail((max_side, max_side), Image.BILINEAR)
+    out = io.BytesIO()
+    img.save(out, format="JPEG", quality=quality)
+    return out.getvalue()
+
+
+def select_keyframes(sigs: np.ndarray, k: int) -> np.ndarray:
+    """
+    Pick k frame indices that cover the movement: samples evenly along the
+    cumulative motion path (more picks where things change), plus the two
+    extremes of the dominant motion axis (e.g. top and bottom of a rep).
+    """
+    n = len(sigs)
+    if n <= k:
+        return np.arange(n)
+    steps = np.linalg.norm(np.diff(sigs, axis=0), axis=1)
+    path = np.concatenate([[0.0], np.cumsum(steps)])
+    if path[-1] <= 0:
+        picks = np.linspace(0, n - 1, k).round().astype(int)
+    else:
+        picks = np.searchsorted(path, np.linspace(0, path[-1], max(k - 2, 1)))
+        centered = sigs - sigs.mean(axis=0)
+        axis = np.linalg.svd(centered, full_matrices=False)[2][0]
+        proj = centered @ axis
+        picks = np.concatenate([picks, [proj.argmin(), proj.argmax()]])
+    picks = np.unique(np.clip(picks, 0, n - 1))
+    if len(picks) < k:
+        # top up with evenly spaced frames we don't have yet
+        rest = np.setdiff1d(np.arange(n), picks)
+        extra = rest[np.linspace(0, len(rest) - 1, k - len(picks)).round().astype(int)]
+        picks = np.unique(np.concatenate([picks, extra]))
+    return picks[:k]
+
+
+def prepare_frames(
+    sources: Sequence[FrameSource],
+    max_frames: int,
+    max_side: int = FRAME_MAX_SIDE,
+    quality: int = FRAME_JPEG_QUALITY,
+    dedupe_distance: int = FRAME_DEDUPE_DISTANCE,
+) -> PreparedFrames:
+    t0 = time.perf_counter()
+    sigs_all = list(_pool.map(_signature, sources))
+
+    bytes_in = 0
+    undecodable = 0
+    kept: List[int] = []
+    last_hash: Optional[int] = None
+    for i, d in enumerate(sigs_all):
+        if d is None:
+            undecodable += 1
+            continue
+        bytes_in += d[0]
+        # compare against the last kept frame so slow drift still accumulates
+        if last_hash is not None and (d[1] ^ last_hash).bit_count() <= dedupe_distance:
+            continue
+        kept.append(i)
+        last_hash = d[1]
+
+    if not kept:
+        raise ValueError("no decodable frames")
+
+    sigs = np.stack([sigs_all[i][2] for i in kept])
+    chosen = [kept[j] for j in select_keyframes(sigs, max_frames)]
+    frames = list(_pool.map(lambda i: _encode(sources[i], max_side, quality), chosen))
+
+    return PreparedFrames(
+        frames=frames,
+        frames_in=len(sigs_all),
+        bytes_in=bytes_in,
+        bytes_out=sum(len(f) for f in frames),
+        duplicates_dropped=len(sigs_all) - undecodable - len(kept),
+        undecodable=undecodable,
+        elapsed_ms=(time.perf_counter() - t0) * 1000,
+        kept_indices=chosen,
+    )
@@ -0,0 +1,111 @@
+"""
+Leaderboards and percentile ranks per exercise, metric and gender/age band.
+
+Rankings live in Postgres (leaderboard_ranks, sql/007): one builder calls
+rebuild() every LEADERBOARD_REFRESH_S (worker.py, process 0, or pg_cron),
+which recomputes them set-based in one transaction. API processes only read
+them with indexed selects, so no process holds a copy of the rankings and a
+request never triggers a build; every process sees the same snapshot. Pages
+and ranks are cached per process for READ_CACHE_MEMORY_TTL_S, so results
+trail a rebuild by at most that much.
+"""
+import logging
+import os
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from utils.exercises import EXERCISES, ExerciseSpec
+from utils.readcache import ReadThrough
+from utils.supabase import sb
+
+logger = logging.getLogger(__name__)
+
+LEADERBOARD_REFRESH_S = float(os.getenv("LEADERBOARD_REFRESH_S", "300"))
+# lower edges of the age bands after the first, e.g. "14,18,24,30" -> <14, 14-17, 18-23, 24-29, 30+
+AGE_BAND_EDGES = tuple(int(a) for a in os.getenv("LEADERBOARD_AGE_BANDS", "14,18,24,30").split(","))
+
+ANY = "*"
+METRICS = ("max_reps", "avg_reps", "score")
+
+
+def age_band(age: Optional[int]) -> Optional[str]:
+    """Band label for an age; sql/007 leaderboard_age_band() must agree."""
+    if age is None:
+        return None
+    lo = None
+    for edge in AGE_BAND_EDGES:
+        if age < edge:
+            return f"<{edge}" if lo is None else f"{lo}-{edge - 1}"
+        lo = edge
+    return f"{lo}+"
+
+
+AGE_BANDS = tuple(age_band(a) for a in (0,) + AGE_BAND_EDGES)
+
+_reads = ReadThrough("leaderboards")
+
+
+# ---- building (one process) ----
+
+def rebuild(specs: Optional[List[ExerciseSpec]] = None) -> Dict[str, int]:
+    """Recompute the rankings in the database; returns athletes ranked per exercise."""
+    specs = specs or list(EXERCISES.values())
+    t0 = time.perf_counter()
+    res = sb().rpc("refresh_leaderboard_ranks", {
+        "p_exercises": [s.table for s in specs],
+        "p_lower_is_better": [s.table for s in specs if not s.higher_is_better],
+        "p_age_edges": list(AGE_BAND_EDGES),
+    }).execute()
+    counts = res.data or {}
+    logger.info("Leaderboards rebuilt (%s) in %.1fs",
+                ", ".join(f"{k}: {v}" for k, v in counts.items()), time.perf_counter() - t0)
+    return counts
+
+
+# ---- reads ----
+
+def _ranks(spec: ExerciseSpec, metric: str, gender: str, band: str, columns: str):
+    return (sb().table("leaderboard_ranks").select(columns)
+            .eq("exercise", spec.table).eq("metric", metric).eq("gender", gender).eq("age_band", band))
+
+
+def _top(spec: ExerciseSpec, metric: str, gender: str, band: str, limit: int, offset: int):
+    rows = (_ranks(spec, metric, gender, band, "rank, user_id, value, total")
+            .order("rank").order("user_id").limit(limit).offset(offset).execute().data or [])
+    if rows:
+        total = rows[0]["total"]
+    else:  # past the end (or an empty band): the total still comes from the band's first row
+        first = _ranks(spec, metric, gender, band, "total").order("rank").limit(1).execute().data
+        total = first[0]["total"] if first else 0
+    return total, [{k: r[k] for k in ("rank", "user_id", "value")} for r in rows]
+
+
+def top(spec: ExerciseSpec, metric: str, gender: str = ANY, band: str = ANY,
+        limit: int = 50, offset: int = 0) -> Tuple[int, List[Dict[str, Any]]]:
+    """(athletes in the band, one page of {rank, user_id, value}), best first."""
+    key = f"top:{spec.name}:{metric}:{gender}:{band}:{limit}:{offset}"
+    return _reads.get(key, lambda: _top(spec, metric, gender, band, limit, offset))
+
+
+def _rank(spec: ExerciseSpec, user_id: str, metric: str, gender: str, band: str):
+    rows = (_ranks(spec, metric, gender, band, "value, rank, total, percentile")
+            .eq("user_id", user_id).limit(1).execute().data)
+    return rows[0] if rows else None
+
+
+def rank(spec: ExerciseSpec, user_id: str, metric: str, gender: str = ANY,
+         band: str = ANY) -> Optional[Dict[str, Any]]:
+    """{value, rank, total, percentile} of one athlete, or None if unranked in the band."""
+    key = f"rank:{spec.name}:{user_id}:{metric}:{gender}:{band}"
+    return _reads.get(key, lambda: _rank(spec, user_id, metric, gender, band))
+
+
+def stats() -> Dict[str, Any]:
+    """Athletes ranked and last build time per exercise."""
+    rows = sb().table("leaderboard_builds").select("exercise, athletes, built_at").execute().data or []
+    built = {r["exercise"]: r for r in rows}
+    return {
+        name: {"athletes": built.get(spec.table, {}).get("athletes", 0),
+               "built_at": built.get(spec.table, {}).get("built_at")}
+        for name, spec in EXERCISES.items()
+    }
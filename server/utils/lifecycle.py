@@ -0,0 +1,146 @@
+"""
+Per-process startup warm-up, readiness and drain state (GET /ready).
+
+Every worker process runs warm_up() from the app lifespan: Supabase
+clients, JWKS keys and the model client (and the SDKs behind them, which
+the app itself imports lazily) are created up front instead of on the
+first user's request. By default warm-up finishes before the worker
+starts listening, so nothing is routed to a cold process; failed steps are
+retried in the background. With WARMUP_BLOCKING=0 it runs in the background
+instead and the worker binds and answers /health right away; only /ready is
+gated then (503 until the required steps succeed), so the load balancer
+must probe /ready, not /health. /ready flips back to 503 as soon as the
+process starts draining on SIGTERM/SIGINT.
+"""
+import asyncio
+import logging
+import os
+import signal
+import time
+from contextlib import asynccontextmanager
+from typing import Any, Awaitable, Callable, Dict, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+WARMUP_RETRY_S = float(os.getenv("WARMUP_RETRY_S", "5"))
+WARMUP_BLOCKING = os.getenv("WARMUP_BLOCKING", "1") == "1"
+
+_state: Dict[str, Any] = {"started_at": None, "ready_at": None, "draining": False, "checks": {}}
+
+
+async def _supabase() -> None:
+    from utils.supabase import asb, sb
+
+    await asyncio.to_thread(sb)
+    await asb()
+
+
+async def _jwks() -> None:
+    from utils.security import load_jwks
+
+    n = await asyncio.to_thread(load_jwks)
+    if not n:
+        raise RuntimeError("JWKS has no usable keys")
+
+
+async def _model() -> None:
+    from utils.deepanalysis import warm_up_client
+
+    await warm_up_client()
+
+
+def _steps() -> List[Tuple[str, Callable[[], Awaitable[None]], bool]]:
+    """(name, step, required for readiness)"""
+    return [("supabase", _supabase, True), ("jwks", _jwks, True), ("model", _model, False)]
+
+
+async def _run(name: str, step: Callable[[], Awaitable[None]]) -> bool:
+    t0 = time.perf_counter()
+    try:
+        await step()
+    except Exception as e:
+        _state["checks"][name] = {"ok": False, "error": str(e) or type(e).__name__}
+        logger.warning("warm-up %s failed: %s", name, e)
+        return False
+    _state["checks"][name] = {"ok": True, "ms": round((time.perf_counter() - t0) * 1000, 1)}
+    return True
+
+
+def _update_ready() -> None:
+    required = {name for name, _, req in _steps() if req}
+    if _state["ready_at"] is None and all(_state["checks"].get(n, {}).get("ok") for n in required):
+        _state["ready_at"] = time.time()
+        logger.info("worker %d ready in %.2fs", os.getpid(), _state["ready_at"] - _state["started_at"])
+
+
+async def warm_up() -> None:
+    _state["started_at"] = time.time()
+    steps = _steps()
+    await asyncio.gather(*(_run(name, step) for name, step, _ in steps))
+    _update_ready()
+
+
+async def _retry_failed() -> None:
+    while True:
+        failed = [(n, s) for n, s, _ in _steps() if not _state["checks"].get(n, {}).get("ok")]
+        if not failed:
+            return
+        await asyncio.sleep(WARMUP_RETRY_S)
+        await asyncio.gather(*(_run(n, s) for n, s in failed))
+        _update_ready()
+
+
+async def _warm_up_in_background() -> None:
+    await warm_up()
+    await _retry_failed()
+
+
+def _install_drain_hook() -> None:
+    """Chain onto the server's SIGTERM/SIGINT handlers so /ready fails while in-flight requests finish."""
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        try:
+            prev = signal.getsignal(sig)
+        except ValueError:  # not the main thread (e.g. under a test client)
+            return
+        if not callable(prev):
+            continue
+
+        def handler(signum, frame, prev=prev):
+            if not _state["draining"]:
+                _state["draining"] = True
+                logger.info("worker %d draining", os.getpid())
+            prev(signum, frame)
+
+        try:
+            signal.signal(sig, handler)
+        except ValueError:
+            return
+
+
+def is_ready() -> bool:
+    return _state["ready_at"] is not None and not _state["draining"]
+
+
+def status() -> Dict[str, Any]:
+    return {
+        "ready": is_ready(),
+        "draining": _state["draining"],
+        "pid": os.getpid(),
+        "checks": _state["checks"],
+    }
+
+
+@asynccontextmanager
+async def lifespan(app):
+    _install_drain_hook()
+    if WARMUP_BLOCKING:
+        await warm_up()
+        task = asyncio.create_task(_retry_failed())
+    else:
+        task = asyncio.create_task(_warm_up_in_background())
+    try:
+        yield
+    finally:
+        _state["draining"] = True
+        task.cancel()
+        logger.info("worker %d stopped", os.getpid())
@@ -0,0 +1,329 @@
+"""
+In-process metrics in Prometheus text format (GET /metrics), plus a
+per-request time breakdown (auth / db / model) for the slow-request log.
+
+Deliberately tiny: counters, gauges and fixed-bucket histograms keyed by
+label tuples, one lock per metric. Each process exposes its own numbers;
+with several workers, scrape each or aggregate upstream.
+"""
+import bisect
+import logging
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+# log requests slower than this (0 = off), sampled at SLOW_REQUEST_SAMPLE
+SLOW_REQUEST_MS = float(os.getenv("SLOW_REQUEST_MS", "0"))
+SLOW_REQUEST_SAMPLE = float(os.getenv("SLOW_REQUEST_SAMPLE", "1.0"))
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+
+_registry: List["_Metric"] = []
+_collectors: List[Callable[[], None]] = []
+
+
+def _escape(v: str) -> str:
+    return v.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _fmt(labelnames: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{k}="{_escape(str(v))}"' for k, v in zip(labelnames, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _le(bound: str) -> str:
+    return f'le="{bound}"'
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, doc: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.doc = doc
+        self.labelnames = tuple(labels)
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def _samples(self) -> Iterator[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.doc}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self._samples())
+        return "\n".join(lines)
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, doc: str, labels: Sequence[str] = ()):
+        super().__init__(name, doc, labels)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, *labels: str, amount: float = 1.0) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def _samples(self) -> Iterator[str]:
+        with self._lock:
+            items = list(self._values.items())
+        for labels, v in items:
+            yield f"{self.name}{_fmt(self.labelnames, labels)} {v:g}"
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, *labels: str, amount: float = 1.0) -> None:
+        self.inc(*labels, amount=-amount)
+
+    def set(self, value: float, *labels: str) -> None:
+        with self._lock:
+            self._values[labels] = value
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, doc: str, labels: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, doc, labels)
+        self.buckets = tuple(buckets)
+        self._values: Dict[Tuple[str, ...], List[float]] = {}  # per-bucket counts..., +Inf count, sum
+
+    def observe(self, value: float, *labels: str) -> None:
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            row = self._values.get(labels)
+            if row is None:
+                row = self._values[labels] = [0.0] * (len(self.buckets) + 2)
+            row[i] += 1
+            row[-1] += value
+
+    @contextmanager
+    def time(self, *labels: str) -> Iterator[None]:
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - t0, *labels)
+
+    def _samples(self) -> Iterator[str]:
+        with self._lock:
+            items = [(k, list(v)) for k, v in self._values.items()]
+        for labels, row in items:
+            cum = 0.0
+            for le, n in zip(self.buckets, row):
+                cum += n
+                yield f"{self.name}_bucket{_fmt(self.labelnames, labels, _le(f'{le:g}'))} {cum:g}"
+            cum += row[len(self.buckets)]
+            yield f"{self.name}_bucket{_fmt(self.labelnames, labels, _le('+Inf'))} {cum:g}"
+            yield f"{self.name}_sum{_fmt(self.labelnames, labels)} {row[-1]:.6g}"
+            yield f"{self.name}_count{_fmt(self.labelnames, labels)} {cum:g}"
+
+
+def on_collect(fn: Callable[[], None]) -> Callable[[], None]:
+    """Register fn to refresh gauges from live state right before each scrape."""
+    _collectors.append(fn)
+    return fn
+
+
+def render() -> str:
+    for fn in _collectors:
+        try:
+            fn()
+        except Exception:
+            logger.exception("metrics collector %s failed", getattr(fn, "__name__", fn))
+    return "\n".join(m.render() for m in _registry) + "\n"
+
+
+# ---- per-request breakdown ----
+
+_breakdown: ContextVar[Optional[Dict[str, float]]] = ContextVar("metrics_breakdown", default=None)
+
+
+def add_time(component: str, seconds: float) -> None:
+    """Attribute time to a component (auth/db/model) of the current request, if any."""
+    b = _breakdown.get()
+    if b is not None:
+        b[component] = b.get(component, 0.0) + seconds
+
+
+@contextmanager
+def timed(component: str) -> Iterator[None]:
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        add_time(component, time.perf_counter() - t0)
+
+
+# ---- HTTP ----
+
+HTTP_LATENCY = Histogram("http_request_duration_seconds", "HTTP request latency", ("method", "route", "status"))
+HTTP_IN_FLIGHT = Gauge("http_requests_in_flight", "HTTP requests being served", ("method",))
+HTTP_REQUEST_BYTES = Histogram("http_request_size_bytes", "HTTP request body size", ("method", "route"), SIZE_BUCKETS)
+HTTP_RESPONSE_BYTES = Histogram("http_response_size_bytes", "HTTP response body size", ("method", "route"), SIZE_BUCKETS)
+
+
+def _route_template(scope) -> str:
+    """
+    Full path template of the matched route, e.g. /data/athletes/{athlete_id}.
+    Routes of included routers only know their own suffix, so the router
+    prefix is recovered from the concrete path.
+    """
+    route = scope.get("route")
+    fmt = getattr(route, "path_format", None) or getattr(route, "path", None)
+    if not fmt:
+        return "unmatched"
+    path = scope.get("path", "")
+    concrete = fmt
+    for k, v in (scope.get("path_params") or {}).items():
+        concrete = concrete.replace("{" + k + "}", str(v), 1)
+    if path.endswith(concrete):
+        return path[: len(path) - len(concrete)] + fmt
+    return fmt
+
+
+class MetricsMiddleware:
+    """
+    Pure ASGI middleware (no BaseHTTPMiddleware: streaming responses pass
+    straight through). Labels by route template, not raw path, so ids
+    don't explode cardinality.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        method = scope["method"]
+        t0 = time.perf_counter()
+        sizes = [0, 0]
+        status = [500]
+        breakdown: Dict[str, float] = {}
+        token = _breakdown.set(breakdown)
+        HTTP_IN_FLIGHT.inc(method)
+
+        async def _receive():
+            msg = await receive()
+            if msg["type"] == "http.request":
+                sizes[0] += len(msg.get("body", b""))
+            return msg
+
+        async def _send(msg):
+            if msg["type"] == "http.response.start":
+                status[0] = msg["status"]
+            elif msg["type"] == "http.response.body":
+                sizes[1] += len(msg.get("body", b""))
+            await send(msg)
+
+        try:
+            await self.app(scope, _receive, _send)
+        finally:
+            elapsed = time.perf_counter() - t0
+            HTTP_IN_FLIGHT.dec(method)
+            _breakdown.reset(token)
+            route = _route_template(scope)
+            HTTP_LATENCY.observe(elapsed, method, route, str(status[0]))
+            HTTP_REQUEST_BYTES.observe(sizes[0], method, route)
+            HTTP_RESPONSE_BYTES.observe(sizes[1], method, route)
+            if SLOW_REQUEST_MS > 0 and elapsed * 1000 >= SLOW_REQUEST_MS and random.random() < SLOW_REQUEST_SAMPLE:
+                parts = " ".join(f"{k}={v * 1000:.0f}ms" for k, v in sorted(breakdown.items()))
+                other = max(elapsed - sum(breakdown.values()), 0.0)
+                logger.warning(
+                    "slow request %s %s %d %.0fms: %s other=%.0fms",
+                    method, route, status[0], elapsed * 1000, parts or "-", other * 1000,
+                )
+
+
+# ---- Supabase (PostgREST over httpx) ----
+
+DB_LATENCY = Histogram("db_query_duration_seconds", "Supabase/PostgREST query latency", ("table", "operation", "status"))
+
+DB_POOL_WAIT = Histogram(
+    "db_pool_wait_seconds", "Time a Supabase request waited for a pooled connection", ("pool",),
+    (0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+)
+DB_POOL_CONNECTIONS = Gauge("db_pool_connections", "Open Supabase connections by state", ("pool", "state"))
+DB_CONNECTIONS_OPENED = Counter("db_connections_opened_total", "New Supabase TCP connections and TLS handshakes", ("pool", "kind"))
+DB_RETRIES = Counter("db_retries_total", "Retried idempotent Supabase reads", ("pool", "reason"))
+
+_OPERATIONS = {"GET": "select", "HEAD": "count", "POST": "insert", "PATCH": "update", "PUT": "upsert", "DELETE": "delete"}
+
+
+def _db_labels(request) -> Tuple[str, str]:
+    path = request.url.path
+    rest = path.split("/rest/v1/", 1)[-1].strip("/")
+    if rest.startswith("rpc/"):
+        return rest[4:], "rpc"
+    op = _OPERATIONS.get(request.method, request.method.lower())
+    if op == "insert" and "merge-duplicates" in request.headers.get("prefer", ""):
+        op = "upsert"
+    return rest or path, op
+
+
+def _on_request(request) -> None:
+    request.extensions["metrics_t0"] = time.perf_counter()
+
+
+def _observe(response) -> None:
+    t0 = response.request.extensions.get("metrics_t0")
+    if t0 is None:
+        return
+    elapsed = time.perf_counter() - t0
+    table, op = _db_labels(response.request)
+    DB_LATENCY.observe(elapsed, table, op, str(response.status_code))
+    add_time("db", elapsed)
+
+
+def _on_response(response) -> None:
+    response.read()  # include the body transfer in the timing
+    _observe(response)
+
+
+async def _on_request_async(request) -> None:
+    _on_request(request)
+
+
+async def _on_response_async(response) -> None:
+    await response.aread()
+    _observe(response)
+
+
+def instrument_httpx(client, is_async: bool = False) -> None:
+    """Attach DB timing hooks to an httpx client (the one PostgREST uses)."""
+    hooks = client.event_hooks
+    hooks["request"] = hooks.get("request", []) + [_on_request_async if is_async else _on_request]
+    hooks["response"] = hooks.get("response", []) + [_on_response_async if is_async else _on_response]
+    client.event_hooks = hooks
+
+
+# ---- single-flight coalescing ----
+
+SINGLEFLIGHT_CALLS = Counter(
+    "singleflight_calls_total", "Coalescable calls by outcome (leader = went upstream)", ("group", "outcome")
+)
+SINGLEFLIGHT_IN_FLIGHT = Gauge("singleflight_in_flight", "Distinct keys with an upstream call in flight", ("group",))
+
+
+# ---- vision model ----
+
+MODEL_LATENCY = Histogram("model_call_duration_seconds", "Vision model call latency incl. queueing and retries", ("model", "outcome"))
+MODEL_RETRIES = Counter("model_retries_total", "Vision model call retries", ("reason",))
+MODEL_FRAMES = Histogram("model_frames_per_call", "Frames sent per vision call", (), (1, 2, 4, 8, 16, 32, 64, 128))
+MODEL_EST_TOKENS = Histogram(
+    "model_estimated_tokens_per_call", "Estimated input tokens per vision call", (),
+    (500, 1000, 2500, 5000, 10000, 25000, 50000, 100000),
+)
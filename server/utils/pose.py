@@ -0,0 +1,183 @@
+"""
+Rep counting and form scoring from pose keypoints (COCO-17 layout, as
+produced by YOLOv8-pose), CPU-only and vectorized over the whole sequence.
+
+Input is a (frames, 17, 2|3) array of x, y[, confidence]. A rep is one
+extended → flexed → extended cycle of the exercise's primary joint angle,
+detected with hysteresis so jitter around a threshold doesn't double count.
+"""
+from dataclasses import dataclass
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+
+# COCO-17 keypoint indices
+NOSE = 0
+L_SHOULDER, R_SHOULDER = 5, 6
+L_ELBOW, R_ELBOW = 7, 8
+L_WRIST, R_WRIST = 9, 10
+L_HIP, R_HIP = 11, 12
+L_KNEE, R_KNEE = 13, 14
+L_ANKLE, R_ANKLE = 15, 16
+
+Triplet = Tuple[Tuple[int, int, int], Tuple[int, int, int]]  # (left side, right side)
+
+
+@dataclass(frozen=True)
+class PoseProfile:
+    joint: Triplet                     # angle that drives rep detection
+    extended_deg: float                # at/above: top of the rep
+    flexed_deg: float                  # at/below: bottom of the rep
+    target_deg: float                  # depth the bottom should reach for full marks
+    line: Optional[Triplet] = None     # body-line angle that should stay ~straight
+    line_tolerance_deg: float = 15.0
+
+
+PROFILES: Dict[str, PoseProfile] = {
+    "pushups": PoseProfile(
+        joint=((L_SHOULDER, L_ELBOW, L_WRIST), (R_SHOULDER, R_ELBOW, R_WRIST)),
+        extended_deg=150.0,
+        flexed_deg=100.0,
+        target_deg=90.0,
+        line=((L_SHOULDER, L_HIP, L_ANKLE), (R_SHOULDER, R_HIP, R_ANKLE)),
+    ),
+    "situps": PoseProfile(
+        joint=((L_SHOULDER, L_HIP, L_KNEE), (R_SHOULDER, R_HIP, R_KNEE)),
+        extended_deg=120.0,
+        flexed_deg=75.0,
+        target_deg=60.0,
+    ),
+}
+
+MIN_CONFIDENCE = 0.3
+
+
+def _angles(kps: np.ndarray, triplet: Tuple[int, int, int]) -> np.ndarray:
+    """Angle at the middle keypoint, degrees, NaN where any point is low-confidence."""
+    a, b, c = (kps[:, i, :2] for i in triplet)
+    ba, bc = a - b, c - b
+    cos = np.einsum("ij,ij->i", ba, bc) / (np.linalg.norm(ba, axis=1) * np.linalg.norm(bc, axis=1) + 1e-9)
+    ang = np.degrees(np.arccos(np.clip(cos, -1.0, 1.0)))
+    if kps.shape[2] > 2:
+        ang[kps[:, list(triplet), 2].min(axis=1) < MIN_CONFIDENCE] = np.nan
+    return ang
+
+
+def _fill_nan(x: np.ndarray) -> np.ndarray:
+    ok = ~np.isnan(x)
+    if ok.all() or not ok.any():
+        return x
+    idx = np.arange(len(x))
+    return np.interp(idx, idx[ok], x[ok])
+
+
+def _smooth(x: np.ndarray, window: int) -> np.ndarray:
+    if window <= 1 or len(x) < window:
+        return x
+    pad = window // 2
+    padded = np.pad(x, (pad, window - 1 - pad), mode="edge")
+    return np.convolve(padded, np.ones(window) / window, mode="valid")
+
+
+def joint_angle(kps: np.ndarray, pair: Triplet) -> np.ndarray:
+    """Mean of the left/right angles (whichever side is visible), gaps interpolated."""
+    left, right = _angles(kps, pair[0]), _angles(kps, pair[1])
+    mean = np.where(np.isnan(left), right, np.where(np.isnan(right), left, (left + right) / 2))
+    return _fill_nan(mean)
+
+
+def segment_reps(angle: np.ndarray, extended: float, flexed: float) -> np.ndarray:
+    """
+    Returns an (n_reps, 4) int array of frame indices per rep:
+    [last frame at top, first frame at bottom, last frame at bottom, first frame back at top].
+    """
+    state = np.where(angle >= extended, 1, np.where(angle <= flexed, -1, 0))
+    pos = np.flatnonzero(state)
+    if len(pos) < 2:
+        return np.empty((0, 4), dtype=int)
+    s = state[pos]
+    change = np.flatnonzero(s[1:] != s[:-1]) + 1        # index into pos where state flips
+    down = change[s[change] == -1]                       # top -> bottom
+    up = change[s[change] == 1]                          # bottom -> top
+    if not len(down) or not len(up):
+        return np.empty((0, 4), dtype=int)
+    # each completed rep: a descent followed by the next ascent
+    up = up[up > down[0]]
+    down = down[np.searchsorted(down, up) - 1]
+    return np.stack([pos[down - 1], pos[down], pos[up - 1], pos[up]], axis=1)
+
+
+def analyze_sequence(keypoints: Any, exercise: str, fps: float = 30.0) -> Dict[str, Any]:
+    profile = PROFILES.get(exercise)
+    if profile is None:
+        raise ValueError(f"no pose profile for exercise: {exercise}")
+    kps = np.asarray(keypoints, dtype=np.float32)
+    if kps.ndim != 3 or kps.shape[1] != 17 or kps.shape[2] not in (2, 3):
+        raise ValueError("keypoints must have shape (frames, 17, 2|3)")
+    if len(kps) < 2:
+        raise ValueError("need at least 2 frames")
+
+    angle = joint_angle(kps, profile.joint)
+    if np.isnan(angle).all():
+        raise ValueError("primary joint not visible in any frame")
+    angle = _smooth(angle, max(1, int(round(fps / 10))))
+
+    reps = segment_reps(angle, profile.extended_deg, profile.flexed_deg)
+    n = len(reps)
+    result: Dict[str, Any] = {
+        "exercise": exercise,
+        "frames": int(len(kps)),
+        "duration_s": round(len(kps) / fps, 2),
+        "reps": int(n),
+    }
+    if not n:
+        result.update({"score": 0.0, "per_rep": []})
+        return result
+
+    start, bottom_in, bottom_out, end = reps.T
+    # reduceat over [start, end] windows; one padding sample keeps end + 1 in range
+    bounds = np.stack([start, end + 1], axis=1).ravel()
+    padded = np.append(angle, angle[-1])
+    lows = np.minimum.reduceat(padded, bounds)[::2]
+    highs = np.maximum.reduceat(padded, bounds)[::2]
+    rom = highs - lows
+
+    descent = (bottom_in - start) / fps
+    hold = (bottom_out - bottom_in) / fps
+    ascent = (end - bottom_out) / fps
+    duration = (end - start) / fps
+
+    # depth: full marks at/below target, linear to zero at the flexed threshold
+    depth_score = np.clip((profile.flexed_deg - lows) / max(profile.flexed_deg - profile.target_deg, 1e-6), 0, 1)
+    scores = depth_score
+    line_dev = None
+    if profile.line is not None:
+        line = joint_angle(kps, profile.line)
+        if not np.isnan(line).all():
+            dev = np.abs(180.0 - line)
+            counts = (end + 1 - start).astype(np.float64)
+            line_dev = np.add.reduceat(np.append(dev, 0.0), bounds)[::2] / counts
+            line_score = np.clip(1 - (line_dev - profile.line_tolerance_deg) / 30.0, 0, 1)
+            scores = 0.6 * depth_score + 0.4 * line_score
+    # tempo consistency: penalise erratic rep durations
+    consistency = 1.0 - min(float(np.std(duration) / (np.mean(duration) + 1e-9)), 1.0) if n > 1 else 1.0
+    score = float(np.mean(scores) * (0.85 + 0.15 * consistency) * 100)
+
+    per_rep = np.stack([lows, rom, descent, hold, ascent, scores * 100], axis=1).round(2)
+    result.update({
+        "score": round(score, 1),
+        "depth_deg": {"mean": round(float(lows.mean()), 1), "best": round(float(lows.min()), 1)},
+        "rom_deg_mean": round(float(rom.mean()), 1),
+        "tempo_s": {
+            "rep_mean": round(float(duration.mean()), 2),
+            "descent_mean": round(float(descent.mean()), 2),
+            "ascent_mean": round(float(ascent.mean()), 2),
+            "cadence_rpm": round(float(60.0 * n / max((end[-1] - start[0]) / fps, 1e-6)), 1),
+        },
+        "body_line_dev_deg_mean": round(float(line_dev.mean()), 1) if line_dev is not None else None,
+        "per_rep": [
+            dict(zip(("bottom_deg", "rom_deg", "descent_s", "hold_s", "ascent_s", "score"), row))
+            for row in per_rep.tolist()
+        ],
+    })
+    return result
@@ -0,0 +1,257 @@
+"""
+Session history as NumPy arrays and the progress analytics built on it
+(rolling averages, personal bests, streaks, improvement rate, downsampled
+series) for the mobile progress tab and the coach dashboard.
+
+History comes from the exercise_history RPC (sql/006) in a compact
+columnar form: a start time, per-session time deltas and parallel reps /
+score arrays. Results are cached per athlete keyed by the record's
+session_count, read through utils.readcache. The worker that appends a
+session sees the new count at once; other workers keep their cached record,
+and so serve the previous results, for up to READ_CACHE_MEMORY_TTL_S (30s
+by default). Imported lazily by the routes so NumPy loads on first use.
+"""
+import math
+import os
+import time
+from typing import Any, Dict, NamedTuple, Optional
+
+import numpy as np
+
+from utils.cache import LRUCache
+from utils.exercises import ExerciseSpec, get_record
+from utils.supabase import sb
+
+HISTORY_MAX_SESSIONS = int(os.getenv("HISTORY_MAX_SESSIONS", "5000"))  # newest sessions analysed
+PROGRESS_CACHE_SIZE = int(os.getenv("PROGRESS_CACHE_SIZE", "4096"))
+
+DAY = 86400
+WEEK = 7 * DAY
+BUCKETS = ("session", "day", "week", "month")
+
+_cache = LRUCache(maxsize=PROGRESS_CACHE_SIZE)
+
+
+class Series(NamedTuple):
+    t: np.ndarray       # epoch seconds, ascending (int64)
+    reps: np.ndarray    # float64
+    score: np.ndarray   # float64, NaN where the session had no score
+
+    def __len__(self) -> int:
+        return len(self.t)
+
+
+def decode(payload: Optional[Dict[str, Any]]) -> Series:
+    """exercise_history JSON -> Series."""
+    payload = payload or {}
+    dt = np.asarray(payload.get("dt") or [], dtype=np.int64)
+    t = int(payload.get("t0") or 0) + np.cumsum(dt)
+    reps = np.asarray(payload.get("reps") or [], dtype=np.float64)
+    score = np.array([np.nan if v is None else v for v in payload.get("score") or []], dtype=np.float64)
+    return Series(t, reps, score)
+
+
+def encode(s: Series) -> Dict[str, Any]:
+    """Series -> the same compact JSON form (delta-encoded timestamps)."""
+    if not len(s):
+        return {"t0": None, "dt": [], "reps": [], "score": []}
+    return {
+        "t0": int(s.t[0]),
+        "dt": np.diff(s.t, prepend=s.t[0]).tolist(),
+        "reps": s.reps.astype(np.int64).tolist(),
+        "score": [None if math.isnan(v) else v for v in s.score.tolist()],
+    }
+
+
+def fetch_series(spec: ExerciseSpec, user_id: str, limit: int = HISTORY_MAX_SESSIONS) -> Series:
+    res = sb().rpc(
+        "exercise_history", {"p_user_id": user_id, "p_exercise": spec.table, "p_limit": limit}
+    ).execute()
+    return decode(res.data)
+
+
+def _cached(key: tuple, compute):
+    value = _cache.get(key)
+    if value is None:
+        value = compute()
+        _cache.set(key, value)
+    return value
+
+
+def _version(spec: ExerciseSpec, user_id: str) -> Optional[int]:
+    """session_count from the (cached) summary row; None when the athlete has no record."""
+    row = get_record(spec, user_id)
+    return None if not row else int(row.get("session_count") or 0)
+
+
+def history(spec: ExerciseSpec, user_id: str) -> Optional[Dict[str, Any]]:
+    """Compact history, or None when the athlete has no record for this exercise."""
+    version = _version(spec, user_id)
+    if version is None:
+        return None
+    return _cached(("history", spec.name, user_id, version), lambda: encode(fetch_series(spec, user_id)))
+
+
+def progress(
+    spec: ExerciseSpec,
+    user_id: str,
+    window: int = 7,
+    bucket: str = "session",
+    max_points: int = 200,
+    days: Optional[int] = None,
+) -> Optional[Dict[str, Any]]:
+    """Cached analyze() of the athlete's history, or None when they have no record."""
+    version = _version(spec, user_id)
+    if version is None:
+        return None
+    today = int(time.time()) // DAY  # streaks depend on the current day
+    key = ("progress", spec.name, user_id, version, today, window, bucket, max_points, days)
+    return _cached(key, lambda: analyze(
+        fetch_series(spec, user_id), spec.higher_is_better, window, bucket, max_points, days, today
+    ))
+
+
+# ---------------------------------------------------------------- analytics
+
+
+def rolling_mean(x: np.ndarray, window: int) -> np.ndarray:
+    """Mean of the last `window` values at each point (shorter at the start)."""
+    c = np.concatenate(([0.0], np.cumsum(x)))
+    hi = np.arange(1, len(x) + 1)
+    lo = np.maximum(hi - window, 0)
+    return (c[hi] - c[lo]) / (hi - lo)
+
+
+def personal_bests(s: Series, higher_is_better: bool = True) -> Dict[str, Any]:
+    acc = np.maximum.accumulate if higher_is_better else np.minimum.accumulate
+    best = acc(s.reps)
+    improved = np.empty(len(s), dtype=bool)
+    improved[0] = True
+    improved[1:] = (s.reps[1:] > best[:-1]) if higher_is_better else (s.reps[1:] < best[:-1])
+    idx = np.flatnonzero(improved)
+    return {
+        "best": int(best[-1]),
+        "best_at": int(s.t[idx[-1]]),
+        "count": int(len(idx)),
+        "history": {"t": s.t[idx].tolist(), "reps": s.reps[idx].astype(np.int64).tolist()},
+    }
+
+
+def streaks(t: np.ndarray, today: int) -> Dict[str, Any]:
+    """Runs of consecutive UTC days with at least one session."""
+    days = np.unique(t // DAY)
+    breaks = np.flatnonzero(np.diff(days) != 1)
+    starts = np.concatenate(([0], breaks + 1))
+    ends = np.concatenate((breaks, [len(days) - 1]))
+    lengths = ends - starts + 1
+    longest = int(np.argmax(lengths))
+    return {
+        # still alive if the last active day is today or yesterday
+        "current": int(lengths[-1]) if days[-1] >= today - 1 else 0,
+        "longest": int(lengths[longest]),
+        "longest_start": int(days[starts[longest]] * DAY),
+        "active_days": int(len(days)),
+    }
+
+
+def improvement(s: Series, window: int) -> Dict[str, Any]:
+    """Least-squares trend (reps per week) and first-vs-last window change."""
+    out: Dict[str, Any] = {"per_week": None, "change_pct": None}
+    if len(s) < 2:
+        return out
+    span = float(s.t[-1] - s.t[0])
+    if span > 0:
+        x = (s.t - s.t[0]) / WEEK
+        out["per_week"] = round(float(np.polyfit(x, s.reps, 1)[0]), 3)
+    w = max(1, min(window, len(s) // 2))
+    first, last = float(s.reps[:w].mean()), float(s.reps[-w:].mean())
+    if first:
+        out["change_pct"] = round((last - first) / first * 100, 2)
+    return out
+
+
+def _bucket_keys(t: np.ndarray, bucket: str) -> np.ndarray:
+    if bucket == "session":
+        return np.arange(len(t))
+    if bucket == "day":
+        return t // DAY
+    if bucket == "week":
+        return (t // DAY + 3) // 7  # ISO weeks: 1970-01-01 was a Thursday
+    return t.astype("datetime64[s]").astype("datetime64[M]").astype(np.int64)
+
+
+def downsample(s: Series, rolling: np.ndarray, bucket: str, max_points: int) -> Dict[str, Any]:
+    """
+    Columnar series grouped by calendar bucket, then merged evenly so there
+    are at most max_points points. `t` is each point's first session.
+    """
+    keys = _bucket_keys(s.t, bucket)
+    starts = np.flatnonzero(np.concatenate(([True], keys[1:] != keys[:-1])))
+    if len(starts) > max_points:
+        starts = starts[:: math.ceil(len(starts) / max_points)]
+    ends = np.concatenate((starts[1:], [len(s)])) - 1
+    counts = ends - starts + 1
+    score_n = np.add.reduceat((~np.isnan(s.score)).astype(np.int64), starts)
+    score_sum = np.add.reduceat(np.nan_to_num(s.score), starts)
+    score_mean = np.where(score_n > 0, score_sum / np.maximum(score_n, 1), np.nan)
+    return {
+        "bucket": bucket,
+        "t": s.t[starts].tolist(),
+        "sessions": counts.tolist(),
+        "mean": np.round(np.add.reduceat(s.reps, starts) / counts, 2).tolist(),
+        "max": np.maximum.reduceat(s.reps, starts).astype(np.int64).tolist(),
+        "min": np.minimum.reduceat(s.reps, starts).astype(np.int64).tolist(),
+        "rolling": np.round(rolling[ends], 2).tolist(),
+        "score": [None if math.isnan(v) else round(v, 2) for v in score_mean.tolist()],
+    }
+
+
+def _slice(s: Series, mask: np.ndarray) -> Series:
+    return Series(s.t[mask], s.reps[mask], s.score[mask])
+
+
+def analyze(
+    s: Series,
+    higher_is_better: bool = True,
+    window: int = 7,
+    bucket: str = "session",
+    max_points: int = 200,
+    days: Optional[int] = None,
+    today: Optional[int] = None,
+) -> Dict[str, Any]:
+    """
+    Progress summary. Personal bests and streaks are all-time; the rolling
+    average, improvement rate and series cover the last `days` (all when None).
+    """
+    today = int(time.time()) // DAY if today is None else today
+    if not len(s):
+        return {"sessions": 0, "window": window, "days": days}
+    rolling = rolling_mean(s.reps, window)
+    view, view_rolling = s, rolling
+    if days is not None:
+        mask = s.t >= (today + 1 - days) * DAY
+        view, view_rolling = _slice(s, mask), rolling[mask]
+
+    out: Dict[str, Any] = {
+        "sessions": len(s),
+        "first_at": int(s.t[0]),
+        "last_at": int(s.t[-1]),
+        "window": window,
+        "days": days,
+        "personal_best": personal_bests(s, higher_is_better),
+        "streak": streaks(s.t, today),
+        "period": {"sessions": len(view)},
+    }
+    if len(view):
+        out["period"].update({
+            "mean": round(float(view.reps.mean()), 2),
+            "best": int(view.reps.max() if higher_is_better else view.reps.min()),
+            "rolling_mean": round(float(view_rolling[-1]), 2),
+            "improvement": improvement(view, window),
+        })
+        out["series"] = downsample(view, view_rolling, bucket, max_points)
+    return out
+
+
+def stats() -> Dict[str, Any]:
+    return _cache.stats()
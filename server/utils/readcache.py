@@ -0,0 +1,177 @@
+"""
+Read-through caches for hot Supabase lookups: athlete profiles and
+per-exercise summary rows.
+
+Two tiers: a per-process LRU with a short TTL, and an optional shared tier
+(SQLite under READ_CACHE_DIR, shared by every process on the host; anything
+with get/set/delete, e.g. a Redis wrapper, can stand in for it) with a
+longer TTL. Writes through utils/exercises invalidate both tiers of this
+process and the shared tier; other processes' memory tiers age out within
+READ_CACHE_MEMORY_TTL_S. Profiles are edited by the app directly in
+Supabase, never through this server, so nothing invalidates them; their
+shared tier keeps PROFILE_CACHE_TTL_S instead. Concurrent misses for the
+same key are coalesced into one load (utils.singleflight), so a burst costs
+one round-trip per key; a load that overlaps an invalidation of its key is
+returned to its callers but not cached.
+"""
+import asyncio
+import os
+import threading
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from utils.cache import DiskCache, LRUCache, TieredCache
+from utils.singleflight import Group
+
+READ_CACHE_TTL_S = float(os.getenv("READ_CACHE_TTL_S", "300"))
+READ_CACHE_MEMORY_TTL_S = float(os.getenv("READ_CACHE_MEMORY_TTL_S", "30"))
+PROFILE_CACHE_TTL_S = float(os.getenv("PROFILE_CACHE_TTL_S", "60"))  # bounds staleness after a profile edit
+READ_CACHE_SIZE = int(os.getenv("READ_CACHE_SIZE", "10000"))
+READ_CACHE_DIR = os.getenv("READ_CACHE_DIR")  # set to enable the shared tier
+
+USER_COLUMNS = "id, username, full_name, age, gender, height_cm, weight_kg, coach_id, updated_at, created_at"
+
+_MISSING = object()
+
+
+class ReadThrough:
+    """Cache-aside wrapper: get() returns the cached value or calls the loader and stores it."""
+
+    def __init__(self, name: str, shared: Optional[Any] = None):
+        self.name = name
+        self.cache = TieredCache(LRUCache(maxsize=READ_CACHE_SIZE, ttl=READ_CACHE_MEMORY_TTL_S), shared)
+        self.flight = Group(name)
+        self.loads = 0
+        self.invalidations = 0
+        self._lock = threading.Lock()
+        self._loading: Dict[str, List[int]] = {}
+
+    # Stale-fill guard: a load that overlaps an invalidate() of its key must
+    # not write the pre-write value back. Each key with a load in flight has
+    # [loads, generation]; invalidate() bumps the generation and a fill only
+    # stores its value if the generation it started with is still current.
+
+    def _start(self, key: str) -> int:
+        with self._lock:
+            entry = self._loading.setdefault(key, [0, 0])
+            entry[0] += 1
+            return entry[1]
+
+    def _fresh(self, key: str, gen: int) -> bool:
+        with self._lock:
+            return self._loading[key][1] == gen
+
+    def _done(self, key: str, loaded: bool) -> None:
+        with self._lock:
+            if loaded:
+                self.loads += 1
+            entry = self._loading[key]
+            entry[0] -= 1
+            if not entry[0]:
+                del self._loading[key]
+
+    def _store(self, key: str, gen: int, value: Any) -> None:
+        if value is None or not self._fresh(key, gen):  # misses (unknown user, no record) aren't cached
+            return
+        self.cache.set(key, value)
+        if not self._fresh(key, gen):  # invalidated while we were storing
+            self.cache.delete(key)
+
+    async def _astore(self, key: str, gen: int, value: Any) -> None:
+        if value is None or not self._fresh(key, gen):
+            return
+        await self.cache.aset(key, value)
+        if not self._fresh(key, gen):
+            await asyncio.to_thread(self.cache.delete, key)
+
+    def get(self, key: str, load: Callable[[], Any]) -> Any:
+        value = self.cache.get(key, _MISSING)
+        if value is not _MISSING:
+            return value
+
+        def fill():
+            gen, loaded = self._start(key), False
+            try:
+                value = load()
+                loaded = True
+                self._store(key, gen, value)
+                return value
+            finally:
+                self._done(key, loaded)
+
+        return self.flight.do(key, fill)
+
+    async def aget(self, key: str, load: Callable[[], Awaitable[Any]]) -> Any:
+        value = await self.cache.aget(key, _MISSING)
+        if value is not _MISSING:
+            return value
+
+        async def fill():
+            gen, loaded = self._start(key), False
+            try:
+                value = await load()
+                loaded = True
+                await self._astore(key, gen, value)
+                return value
+            finally:
+                self._done(key, loaded)
+
+        return await self.flight.ado(key, fill)
+
+    def peek(self, key: str) -> Any:
+        """The cached value, or None; never loads."""
+        value = self.cache.get(key, _MISSING)
+        return None if value is _MISSING else value
+
+    def invalidate(self, key: str) -> None:
+        with self._lock:
+            self.invalidations += 1
+            entry = self._loading.get(key)
+            if entry is not None:
+                entry[1] += 1
+        # later readers start a fresh load instead of joining one that began before the write
+        self.flight.forget(key)
+        self.cache.delete(key)
+
+    def stats(self) -> Dict[str, Any]:
+        tiers = self.cache.stats()
+        # cache hits, plus misses that shared another caller's in-flight load
+        saved = tiers["memory"]["hits"] + (tiers["disk"]["hits"] if tiers["disk"] else 0) + self.flight.coalesced
+        lookups = saved + self.loads
+        return {
+            "lookups": lookups,
+            "round_trips": self.loads,
+            "round_trips_saved": saved,
+            "hit_ratio": round(saved / lookups, 4) if lookups else 0.0,
+            "invalidations": self.invalidations,
+            "coalesced": self.flight.coalesced,
+            "memory": tiers["memory"],
+            "shared": tiers["disk"],
+        }
+
+
+def _shared(name: str, ttl: float = READ_CACHE_TTL_S) -> Optional[DiskCache]:
+    if not READ_CACHE_DIR:
+        return None
+    return DiskCache(os.path.join(READ_CACHE_DIR, f"{name}.sqlite3"), maxsize=READ_CACHE_SIZE * 10, ttl=ttl)
+
+
+profiles = ReadThrough("profiles", _shared("profiles", PROFILE_CACHE_TTL_S))
+records = ReadThrough("records", _shared("records"))
+# just the version columns of records, for ETag checks without the full row
+versions = ReadThrough("versions", _shared("versions"))
+
+
+def user_key(user_id: str) -> str:
+    return f"user:{user_id}"
+
+
+def record_key(exercise: str, user_id: str) -> str:
+    return f"record:{exercise}:{user_id}"
+
+
+def version_key(exercise: str, user_id: str) -> str:
+    return f"version:{exercise}:{user_id}"
+
+
+def stats() -> Dict[str, Any]:
+    return {"profiles": profiles.stats(), "records": records.stats(), "versions": versions.stats()}
@@ -0,0 +1,258 @@
+"""
+Shared, rate-limit-aware scheduler for outbound model calls.
+
+Every vision call goes through one ModelScheduler per process:
+  - a global concurrency cap (semaphore),
+  - token buckets on requests/min and estimated tokens/min,
+  - retries with exponential backoff + full jitter, honouring Retry-After
+    (a 429's hint also pauses the request bucket for every caller),
+  - a circuit breaker that fails fast after repeated upstream failures
+    (5xx, timeouts, connection errors; rate limiting alone never opens it),
+  - a per-request deadline covering queueing, backoff and the call itself.
+"""
+import asyncio
+import logging
+import random
+import time
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Optional, TypeVar
+
+from utils.metrics import MODEL_RETRIES
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class CircuitOpen(RuntimeError):
+    """Upstream is failing; calls are rejected until the cooldown passes."""
+
+
+class DeadlineExceeded(RuntimeError):
+    """The request's deadline passed while queued, backing off or in flight."""
+
+
+class TokenBucket:
+    def __init__(self, per_minute: float, burst: Optional[float] = None):
+        self.rate = per_minute / 60.0
+        self.capacity = burst if burst is not None else per_minute
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def pause(self, seconds: float) -> None:
+        """Hold back new takes for about `seconds` (the provider's Retry-After)."""
+        self._refill()
+        self.tokens = min(self.tokens, -seconds * self.rate)
+
+    async def take(self, n: float, deadline: float) -> None:
+        n = min(n, self.capacity)  # a single oversized request must still be able to run
+        async with self._lock:  # FIFO-ish: one waiter refills at a time
+            while True:
+                self._refill()
+                if self.tokens >= n:
+                    self.tokens -= n
+                    return
+                wait = (n - self.tokens) / self.rate
+                if time.monotonic() + wait > deadline:
+                    raise DeadlineExceeded("rate limit wait exceeds deadline")
+                await asyncio.sleep(wait)
+
+
+def _retry_after(err: Exception) -> Optional[float]:
+    resp = getattr(err, "response", None)
+    headers = getattr(resp, "headers", None) or {}
+    try:
+        if "retry-after-ms" in headers:
+            return float(headers["retry-after-ms"]) / 1000.0
+        if "retry-after" in headers:
+            return float(headers["retry-after"])
+    except (TypeError, ValueError):
+        pass
+    return None
+
+
+def _rate_limited(err: Exception) -> bool:
+    return getattr(err, "status_code", None) == 429
+
+
+def _retryable(err: Exception) -> bool:
+    from openai import APIConnectionError, APIStatusError
+
+    if isinstance(err, (APIConnectionError, asyncio.TimeoutError)):
+        return True
+    if isinstance(err, APIStatusError):
+        return err.status_code == 429 or err.status_code >= 500
+    return False
+
+
+def transient(err: BaseException) -> bool:
+    """
+    True if a failed call is worth repeating later (e.g. a requeued job): the
+    breaker was open, the deadline ran out, or a retryable upstream error
+    outlasted max_retries, raised as is or as the cause of a wrapper.
+    """
+    if isinstance(err, (CircuitOpen, DeadlineExceeded)):
+        return True
+    return any(isinstance(e, Exception) and _retryable(e) for e in (err, err.__cause__))
+
+
+class Lease:
+    def __init__(self, scheduler: "ModelScheduler", deadline: float):
+        self._s = scheduler
+        self.deadline = deadline
+
+    async def call(self, fn: Callable[[], Awaitable[T]]) -> T:
+        """Run fn with retries/backoff inside this lease's deadline."""
+        s = self._s
+        attempt = 0
+        while True:
+            remaining = self.deadline - time.monotonic()
+            if remaining <= 0:
+                raise DeadlineExceeded("deadline exceeded before model call")
+            try:
+                result = await asyncio.wait_for(fn(), timeout=remaining)
+            except Exception as e:
+                if not _retryable(e):
+                    raise
+                # a 429 means "slow down", not "upstream is broken": it backs off
+                # and pauses the request bucket but doesn't count toward the breaker
+                limited = _rate_limited(e)
+                if not limited:
+                    s._record_failure()
+                attempt += 1
+                if attempt > s.max_retries:
+                    raise
+                delay = _retry_after(e)
+                if limited and delay is not None:
+                    s._requests.pause(delay)
+                if delay is None:
+                    delay = random.uniform(0, min(s.max_backoff_s, s.base_backoff_s * 2 ** attempt))
+                if time.monotonic() + delay >= self.deadline:
+                    raise DeadlineExceeded(f"retry backoff exceeds deadline: {e}") from e
+                s.retries += 1
+                MODEL_RETRIES.inc(str(getattr(e, "status_code", None) or type(e).__name__))
+                logger.warning("model call failed (%s), retry %d in %.2fs", type(e).__name__, attempt, delay)
+                await asyncio.sleep(delay)
+                s._check_breaker()
+            else:
+                s._record_success()
+                return result
+
+
+class ModelScheduler:
+    def __init__(
+        self,
+        max_concurrency: int = 8,
+        requests_per_minute: float = 500,
+        tokens_per_minute: float = 300_000,
+        max_retries: int = 4,
+        base_backoff_s: float = 0.5,
+        max_backoff_s: float = 20.0,
+        breaker_threshold: int = 8,
+        breaker_cooldown_s: float = 30.0,
+        default_deadline_s: float = 90.0,
+    ):
+        self.max_concurrency = max_concurrency
+        self._sem = asyncio.Semaphore(max_concurrency)
+        self._requests = TokenBucket(requests_per_minute)
+        self._tokens = TokenBucket(tokens_per_minute)
+        self.max_retries = max_retries
+        self.base_backoff_s = base_backoff_s
+        self.max_backoff_s = max_backoff_s
+        self.breaker_threshold = breaker_threshold
+        self.breaker_cooldown_s = breaker_cooldown_s
+        self.default_deadline_s = default_deadline_s
+
+        self.queued = 0
+        self.in_flight = 0
+        self.completed = 0
+        self.rejected = 0
+        self.retries = 0
+        self.wait_total_s = 0.0
+        self.wait_max_s = 0.0
+        self._failures = 0
+        self._open_until = 0.0
+
+    # ---- circuit breaker ----
+
+    def _check_breaker(self) -> None:
+        if self._failures < self.breaker_threshold:
+            return
+        now = time.monotonic()
+        if now < self._open_until:
+            self.rejected += 1
+            raise CircuitOpen("vision model circuit open; retry later")
+        # half-open: let this call through as the probe, keep rejecting others
+        # until it succeeds (closes) or fails (re-opens)
+        self._open_until = now + self.breaker_cooldown_s
+
+    def _record_failure(self) -> None:
+        self._failures += 1
+        if self._failures >= self.breaker_threshold:
+            self._open_until = time.monotonic() + self.breaker_cooldown_s
+
+    def _record_success(self) -> None:
+        self._failures = 0
+
+    # ---- scheduling ----
+
+    @asynccontextmanager
+    async def lease(self, est_tokens: int = 0, deadline_s: Optional[float] = None) -> AsyncIterator[Lease]:
+        """
+        Wait for a concurrency slot and rate budget, then hold the slot for
+        the body (e.g. while a response streams).
+        """
+        self._check_breaker()
+        deadline = time.monotonic() + (deadline_s or self.default_deadline_s)
+        t0 = time.monotonic()
+        self.queued += 1
+        try:
+            try:
+                await asyncio.wait_for(self._sem.acquire(), timeout=max(deadline - t0, 0))
+            except asyncio.TimeoutError:
+                self.rejected += 1
+                raise DeadlineExceeded("timed out waiting for a model slot")
+            try:
+                await self._requests.take(1, deadline)
+                await self._tokens.take(est_tokens, deadline)
+            except Exception:
+                self._sem.release()
+                self.rejected += 1
+                raise
+        finally:
+            self.queued -= 1
+        waited = time.monotonic() - t0
+        self.wait_total_s += waited
+        self.wait_max_s = max(self.wait_max_s, waited)
+        self.in_flight += 1
+        try:
+            yield Lease(self, deadline)
+        finally:
+            self.in_flight -= 1
+            self.completed += 1
+            self._sem.release()
+
+    async def run(self, fn: Callable[[], Awaitable[T]], est_tokens: int = 0, deadline_s: Optional[float] = None) -> T:
+        async with self.lease(est_tokens, deadline_s) as lease:
+            return await lease.call(fn)
+
+    def stats(self) -> Dict[str, Any]:
+        admitted = self.completed + self.in_flight
+        return {
+            "max_concurrency": self.max_concurrency,
+            "in_flight": self.in_flight,
+            "queue_depth": self.queued,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "retries": self.retries,
+            "wait_ms_avg": round(1000 * self.wait_total_s / admitted, 1) if admitted else 0.0,
+            "wait_ms_max": round(1000 * self.wait_max_s, 1),
+            "circuit": "open" if self._failures >= self.breaker_threshold else "closed",
+            "consecutive_failures": self._failures,
+        }
@@ -1,28 +1,113 @@
-import json, requests, jwt
+import logging, os, threading, time
 from fastapi import Security, HTTPException
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from config import SUPABASE_JWKS_URL, JWT_AUDIENCE
+from utils.cache import LRUCache
+from utils.metrics import timed
+
+logger = logging.getLogger(__name__)
+
+JWKS_REFRESH_S = float(os.getenv("JWKS_REFRESH_S", "600"))
+# unknown-kid refreshes are rate limited so junk tokens can't hammer the JWKS URL
+JWKS_MIN_REFRESH_S = float(os.getenv("JWKS_MIN_REFRESH_S", "30"))
+TOKEN_CACHE_SIZE = int(os.getenv("TOKEN_CACHE_SIZE", "10000"))
 
 _bearer = HTTPBearer()
-_jwks = None
-
-def _fetch_jwks():
-    global _jwks
-    if _jwks: return _jwks
-    if not SUPABASE_JWKS_URL:
-        raise HTTPException(500, "JWKS URL not configured")
-    r = requests.get(SUPABASE_JWKS_URL, timeout=5)
-    r.raise_for_status()
-    _jwks = r.json()
-    return _jwks
+
+_keys: dict = {}            # kid -> parsed public key
+_keys_generation = 0        # bumped on every successful refresh
+_keys_fetched_at = 0.0
+_refresh_lock = threading.Lock()
+_refresher: threading.Thread | None = None
+
+_verified = LRUCache(maxsize=TOKEN_CACHE_SIZE)  # token -> payload, expires at the token's exp
+
+
+def _refresh_keys(force: bool = False) -> None:
+    """
+    Fetch the JWKS and re-parse keys. Single-flight: concurrent callers wait
+    on one fetch instead of each hitting the JWKS URL.
+    """
+    global _keys, _keys_generation, _keys_fetched_at
+    seen = _keys_generation
+    with _refresh_lock:
+        if _keys_generation != seen:
+            return  # another thread refreshed while we waited
+        if not force and time.monotonic() - _keys_fetched_at < JWKS_MIN_REFRESH_S:
+            return
+        if not SUPABASE_JWKS_URL:
+            raise HTTPException(500, "JWKS URL not configured")
+        import jwt, requests  # deferred: only needed once auth is first used
+
+        r = requests.get(SUPABASE_JWKS_URL, timeout=5)
+        r.raise_for_status()
+        keys = {}
+        for k in r.json().get("keys", []):
+            try:
+                keys[k["kid"]] = jwt.algorithms.RSAAlgorithm.from_jwk(k)
+            except Exception:
+                logger.warning("Skipping unusable JWK kid=%s", k.get("kid"))
+        _keys = keys
+        _keys_fetched_at = time.monotonic()
+        _keys_generation += 1
+        logger.info("JWKS refreshed (%d keys)", len(keys))
+
+
+def _refresh_loop() -> None:
+    while True:
+        time.sleep(JWKS_REFRESH_S)
+        try:
+            _refresh_keys(force=True)
+        except Exception:
+            logger.exception("Background JWKS refresh failed; keeping previous keys")
+
+
+def _ensure_refresher() -> None:
+    global _refresher
+    if _refresher is None:
+        with _refresh_lock:
+            if _refresher is None:
+                _refresher = threading.Thread(target=_refresh_loop, name="jwks-refresh", daemon=True)
+                _refresher.start()
+
+
+def _get_key(kid: str):
+    key = _keys.get(kid)
+    if key is None:
+        # first use, or a rotated key we haven't seen yet
+        _refresh_keys(force=not _keys)
+        _ensure_refresher()
+        key = _keys.get(kid)
+    return key
+
+
+def load_jwks() -> int:
+    """Fetch keys eagerly (e.g. at startup); returns the number of keys."""
+    _refresh_keys(force=True)
+    _ensure_refresher()
+    return len(_keys)
+
 
 def get_current_user(creds: HTTPAuthorizationCredentials = Security(_bearer)):
-    token = creds.credentials
+    with timed("auth"):
+        return _verify(creds.credentials)
+
+
+def _verify(token: str):
+    payload = _verified.get(token)
+    if payload is not None:
+        return payload
+    import jwt
+
     try:
         header = jwt.get_unverified_header(token)
-        key = next(k for k in _fetch_jwks()["keys"] if k["kid"] == header["kid"])
-        public_key = jwt.algorithms.RSAAlgorithm.from_jwk(json.dumps(key))
+        public_key = _get_key(header["kid"])
+        if public_key is None:
+            raise KeyError(header["kid"])
         payload = jwt.decode(token, public_key, algorithms=["RS256"], audience=JWT_AUDIENCE)
-        return payload
     except Exception:
         raise HTTPException(401, "Invalid token")
+    ttl = payload.get("exp", 0) - time.time()
+    if ttl > 0:
+        _verified.set(token, payload, ttl=ttl)
+    return payload
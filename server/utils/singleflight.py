@@ -0,0 +1,122 @@
+"""
+Single-flight request coalescing: concurrent calls for the same key share
+one upstream call and its result (or exception) instead of each hitting
+Supabase. Nothing is cached once the call returns; pair with readcache
+for that.
+
+    athletes = Group("coach_athletes")
+    rows = athletes.do(coach_id, lambda: load(coach_id))              # threadpool routes
+    rows = await athletes.ado(coach_id, lambda: aload(coach_id))      # async routes
+
+Threads and the event loop keep separate in-flight tables: a sync and an
+async caller of the same key make two calls, never a deadlock.
+"""
+import asyncio
+import threading
+from typing import Any, Awaitable, Callable, Dict, Hashable, List
+
+from utils import metrics
+
+_groups: List["Group"] = []
+
+
+class _Call:
+    __slots__ = ("done", "value", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value: Any = None
+        self.error: BaseException | None = None
+
+
+class Group:
+    def __init__(self, name: str):
+        self.name = name
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, _Call] = {}
+        self._tasks: Dict[Hashable, "asyncio.Task[Any]"] = {}
+        self.leaders = 0
+        self.coalesced = 0
+        _groups.append(self)
+
+    def _count(self, leader: bool) -> None:
+        with self._lock:
+            if leader:
+                self.leaders += 1
+            else:
+                self.coalesced += 1
+        metrics.SINGLEFLIGHT_CALLS.inc(self.name, "leader" if leader else "coalesced")
+
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Any:
+        """Run fn() unless a call for key is already in flight on another thread; then wait for its result."""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+        self._count(leader)
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.value
+
+        try:
+            call.value = fn()
+            return call.value
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                if self._calls.get(key) is call:
+                    del self._calls[key]
+            call.done.set()
+
+    async def ado(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Async counterpart of do(). The upstream call runs as its own task, so
+        a caller that is cancelled (client went away) doesn't cancel it for
+        the others.
+        """
+        task = self._tasks.get(key)
+        leader = task is None
+        if leader:
+            task = self._tasks[key] = asyncio.ensure_future(fn())
+            task.add_done_callback(lambda t, key=key: self._finished(key, t))
+        self._count(leader)
+        return await asyncio.shield(task)
+
+    def _finished(self, key: Hashable, task: "asyncio.Task[Any]") -> None:
+        if self._tasks.get(key) is task:
+            del self._tasks[key]
+        if not task.cancelled():
+            task.exception()  # retrieved here so an error nobody awaited isn't logged as "never retrieved"
+
+    def forget(self, key: Hashable) -> None:
+        """Let the next call for key start its own upstream call; callers already waiting keep theirs."""
+        with self._lock:
+            self._calls.pop(key, None)
+        self._tasks.pop(key, None)
+
+    def in_flight(self) -> int:
+        return len(self._calls) + len(self._tasks)
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.leaders + self.coalesced
+        return {
+            "upstream_calls": self.leaders,
+            "coalesced": self.coalesced,
+            "coalesced_ratio": round(self.coalesced / total, 4) if total else 0.0,
+            "in_flight": self.in_flight(),
+        }
+
+
+def stats() -> Dict[str, Any]:
+    return {g.name: g.stats() for g in _groups}
+
+
+@metrics.on_collect
+def _collect() -> None:
+    for g in _groups:
+        metrics.SINGLEFLIGHT_IN_FLIGHT.set(g.in_flight(), g.name)
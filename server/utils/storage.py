@@ -0,0 +1,361 @@
+"""
+Local job queue + frame storage for the deep-analysis worker.
+
+SQLite-backed so the API and any number of worker processes on the same host
+can share it without extra infra. The JobQueue surface (submit / claim /
+heartbeat / complete / retry / fail / get / depth) is deliberately small so a
+Redis-backed queue can replace it later without touching the routes or the
+worker.
+"""
+import json
+import logging
+import mmap
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+import uuid
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+JOB_DB_PATH = os.getenv("JOB_DB_PATH", os.path.join(os.path.dirname(os.path.dirname(__file__)), "jobs.sqlite3"))
+JOB_QUEUE_MAX_DEPTH = int(os.getenv("JOB_QUEUE_MAX_DEPTH", "200"))
+JOB_LEASE_S = float(os.getenv("JOB_LEASE_S", "120"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+UPLOAD_MAX_FRAMES = int(os.getenv("UPLOAD_MAX_FRAMES", "120"))
+UPLOAD_MAX_FRAME_BYTES = int(os.getenv("UPLOAD_MAX_FRAME_BYTES", str(8 * 1024 * 1024)))
+UPLOAD_SPOOL_DIR = os.getenv("UPLOAD_SPOOL_DIR") or None
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    status TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    result TEXT,
+    error TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL,
+    lease_expires REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_status_created ON jobs(status, created_at);
+
+CREATE TABLE IF NOT EXISTS uploads (
+    id TEXT PRIMARY KEY,
+    frames INTEGER NOT NULL DEFAULT 0,
+    bytes INTEGER NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS upload_frames (
+    upload_id TEXT NOT NULL,
+    idx INTEGER NOT NULL,
+    data BLOB NOT NULL,
+    PRIMARY KEY (upload_id, idx)
+);
+"""
+
+# uploads that queued or running jobs will still read
+_PENDING_UPLOADS = (
+    "SELECT json_extract(payload, '$.upload_id') FROM jobs "
+    "WHERE status IN ('queued', 'running') AND json_extract(payload, '$.upload_id') IS NOT NULL"
+)
+
+
+class QueueFull(Exception):
+    """Raised by submit() when the queue is at JOB_QUEUE_MAX_DEPTH."""
+
+
+class JobQueue:
+    def __init__(self, path: str = JOB_DB_PATH, max_depth: int = JOB_QUEUE_MAX_DEPTH):
+        self.path = path
+        self.max_depth = max_depth
+        self._local = threading.local()
+        with self._conn() as c:
+            c.executescript(_SCHEMA)
+
+    def _conn(self) -> sqlite3.Connection:
+        # one connection per thread: sync routes run in a threadpool
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    # ---- jobs ----
+
+    def submit(self, kind: str, payload: Dict[str, Any]) -> str:
+        job_id = uuid.uuid4().hex
+        c = self._conn()
+        c.execute("BEGIN IMMEDIATE")
+        try:
+            depth = c.execute(
+                "SELECT COUNT(*) FROM jobs WHERE status IN ('queued', 'running')"
+            ).fetchone()[0]
+            if depth >= self.max_depth:
+                raise QueueFull(f"queue depth {depth} >= {self.max_depth}")
+            c.execute(
+                "INSERT INTO jobs (id, kind, status, payload, created_at) VALUES (?, ?, 'queued', ?, ?)",
+                (job_id, kind, json.dumps(payload), time.time()),
+            )
+            c.execute("COMMIT")
+        except Exception:
+            c.execute("ROLLBACK")
+            raise
+        return job_id
+
+    def claim(self) -> Optional[Tuple[str, str, Dict[str, Any], int]]:
+        """
+        Take the oldest runnable job (queued and past any retry() backoff, or
+        running with an expired lease from a dead worker). Returns (id, kind,
+        payload, attempt) or None; `attempt` identifies this lease for
+        heartbeat() / complete() / retry() / fail().
+        """
+        c = self._conn()
+        while True:
+            now = time.time()
+            c.execute("BEGIN IMMEDIATE")
+            try:
+                row = c.execute(
+                    "SELECT id, kind, payload, attempts FROM jobs "
+                    "WHERE (status = 'queued' AND (lease_expires IS NULL OR lease_expires <= ?)) "
+                    "OR (status = 'running' AND lease_expires < ?) "
+                    "ORDER BY created_at LIMIT 1",
+                    (now, now),
+                ).fetchone()
+                if row is None:
+                    c.execute("COMMIT")
+                    return None
+                if row["attempts"] >= JOB_MAX_ATTEMPTS:
+                    c.execute(
+                        "UPDATE jobs SET status = 'failed', error = ?, finished_at = ?, lease_expires = NULL "
+                        "WHERE id = ?",
+                        ("worker lease expired too many times", now, row["id"]),
+                    )
+                    c.execute("COMMIT")
+                    continue
+                c.execute(
+                    "UPDATE jobs SET status = 'running', attempts = attempts + 1, started_at = ?, lease_expires = ? "
+                    "WHERE id = ?",
+                    (now, now + JOB_LEASE_S, row["id"]),
+                )
+                c.execute("COMMIT")
+            except Exception:
+                c.execute("ROLLBACK")
+                raise
+            return row["id"], row["kind"], json.loads(row["payload"]), row["attempts"] + 1
+
+    def heartbeat(self, job_id: str, attempt: int) -> bool:
+        """Extend the lease by JOB_LEASE_S; False if the job was reclaimed or finished meanwhile."""
+        return self._conn().execute(
+            "UPDATE jobs SET lease_expires = ? WHERE id = ? AND status = 'running' AND attempts = ?",
+            (time.time() + JOB_LEASE_S, job_id, attempt),
+        ).rowcount == 1
+
+    # complete() / retry() / fail() only apply to the lease that is still
+    # current, so a worker whose lease expired can't overwrite the outcome of
+    # the retry
+
+    def complete(self, job_id: str, result: Dict[str, Any], attempt: int) -> bool:
+        return self._conn().execute(
+            "UPDATE jobs SET status = 'done', result = ?, error = NULL, finished_at = ?, lease_expires = NULL "
+            "WHERE id = ? AND status = 'running' AND attempts = ?",
+            (json.dumps(result), time.time(), job_id, attempt),
+        ).rowcount == 1
+
+    def retry(self, job_id: str, error: str, attempt: int, delay: float) -> bool:
+        """
+        Requeue after a transient failure; claimable again in `delay` seconds.
+        While a job is queued, lease_expires holds that not-before time.
+        """
+        return self._conn().execute(
+            "UPDATE jobs SET status = 'queued', error = ?, lease_expires = ? "
+            "WHERE id = ? AND status = 'running' AND attempts = ?",
+            (error, time.time() + delay, job_id, attempt),
+        ).rowcount == 1
+
+    def fail(self, job_id: str, error: str, attempt: int) -> bool:
+        return self._conn().execute(
+            "UPDATE jobs SET status = 'failed', error = ?, finished_at = ?, lease_expires = NULL "
+            "WHERE id = ? AND status = 'running' AND attempts = ?",
+            (error, time.time(), job_id, attempt),
+        ).rowcount == 1
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        row = self._conn().execute(
+            "SELECT id, kind, status, result, error, attempts, created_at, started_at, finished_at "
+            "FROM jobs WHERE id = ?",
+            (job_id,),
+        ).fetchone()
+        if row is None:
+            return None
+        job = dict(row)
+        job["result"] = json.loads(job["result"]) if job["result"] else None
+        return job
+
+    def depth(self) -> Dict[str, int]:
+        rows = self._conn().execute(
+            "SELECT status, COUNT(*) AS n FROM jobs GROUP BY status"
+        ).fetchall()
+        counts = {"queued": 0, "running": 0, "done": 0, "failed": 0}
+        counts.update({r["status"]: r["n"] for r in rows})
+        return counts
+
+    # ---- uploads ----
+
+    def put_frames(self, frames: Iterable[bytes]) -> Dict[str, Any]:
+        """Store an ordered frame set; returns {upload_id, frames, bytes}."""
+        upload_id = uuid.uuid4().hex
+        c = self._conn()
+        c.execute("BEGIN IMMEDIATE")
+        try:
+            n = total = 0
+            for n, data in enumerate(frames, start=1):
+                if n > UPLOAD_MAX_FRAMES:
+                    raise ValueError(f"too many frames (max {UPLOAD_MAX_FRAMES})")
+                c.execute(
+                    "INSERT INTO upload_frames (upload_id, idx, data) VALUES (?, ?, ?)",
+                    (upload_id, n - 1, sqlite3.Binary(data)),
+                )
+                total += len(data)
+            c.execute(
+                "INSERT INTO uploads (id, frames, bytes, created_at) VALUES (?, ?, ?, ?)",
+                (upload_id, n, total, time.time()),
+            )
+            c.execute("COMMIT")
+        except Exception:
+            c.execute("ROLLBACK")
+            raise
+        return {"upload_id": upload_id, "frames": n, "bytes": total}
+
+    def get_upload(self, upload_id: str) -> Optional[Dict[str, Any]]:
+        row = self._conn().execute(
+            "SELECT id AS upload_id, frames, bytes, created_at FROM uploads WHERE id = ?",
+            (upload_id,),
+        ).fetchone()
+        return dict(row) if row else None
+
+    def get_frames(self, upload_id: str) -> List[bytes]:
+        rows = self._conn().execute(
+            "SELECT data FROM upload_frames WHERE upload_id = ? ORDER BY idx",
+            (upload_id,),
+        ).fetchall()
+        return [bytes(r["data"]) for r in rows]
+
+    def delete_upload(self, upload_id: str) -> None:
+        c = self._conn()
+        c.execute("BEGIN IMMEDIATE")
+        try:
+            c.execute("DELETE FROM upload_frames WHERE upload_id = ?", (upload_id,))
+            c.execute("DELETE FROM uploads WHERE id = ?", (upload_id,))
+            c.execute("COMMIT")
+        except Exception:
+            c.execute("ROLLBACK")
+            raise
+
+    def purge(self, older_than_s: float) -> int:
+        """Drop finished jobs and uploads older than the given age, keeping uploads that pending jobs still need."""
+        cutoff = time.time() - older_than_s
+        c = self._conn()
+        c.execute("BEGIN IMMEDIATE")
+        try:
+            n = c.execute(
+                "DELETE FROM jobs WHERE status IN ('done', 'failed') AND finished_at < ?", (cutoff,)
+            ).rowcount
+            stale = f"SELECT id FROM uploads WHERE created_at < ? AND id NOT IN ({_PENDING_UPLOADS})"
+            c.execute(f"DELETE FROM upload_frames WHERE upload_id IN ({stale})", (cutoff,))
+            c.execute(f"DELETE FROM uploads WHERE id IN ({stale})", (cutoff,))
+            c.execute("COMMIT")
+        except Exception:
+            c.execute("ROLLBACK")
+            raise
+        return n
+
+
+class FrameSpool:
+    """
+    Append-only temp file holding one request's frames back to back. Frames
+    are written chunk by chunk as they arrive and read back as zero-copy
+    memoryview slices of an mmap, so peak heap use is about one chunk.
+    """
+
+    def __init__(self, max_frames: int = UPLOAD_MAX_FRAMES, max_frame_bytes: int = UPLOAD_MAX_FRAME_BYTES):
+        self.max_frames = max_frames
+        self.max_frame_bytes = max_frame_bytes
+        self._f = tempfile.TemporaryFile(dir=UPLOAD_SPOOL_DIR)
+        self._spans: List[Tuple[int, int]] = []
+        self._start: Optional[int] = None
+        self._pos = 0
+        self._mmap: Optional[mmap.mmap] = None
+        self._views: List[memoryview] = []
+
+    @property
+    def bytes(self) -> int:
+        return self._pos
+
+    def __len__(self) -> int:
+        return len(self._spans)
+
+    def begin(self) -> None:
+        if len(self._spans) >= self.max_frames:
+            raise ValueError(f"too many frames (max {self.max_frames})")
+        self._start = self._pos
+
+    def write(self, chunk: bytes) -> None:
+        if self._pos + len(chunk) - self._start > self.max_frame_bytes:
+            raise ValueError(f"frame larger than {self.max_frame_bytes} bytes")
+        self._f.write(chunk)
+        self._pos += len(chunk)
+
+    def end(self) -> None:
+        if self._pos > self._start:
+            self._spans.append((self._start, self._pos))
+        self._start = None
+
+    def add(self, frame: bytes) -> None:
+        self.begin()
+        self.write(frame)
+        self.end()
+
+    def frames(self) -> List[memoryview]:
+        if not self._spans:
+            return []
+        if self._mmap is None:
+            self._f.flush()
+            self._mmap = mmap.mmap(self._f.fileno(), 0, access=mmap.ACCESS_READ)
+        buf = memoryview(self._mmap)
+        self._views.append(buf)
+        views = [buf[a:b] for a, b in self._spans]
+        self._views.extend(views)
+        return views
+
+    def close(self) -> None:
+        for v in reversed(self._views):
+            v.release()
+        self._views.clear()
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+        self._f.close()
+
+
+_queue: JobQueue | None = None
+_queue_lock = threading.Lock()
+
+def job_queue() -> JobQueue:
+    """
+    Return the process-wide JobQueue singleton.
+    """
+    global _queue
+    if _queue is None:
+        with _queue_lock:
+            if _queue is None:
+                _queue = JobQueue()
+                logger.info("Job queue ready at %s", JOB_DB_PATH)
+    return _queue
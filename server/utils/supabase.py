@@ -1,25 +1,84 @@
+from __future__ import annotations
+
+import asyncio
 import logging
-from supabase import create_client, Client
+import threading
+from typing import TYPE_CHECKING
 from config import SUPABASE_URL, SUPABASE_SERVICE_ROLE_KEY
+from utils.metrics import instrument_httpx
+
+if TYPE_CHECKING:  # the SDK is imported on first use (or warm-up), not with the app
+    from supabase import AsyncClient, Client
 
 logger = logging.getLogger(__name__)
 
 _sb: Client | None = None
+_asb: AsyncClient | None = None
+_sb_lock = threading.Lock()
+_asb_lock = asyncio.Lock()
 
 def sb() -> Client:
     """
     Return a singleton Supabase client. Logs and raises on error.
+
+    Shared by every threadpool thread; its HTTP connections come from the
+    pool in utils.dbpool (sized by DB_POOL_SIZE).
     """
     global _sb
     if _sb is None:
-        if not SUPABASE_URL or not SUPABASE_SERVICE_ROLE_KEY:
-            logger.error("Supabase configuration missing. URL or key not provided.")
-            raise RuntimeError("Supabase not configured (missing URL or key)")
-
-        try:
-            _sb = create_client(SUPABASE_URL, SUPABASE_SERVICE_ROLE_KEY)
-            logger.info("Supabase client initialized successfully")
-        except Exception as e:
-            logger.exception("Failed to create Supabase client")
-            raise
+        with _sb_lock:
+            if _sb is not None:
+                return _sb
+            if not SUPABASE_URL or not SUPABASE_SERVICE_ROLE_KEY:
+                logger.error("Supabase configuration missing. URL or key not provided.")
+                raise RuntimeError("Supabase not configured (missing URL or key)")
+
+            try:
+                from supabase import create_client
+                from supabase.lib.client_options import SyncClientOptions
+                from utils import dbpool
+
+                http = dbpool.client(SUPABASE_URL)
+                instrument_httpx(http)
+                _sb = create_client(SUPABASE_URL, SUPABASE_SERVICE_ROLE_KEY, options=SyncClientOptions(httpx_client=http))
+                logger.info("Supabase client initialized successfully")
+            except Exception as e:
+                logger.exception("Failed to create Supabase client")
+                raise
     return _sb
+
+async def asb() -> AsyncClient:
+    """
+    Async counterpart of sb() for `async def` routes; queries are awaited
+    instead of blocking the event loop.
+    """
+    global _asb
+    if _asb is None:
+        async with _asb_lock:
+            if _asb is not None:
+                return _asb
+            if not SUPABASE_URL or not SUPABASE_SERVICE_ROLE_KEY:
+                logger.error("Supabase configuration missing. URL or key not provided.")
+                raise RuntimeError("Supabase not configured (missing URL or key)")
+
+            try:
+                from supabase import acreate_client
+                from supabase.lib.client_options import AsyncClientOptions
+                from utils import dbpool
+
+                http = dbpool.async_client(SUPABASE_URL)
+                instrument_httpx(http, is_async=True)
+                _asb = await acreate_client(
+                    SUPABASE_URL, SUPABASE_SERVICE_ROLE_KEY, options=AsyncClientOptions(httpx_client=http)
+                )
+                logger.info("Async Supabase client initialized successfully")
+            except Exception:
+                logger.exception("Failed to create async Supabase client")
+                raise
+    return _asb
+
+def pool_stats() -> dict:
+    """Connection pool utilization, reuse and wait time for the sync and async clients."""
+    from utils import dbpool
+
+    return dbpool.stats()
@@ -0,0 +1,161 @@
+"""
+Deep-analysis worker pool.
+
+Drains the job queue (utils/storage.py) with a fixed number of processes,
+each running a bounded number of concurrent analyses. A job that fails on a
+transient model error (circuit open, deadline, 429/5xx after the in-call
+retries) is requeued with jittered exponential backoff until
+JOB_MAX_ATTEMPTS is spent; any other error fails it at once. Process 0 also purges
+finished jobs and rebuilds the leaderboards (utils/leaderboard.py) every
+LEADERBOARD_REFRESH_S; set LEADERBOARD_REFRESH_S=0 when pg_cron does that:
+
+    python worker.py --processes 2 --concurrency 4
+"""
+import argparse
+import asyncio
+import logging
+import multiprocessing as mp
+import os
+import random
+import signal
+
+import config  # noqa: F401  (loads .env before the SDK clients read it)
+from fastapi import HTTPException
+
+logger = logging.getLogger("worker")
+
+POLL_INTERVAL_S = float(os.getenv("WORKER_POLL_INTERVAL_S", "0.5"))
+PURGE_AFTER_S = float(os.getenv("JOB_RETENTION_S", str(24 * 3600)))
+PURGE_EVERY_S = 600
+HEARTBEAT_S = float(os.getenv("JOB_HEARTBEAT_S", "30"))  # well inside JOB_LEASE_S
+RETRY_BASE_S = float(os.getenv("JOB_RETRY_BASE_S", "15"))
+RETRY_MAX_S = float(os.getenv("JOB_RETRY_MAX_S", "300"))
+
+
+async def _heartbeat(q, job_id: str, attempt: int) -> None:
+    """Keep the lease alive while the job runs (queueing for a model slot can outlast JOB_LEASE_S)."""
+    while True:
+        await asyncio.sleep(HEARTBEAT_S)
+        if not await asyncio.to_thread(q.heartbeat, job_id, attempt):
+            logger.warning("job %s: lease lost (attempt %d)", job_id, attempt)
+            return
+
+
+async def _failed(q, job_id: str, error: Exception, attempt: int) -> None:
+    from utils.scheduler import transient
+    from utils.storage import JOB_MAX_ATTEMPTS
+
+    detail = str(error.detail) if isinstance(error, HTTPException) else str(error)
+    if transient(error) and attempt < JOB_MAX_ATTEMPTS:
+        delay = random.uniform(0.5, 1.0) * min(RETRY_MAX_S, RETRY_BASE_S * 2 ** (attempt - 1))
+        logger.warning("job %s: attempt %d failed (%s), retrying in %.0fs", job_id, attempt, detail, delay)
+        await asyncio.to_thread(q.retry, job_id, detail, attempt, delay)
+        return
+    if not isinstance(error, HTTPException):
+        logger.error("job %s failed", job_id, exc_info=error)
+    await asyncio.to_thread(q.fail, job_id, detail, attempt)
+
+
+async def _handle(q, job_id: str, kind: str, payload: dict, attempt: int) -> None:
+    from routes.deep import AnalyzeRequest, run_analysis
+    from routes.jobs import ANALYZE_JOB
+
+    if kind != ANALYZE_JOB:
+        await asyncio.to_thread(q.fail, job_id, f"unknown job kind: {kind}", attempt)
+        return
+
+    beat = asyncio.create_task(_heartbeat(q, job_id, attempt))
+    try:
+        payload = dict(payload)
+        frames = await asyncio.to_thread(q.get_frames, payload.pop("upload_id"))
+        body = AnalyzeRequest(**payload, frames=[])
+        resp = await run_analysis(body, frames=frames)
+    except Exception as e:
+        await _failed(q, job_id, e, attempt)
+    else:
+        if not await asyncio.to_thread(q.complete, job_id, resp.model_dump(mode="json"), attempt):
+            logger.warning("job %s: result dropped, lease was taken over", job_id)
+    finally:
+        beat.cancel()
+
+
+async def _slot(q, stop) -> None:
+    while not stop.is_set():
+        job = await asyncio.to_thread(q.claim)
+        if job is None:
+            await asyncio.sleep(POLL_INTERVAL_S)
+            continue
+        await _handle(q, *job)
+
+
+async def _purge(q, stop) -> None:
+    while not stop.is_set():
+        n = await asyncio.to_thread(q.purge, PURGE_AFTER_S)
+        if n:
+            logger.info("purged %d finished jobs", n)
+        await asyncio.sleep(PURGE_EVERY_S)
+
+
+async def _leaderboards(stop) -> None:
+    from utils.leaderboard import LEADERBOARD_REFRESH_S, rebuild
+
+    while not stop.is_set():
+        try:
+            await asyncio.to_thread(rebuild)
+        except Exception:
+            logger.exception("leaderboard rebuild failed; readers keep the previous rankings")
+        await asyncio.sleep(LEADERBOARD_REFRESH_S)
+
+
+def _process_main(index: int, concurrency: int, stop) -> None:
+    from utils.leaderboard import LEADERBOARD_REFRESH_S
+    from utils.storage import job_queue
+
+    # let the parent decide when to stop; finish in-flight jobs first
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, lambda *_: stop.set())
+    logging.basicConfig(level=logging.INFO, format=f"%(asctime)s [worker-{index}] %(levelname)s %(message)s")
+    q = job_queue()
+
+    async def main():
+        chores = []
+        if index == 0:
+            chores.append(asyncio.create_task(_purge(q, stop)))
+            if LEADERBOARD_REFRESH_S > 0:
+                chores.append(asyncio.create_task(_leaderboards(stop)))
+        await asyncio.gather(*(_slot(q, stop) for _ in range(concurrency)))
+        for task in chores:
+            task.cancel()
+
+    asyncio.run(main())
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--processes", type=int, default=int(os.getenv("WORKER_PROCESSES", "2")))
+    ap.add_argument("--concurrency", type=int, default=int(os.getenv("WORKER_CONCURRENCY", "4")),
+                    help="concurrent analyses per process")
+    args = ap.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [worker] %(levelname)s %(message)s")
+    stop = mp.Event()
+    procs = [
+        mp.Process(target=_process_main, args=(i, args.concurrency, stop), daemon=False)
+        for i in range(args.processes)
+    ]
+    for p in procs:
+        p.start()
+    logger.info("started %d worker processes x %d slots", args.processes, args.concurrency)
+
+    def _shutdown(*_):
+        logger.info("stopping; waiting for in-flight jobs")
+        stop.set()
+
+    signal.signal(signal.SIGINT, _shutdown)
+    signal.signal(signal.SIGTERM, _shutdown)
+    for p in procs:
+        p.join()
+
+
+if __name__ == "__main__":
+    main()